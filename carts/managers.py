@@ -1,14 +1,119 @@
 import structlog
-from django.db import models
+from django.core.cache import cache
+from django.db import IntegrityError, models
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+
+from erp.request_scope import request_memo
 
 logger = structlog.get_logger(__name__)
 
+# Where the ID of the active cart is remembered between requests
+SESSION_CART_POINTER = 'cart_id'
+USER_CART_POINTER = 'carts:active:user:{user_id}'
+CART_POINTER_TIMEOUT = 60 * 60 * 24
+
+
+def cart_items_prefetch():
+    """Cart items with their products and box customizations"""
+    from carts.models import CartItem
+
+    return Prefetch(
+        'items',
+        queryset=CartItem.objects.select_related('product__category', 'box_customization')
+    )
+
+
+def line_signature(item):
+    """
+    What makes two cart lines the same line: the product and, for boxes, the
+    selection type, allergens and flavour selections. Expects the box
+    customization tree to be loaded.
+    """
+    customization = getattr(item, 'box_customization', None)
+    if customization is None:
+        return (item.product_id, None)
+    return (
+        item.product_id,
+        customization.selection_type,
+        frozenset(allergen.id for allergen in customization.allergens.all()),
+        tuple(sorted(
+            (selection.flavor_id, selection.quantity) for selection in customization.flavor_selections.all()
+        )),
+    )
+
+
+def cart_display_prefetches():
+    """
+    Prefetch lookups covering everything CartSerializer renders: items with
+    products, categories and galleries, box customizations with allergens and
+    flavour selections, and the discount with its excluded products.
+    """
+    from carts.models import CartItemBoxFlavorSelection
+    from products.models import Product
+
+    return [
+        cart_items_prefetch(),
+        'items__product__gallery_images',
+        'items__box_customization__allergens',
+        Prefetch(
+            'items__box_customization__flavor_selections',
+            queryset=CartItemBoxFlavorSelection.objects.select_related('flavor__category')
+        ),
+        'items__box_customization__flavor_selections__flavor__allergens',
+        Prefetch(
+            'discount__exclusions',
+            queryset=Product.objects.select_related('category').prefetch_related('gallery_images')
+        ),
+    ]
+
+
+def cart_compact_prefetches():
+    """
+    Prefetch lookups for CompactCartSerializer, which only needs catalog IDs
+    plus the product prices used by the pricing engine.
+    """
+    from carts.models import CartItem
+
+    return [
+        Prefetch(
+            'items',
+            queryset=CartItem.objects.select_related('product', 'box_customization')
+        ),
+        'items__box_customization__allergens',
+        'items__box_customization__flavor_selections',
+        'discount__exclusions',
+    ]
+
+
 class CartManager(models.Manager):
+    def with_display_tree(self):
+        """Queryset of carts with the full serializer tree loaded up front"""
+        return self.select_related('discount').prefetch_related(*cart_display_prefetches())
+
+    def prefetch_display_tree(self, cart):
+        """Load the serializer tree onto a cart that was already fetched"""
+        prefetch_related_objects([cart], 'discount', *cart_display_prefetches())
+        return cart
+
+    def prefetch_compact_tree(self, cart):
+        """Load what the compact cart representation needs onto a fetched cart"""
+        prefetch_related_objects([cart], 'discount', *cart_compact_prefetches())
+        return cart
+
     def get_or_create_from_request(self, request):
         """
         Get or create a cart based on session or user.
+
+        Reads take no locks: the active cart is found through a cart ID
+        pointer kept in the session (anonymous) or the cache (users), and
+        the partial unique constraints on active carts settle concurrent
+        creates. The cart is resolved once per request.
         """
+        memo = request_memo(request)
+        if 'cart' in memo:
+            return memo['cart'], False
+
         logger.info(
             "cart_request_started",
             user_id=getattr(request.user, 'id', None),
@@ -16,39 +121,135 @@ class CartManager(models.Manager):
             is_authenticated=request.user.is_authenticated
         )
 
-        with transaction.atomic():
-            if request.user.is_authenticated:
-                return self._get_or_create_user_cart(request.user)
-            else:
-                return self._get_or_create_session_cart(request)
+        if request.user.is_authenticated:
+            cart, created = self._get_or_create_user_cart(request.user)
+        else:
+            cart, created = self._get_or_create_session_cart(request)
 
-    def _get_or_create_user_cart(self, user):
-        """Handle authenticated user carts"""
-        # Lock the rows to prevent race conditions
-        active_cart = self.select_for_update().filter(
-            user=user,
-            active=True
-        ).first()
+        # Loaded once and shared by every manager, view and serializer of the request
+        prefetch_related_objects([cart], cart_items_prefetch())
+        memo['cart'] = cart
+        return cart, created
 
-        if active_cart:
-            logger.info(
-                "found_active_user_cart",
-                cart_id=active_cart.id,
-                user_id=user.id,
-                items_count=active_cart.items.count()
+    def merge_session_cart(self, request, user):
+        """
+        Move the anonymous cart of the request's session into the user's active
+        cart, typically right after login. Returns the user's cart, or None if
+        the session had no cart with items.
+
+        Runs in one transaction and a fixed number of statements: lines the
+        user's cart does not have are moved across with their box
+        customizations and flavour selections in one UPDATE, identical lines
+        are collapsed by summing quantities, and the session cart is
+        deactivated.
+        """
+        from carts.models import CartItem
+
+        session_id = request.session.session_key
+        if not session_id:
+            return None
+
+        with transaction.atomic():
+            source = self.filter(session_id=session_id, active=True, user__isnull=True).first()
+            if source is None:
+                return None
+            target = self.filter(user=user, active=True).first()
+
+            items = list(
+                CartItem.objects.filter(
+                    cart__in=[cart.pk for cart in (source, target) if cart is not None]
+                ).select_related('box_customization').prefetch_related(
+                    'box_customization__allergens',
+                    'box_customization__flavor_selections',
+                ).order_by('pk')
             )
-            return active_cart, False
+            moving = [item for item in items if item.cart_id == source.pk]
+            if not moving:
+                return None
+
+            # Claiming the source cart first means a concurrent login merges it only once
+            if not self.filter(pk=source.pk, active=True).update(active=False):
+                return None
+
+            if target is None:
+                target, _ = self._get_or_create_active(None, user=user)
+            lines = {line_signature(item): item for item in items if item.cart_id == target.pk}
+
+            moved, merged, summed = [], [], {}
+            for item in moving:
+                signature = line_signature(item)
+                line = lines.get(signature)
+                if line is None:
+                    # Identical lines within the source cart collapse into the first
+                    lines[signature] = item
+                    moved.append(item.pk)
+                else:
+                    line.quantity += item.quantity
+                    summed[line.pk] = line
+                    merged.append(item.pk)
+
+            CartItem.objects.filter(pk__in=moved).update(cart=target)
+            if summed:
+                CartItem.objects.bulk_update(list(summed.values()), ['quantity'])
+            # Box customizations and flavour selections of merged lines go with them
+            CartItem.objects.filter(pk__in=merged).delete()
+
+            updated = []
+            for field in ('discount_id', 'gift_message', 'shipping_date'):
+                if getattr(target, field) is None and getattr(source, field) is not None:
+                    setattr(target, field, getattr(source, field))
+                    updated.append(field)
+            if updated:
+                target.save(update_fields=updated + ['updated'])
+
+        request.session.pop(SESSION_CART_POINTER, None)
+        cache.set(USER_CART_POINTER.format(user_id=user.id), target.id, CART_POINTER_TIMEOUT)
+        request_memo(request).pop('cart', None)
 
-        # Create new cart (no reactivation)
         logger.info(
-            "creating_new_user_cart",
-            user_id=user.id
+            "session_cart_merged",
+            source_cart_id=source.id,
+            cart_id=target.id,
+            user_id=user.id,
+            moved=len(moved),
+            merged=len(merged)
         )
-        return self.create(
-            user=user,
-            session_id=None,
-            active=True
-        ), True
+        return target
+
+    def _get_or_create_active(self, pointer, **owner):
+        """
+        The owner's active cart, trying the pointed-to cart ID first. Returns
+        (cart, created).
+        """
+        if pointer is not None:
+            cart = self.filter(pk=pointer, active=True, **owner).first()
+            if cart is not None:
+                return cart, False
+
+        cart = self.filter(active=True, **owner).first()
+        if cart is not None:
+            return cart, False
+
+        try:
+            with transaction.atomic():
+                return self.create(active=True, **owner), True
+        except IntegrityError:
+            # Another request created the owner's active cart first
+            return self.get(active=True, **owner), False
+
+    def _get_or_create_user_cart(self, user):
+        """Handle authenticated user carts"""
+        pointer_key = USER_CART_POINTER.format(user_id=user.id)
+        pointer = cache.get(pointer_key)
+        cart, created = self._get_or_create_active(pointer, user=user)
+        if created:
+            logger.info("creating_new_user_cart", user_id=user.id)
+        else:
+            logger.info("found_active_user_cart", cart_id=cart.id, user_id=user.id)
+
+        if pointer != cart.id:
+            cache.set(pointer_key, cart.id, CART_POINTER_TIMEOUT)
+        return cart, created
 
     def _get_or_create_session_cart(self, request):
         """Handle anonymous session carts"""
@@ -59,28 +260,15 @@ class CartManager(models.Manager):
                 session_id=request.session.session_key
             )
 
-        # Lock the rows to prevent race conditions
-        active_cart = self.select_for_update().filter(
-            session_id=request.session.session_key,
-            active=True
-        ).first()
+        session_id = request.session.session_key
+        pointer = request.session.get(SESSION_CART_POINTER)
+        cart, created = self._get_or_create_active(pointer, session_id=session_id)
+        if created:
+            logger.info("creating_new_session_cart", session_id=session_id)
+        else:
+            logger.info("found_active_session_cart", cart_id=cart.id, session_id=session_id)
 
-        if active_cart:
-            logger.info(
-                "found_active_session_cart",
-                cart_id=active_cart.id,
-                session_id=request.session.session_key,
-                items_count=active_cart.items.count()
-            )
-            return active_cart, False
-
-        # Create new cart (no reactivation)
-        logger.info(
-            "creating_new_session_cart",
-            session_id=request.session.session_key
-        )
-        return self.create(
-            session_id=request.session.session_key,
-            user=None,
-            active=True
-        ), True
+        # The session, and so its row, only changes when the active cart does
+        if pointer != cart.id:
+            request.session[SESSION_CART_POINTER] = cart.id
+        return cart, created
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def deactivate_duplicate_carts(apps, schema_editor):
+    """Keep only the newest active cart of each session and user"""
+    Cart = apps.get_model('carts', 'Cart')
+    for owner in ['session_id', 'user']:
+        duplicated = (
+            Cart.objects.filter(active=True, **{f'{owner}__isnull': False})
+            .values(owner)
+            .annotate(carts=Count('id'), newest=Max('id'))
+            .filter(carts__gt=1)
+        )
+        for row in duplicated:
+            Cart.objects.filter(active=True, **{owner: row[owner]}).exclude(id=row['newest']).update(active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0001_initial'),
+        ('discounts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('active', True)), fields=('session_id',), name='unique_active_session_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('active', True)), fields=('user',), name='unique_active_user_cart'),
+        ),
+    ]
@@ -3,8 +3,8 @@ from django.conf import settings
 from products.models import Product, Allergen
 from flavours.models import Flavour
 from discounts.models import Discount
-from decimal import Decimal, ROUND_UP
 
+from . import pricing
 from .managers import CartManager
 
 class Cart(models.Model):
@@ -21,30 +21,20 @@ class Cart(models.Model):
 
     objects = CartManager()
 
+    @property
+    def price_breakdown(self):
+        """Single-pass price breakdown for this cart, memoized on the instance"""
+        return pricing.get_breakdown(self)
+
     @property
     def base_total(self):
         """Calculate the total before any discounts"""
-        return sum(item.base_price for item in self.items.all())
+        return self.price_breakdown.base_total
 
     @property
     def discounted_total(self):
         """Calculate the total after applying discount"""
-        if not self.discount or not self.discount.status[0]:
-            return self.base_total
-
-        # For percentage discounts
-        if self.discount.discount_type == 'PERCENTAGE':
-            non_excluded_total = sum(
-                item.base_price
-                for item in self.items.all()
-                if item.product not in self.discount.exclusions.all()
-            )
-            excluded_total = self.base_total - non_excluded_total
-            discount_amount = (non_excluded_total * self.discount.amount) / 100
-            return max(self.base_total - discount_amount, 0)
-
-        # For fixed amount discounts
-        return max(self.base_total - self.discount.amount, 0)
+        return self.price_breakdown.discounted_total
 
     @property
     def total(self):
@@ -53,20 +43,38 @@ class Cart(models.Model):
     @property
     def total_savings(self):
         """Calculate total amount saved due to discount, rounded up to 2 decimal places"""
-        savings = max(self.base_total - self.discounted_total, 0)
-        return Decimal(savings).quantize(Decimal('0.01'), rounding=ROUND_UP)
+        return self.price_breakdown.total_savings
 
     @property
     def is_discount_valid(self):
         """Check if cart meets minimum order value for discount"""
-        if not self.discount:
-            return False
-        return self.base_total >= self.discount.min_order_value
+        return self.price_breakdown.is_discount_valid
+
+    def save(self, *args, **kwargs):
+        pricing.invalidate(self)
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        pricing.invalidate(self)
+        super().refresh_from_db(*args, **kwargs)
 
     class Meta:
         indexes = [
             models.Index(fields=['session_id']),
         ]
+        constraints = [
+            # At most one active cart per session and per user
+            models.UniqueConstraint(
+                fields=['session_id'],
+                condition=models.Q(active=True),
+                name='unique_active_session_cart'
+            ),
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(active=True),
+                name='unique_active_user_cart'
+            ),
+        ]
 
 
 class CartItem(models.Model):
@@ -77,31 +85,25 @@ class CartItem(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    @property
+    def price(self):
+        """This item's line in the cart breakdown"""
+        return pricing.get_line(self)
+
     @property
     def base_price(self):
         """Calculate the base price for this item"""
-        return self.product.base_price * self.quantity
+        return self.price.base_price
 
     @property
     def discounted_price(self):
         """Calculate the discounted price if a discount exists"""
-        if not self.cart or not self.cart.discount:
-            return self.base_price
-
-        # Skip if product is in exclusions
-        if self.product in self.cart.discount.exclusions.all():
-            return self.base_price
-
-        if self.cart.discount.discount_type == 'PERCENTAGE':
-            discount_amount = (self.base_price * self.cart.discount.amount) / 100
-            return max(self.base_price - discount_amount, 0)
+        return self.price.discounted_price
 
     @property
     def savings(self):
         """Calculate the amount saved due to discount"""
-        if self.discounted_price is None:
-            return 0
-        return max(self.base_price - self.discounted_price, 0)
+        return self.price.savings
 
     class Meta:
         indexes = [
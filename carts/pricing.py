@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_UP
+from typing import Optional, Tuple
+
+from discounts.models import Discount
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class LinePrice:
+    """Price figures for a single cart item"""
+    item_id: int
+    product_id: int
+    quantity: int
+    unit_price: Decimal
+    base_price: Decimal
+    discounted_price: Optional[Decimal]
+    savings: Decimal
+    excluded: bool
+
+
+@dataclass(frozen=True)
+class DiscountPrice:
+    """How the cart's discount applies to the cart"""
+    discount_id: int
+    code: str
+    discount_type: str
+    amount: Decimal
+    active: bool
+    min_order_value: int
+    eligible_total: Decimal
+    amount_off: Decimal
+
+
+@dataclass(frozen=True)
+class CartPriceBreakdown:
+    """Immutable snapshot of every price figure for a cart"""
+    cart_id: int
+    lines: Tuple[LinePrice, ...]
+    discount: Optional[DiscountPrice]
+    base_total: Decimal
+    discounted_total: Decimal
+    total_savings: Decimal
+    is_discount_valid: bool
+    item_count: int
+
+    @property
+    def total(self):
+        return self.discounted_total
+
+    def line(self, item_id) -> Optional[LinePrice]:
+        for line in self.lines:
+            if line.item_id == item_id:
+                return line
+        return None
+
+
+def _prefetched(instance, name):
+    return name in getattr(instance, '_prefetched_objects_cache', {})
+
+
+def _load_items(cart):
+    """Cart items with their products, reusing a prefetch if the caller made one"""
+    if _prefetched(cart, 'items'):
+        return list(cart.items.all())
+    return list(cart.items.select_related('product'))
+
+
+def _load_excluded_ids(discount):
+    if discount is None:
+        return frozenset()
+    if _prefetched(discount, 'exclusions'):
+        return frozenset(product.id for product in discount.exclusions.all())
+    return frozenset(discount.exclusions.order_by().values_list('id', flat=True))
+
+
+def price_line(item, discount=None, excluded_ids=frozenset()) -> LinePrice:
+    """
+    Price one item. Mirrors the historical CartItem rules: percentage discounts
+    apply per line unless the product is excluded, fixed discounts only apply
+    to the cart total (discounted_price is None).
+    """
+    unit_price = item.product.base_price
+    base_price = unit_price * item.quantity
+    excluded = discount is not None and item.product_id in excluded_ids
+
+    if discount is None or excluded:
+        discounted_price = base_price
+    elif discount.discount_type == Discount.PERCENTAGE:
+        discounted_price = max(base_price - (base_price * discount.amount) / 100, 0)
+    else:
+        discounted_price = None
+
+    savings = ZERO if discounted_price is None else max(base_price - discounted_price, 0)
+
+    return LinePrice(
+        item_id=item.pk,
+        product_id=item.product_id,
+        quantity=item.quantity,
+        unit_price=unit_price,
+        base_price=base_price,
+        discounted_price=discounted_price,
+        savings=savings,
+        excluded=excluded,
+    )
+
+
+def price_cart(cart) -> CartPriceBreakdown:
+    """
+    Build the price breakdown for a cart in a single pass: items, products and
+    discount exclusions are each loaded once.
+    """
+    discount = cart.discount
+    excluded_ids = _load_excluded_ids(discount)
+    items = _load_items(cart)
+
+    lines = tuple(price_line(item, discount, excluded_ids) for item in items)
+    base_total = sum((line.base_price for line in lines), ZERO)
+    eligible_total = sum((line.base_price for line in lines if not line.excluded), ZERO)
+
+    discount_price = None
+    discounted_total = base_total
+    if discount is not None:
+        active = discount.status[0]
+        if active:
+            if discount.discount_type == Discount.PERCENTAGE:
+                amount_off = (eligible_total * discount.amount) / 100
+            else:
+                amount_off = discount.amount
+            discounted_total = max(base_total - amount_off, ZERO)
+
+        discount_price = DiscountPrice(
+            discount_id=discount.id,
+            code=discount.code,
+            discount_type=discount.discount_type,
+            amount=discount.amount,
+            active=active,
+            min_order_value=discount.min_order_value,
+            eligible_total=eligible_total,
+            amount_off=base_total - discounted_total,
+        )
+
+    total_savings = max(base_total - discounted_total, ZERO).quantize(CENT, rounding=ROUND_UP)
+
+    return CartPriceBreakdown(
+        cart_id=cart.pk,
+        lines=lines,
+        discount=discount_price,
+        base_total=base_total,
+        discounted_total=discounted_total,
+        total_savings=total_savings,
+        is_discount_valid=discount is not None and base_total >= discount.min_order_value,
+        item_count=sum(line.quantity for line in lines),
+    )
+
+
+def get_breakdown(cart) -> CartPriceBreakdown:
+    """Return the cart's breakdown, computing it at most once per cart instance"""
+    breakdown = getattr(cart, '_price_breakdown', None)
+    if breakdown is None:
+        breakdown = price_cart(cart)
+        cart._price_breakdown = breakdown
+    return breakdown
+
+
+def _matches(line, item):
+    return line is not None and line.quantity == item.quantity and line.product_id == item.product_id
+
+
+def get_line(item) -> LinePrice:
+    """Return an item's line from its cart's breakdown, repricing if the line is stale"""
+    cart = item.cart
+    if cart is None:
+        return price_line(item)
+
+    line = get_breakdown(cart).line(item.pk)
+    if not _matches(line, item):
+        invalidate(cart)
+        line = get_breakdown(cart).line(item.pk)
+    if not _matches(line, item):
+        return price_line(item, cart.discount, _load_excluded_ids(cart.discount))
+    return line
+
+
+def invalidate(cart):
+    """Drop a memoized breakdown after the cart or its items change"""
+    cart.__dict__.pop('_price_breakdown', None)
@@ -6,10 +6,15 @@ from allergens.serializers import AllergenSerializer
 from .models import Cart, CartItem, CartItemBoxCustomization, CartItemBoxFlavorSelection
 from products.models import Product
 from products.serializers import ProductSerializer
+from products.catalog import catalog_version
 from discounts.serializers import DiscountSerializer
+from django.db import transaction
 from django.utils import timezone
 from discounts.models import Discount
 
+# Operations accepted by one POST /api/carts/ops/
+MAX_CART_OPERATIONS = 50
+
 class CartItemBoxFlavorSelectionSerializer(serializers.ModelSerializer):
     flavor = FlavourSerializer()
 
@@ -28,9 +33,11 @@ class CartItemBoxCustomizationSerializer(serializers.ModelSerializer):
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer()
     box_customization = CartItemBoxCustomizationSerializer()
-    base_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    discounted_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    savings = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    base_price = serializers.DecimalField(source='price.base_price', max_digits=10, decimal_places=2, read_only=True)
+    discounted_price = serializers.DecimalField(
+        source='price.discounted_price', max_digits=10, decimal_places=2, read_only=True
+    )
+    savings = serializers.DecimalField(source='price.savings', max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
@@ -49,10 +56,16 @@ class CartSerializer(serializers.ModelSerializer):
     discount = DiscountSerializer(read_only=True)
     gift_message = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
     shipping_date = serializers.DateField(required=False, allow_null=True)
-    base_total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    discounted_total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    total_savings = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    is_discount_valid = serializers.BooleanField(read_only=True)
+    base_total = serializers.DecimalField(
+        source='price_breakdown.base_total', max_digits=10, decimal_places=2, read_only=True
+    )
+    discounted_total = serializers.DecimalField(
+        source='price_breakdown.discounted_total', max_digits=10, decimal_places=2, read_only=True
+    )
+    total_savings = serializers.DecimalField(
+        source='price_breakdown.total_savings', max_digits=10, decimal_places=2, read_only=True
+    )
+    is_discount_valid = serializers.BooleanField(source='price_breakdown.is_discount_valid', read_only=True)
 
     class Meta:
         model = Cart
@@ -91,12 +104,110 @@ class CartSerializer(serializers.ModelSerializer):
         return str(sum(item.quantity * item.product.base_price for item in obj.items.all()))
 
 
+# Compact serializers (?view=compact): catalog entries are referenced by ID
+class CompactFlavorSelectionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CartItemBoxFlavorSelection
+        fields = ['id', 'flavor', 'quantity']
+
+class CompactBoxCustomizationSerializer(serializers.ModelSerializer):
+    flavor_selections = CompactFlavorSelectionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CartItemBoxCustomization
+        fields = ['id', 'selection_type', 'allergens', 'flavor_selections']
+
+class CompactCartItemSerializer(serializers.ModelSerializer):
+    box_customization = CompactBoxCustomizationSerializer(read_only=True)
+    base_price = serializers.DecimalField(source='price.base_price', max_digits=10, decimal_places=2, read_only=True)
+    discounted_price = serializers.DecimalField(
+        source='price.discounted_price', max_digits=10, decimal_places=2, read_only=True
+    )
+    savings = serializers.DecimalField(source='price.savings', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = [
+            'id',
+            'quantity',
+            'product',
+            'box_customization',
+            'base_price',
+            'discounted_price',
+            'savings'
+        ]
+
+class CompactDiscountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Discount
+        fields = ['id', 'title', 'code', 'discount_type', 'amount', 'min_order_value', 'exclusions']
+
+class CompactCartSerializer(serializers.ModelSerializer):
+    items = CompactCartItemSerializer(many=True, read_only=True)
+    discount = CompactDiscountSerializer(read_only=True)
+    catalog_version = serializers.SerializerMethodField()
+    base_total = serializers.DecimalField(
+        source='price_breakdown.base_total', max_digits=10, decimal_places=2, read_only=True
+    )
+    discounted_total = serializers.DecimalField(
+        source='price_breakdown.discounted_total', max_digits=10, decimal_places=2, read_only=True
+    )
+    total_savings = serializers.DecimalField(
+        source='price_breakdown.total_savings', max_digits=10, decimal_places=2, read_only=True
+    )
+    is_discount_valid = serializers.BooleanField(source='price_breakdown.is_discount_valid', read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = [
+            'id',
+            'catalog_version',
+            'items',
+            'discount',
+            'gift_message',
+            'shipping_date',
+            'base_total',
+            'discounted_total',
+            'total_savings',
+            'is_discount_valid',
+            'created',
+            'updated'
+        ]
+        read_only_fields = fields
+
+    def get_catalog_version(self, obj):
+        return catalog_version()
+
+
 # Write serializers (for POST/PUT requests)
 class CartItemBoxFlavorSelectionCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItemBoxFlavorSelection
         fields = ['flavor', 'quantity']
 
+def validate_box_customization(product, box_customization):
+    """Check a box's flavour selections fit its selection type and size"""
+    if box_customization:
+        # Only validate flavor selections for PICK_AND_MIX
+        if box_customization.get('selection_type') == 'PICK_AND_MIX':
+            flavor_selections = box_customization.get('flavor_selections', [])
+            total_quantity = sum(fs['quantity'] for fs in flavor_selections)
+
+            if total_quantity != product.units_per_box:
+                raise serializers.ValidationError({
+                    'box_customization': {
+                        'flavor_selections': f"Total flavor quantity must equal {product.units_per_box} (got {total_quantity})"
+                    }
+                })
+        elif box_customization.get('selection_type') == 'RANDOM':
+            # For RANDOM selection, flavor_selections should be empty or None
+            if box_customization.get('flavor_selections'):
+                raise serializers.ValidationError({
+                    'box_customization': {
+                        'flavor_selections': "Flavor selections should not be provided for RANDOM selection type"
+                    }
+                })
+
 class CartItemBoxCustomizationCreateSerializer(serializers.ModelSerializer):
     flavor_selections = CartItemBoxFlavorSelectionCreateSerializer(many=True, required=False)
     allergens = serializers.PrimaryKeyRelatedField(
@@ -119,30 +230,7 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """Validate the complete data set"""
-        product = data['product']
-        box_customization = data.get('box_customization', None)
-
-        if box_customization:
-            # Only validate flavor selections for PICK_AND_MIX
-            if box_customization.get('selection_type') == 'PICK_AND_MIX':
-                flavor_selections = box_customization.get('flavor_selections', [])
-                total_quantity = sum(fs['quantity'] for fs in flavor_selections)
-
-                if total_quantity != product.units_per_box:
-                    raise serializers.ValidationError({
-                        'box_customization': {
-                            'flavor_selections': f"Total flavor quantity must equal {product.units_per_box} (got {total_quantity})"
-                        }
-                    })
-            elif box_customization.get('selection_type') == 'RANDOM':
-                # For RANDOM selection, flavor_selections should be empty or None
-                if box_customization.get('flavor_selections'):
-                    raise serializers.ValidationError({
-                        'box_customization': {
-                            'flavor_selections': "Flavor selections should not be provided for RANDOM selection type"
-                        }
-                    })
-
+        validate_box_customization(data['product'], data.get('box_customization', None))
         return data
 
     def create(self, validated_data):
@@ -260,3 +348,137 @@ class CartItemQuantityUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
+
+
+# Batch operations (POST /api/carts/ops/)
+class CartOperationFlavorSelectionSerializer(serializers.Serializer):
+    flavor = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class CartOperationBoxCustomizationSerializer(serializers.Serializer):
+    selection_type = serializers.ChoiceField(choices=CartItemBoxCustomization.SELECTION_TYPE_CHOICES)
+    allergens = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    flavor_selections = CartOperationFlavorSelectionSerializer(many=True, required=False, default=list)
+
+class CartOperationSerializer(serializers.Serializer):
+    ADD = 'add'
+    UPDATE = 'update'
+    REMOVE = 'remove'
+
+    op = serializers.ChoiceField(choices=[ADD, UPDATE, REMOVE])
+    item = serializers.IntegerField(required=False, help_text="Cart item ID, for update and remove")
+    product = serializers.IntegerField(required=False, help_text="Product ID, for add")
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    box_customization = CartOperationBoxCustomizationSerializer(required=False)
+
+    def validate(self, data):
+        if data['op'] == self.ADD and 'product' not in data:
+            raise serializers.ValidationError({'product': "This field is required to add an item."})
+        if data['op'] in (self.UPDATE, self.REMOVE) and 'item' not in data:
+            raise serializers.ValidationError({'item': f"This field is required to {data['op']} an item."})
+        if data['op'] == self.UPDATE and 'quantity' not in data:
+            raise serializers.ValidationError({'quantity': "This field is required to update an item."})
+        return data
+
+class CartOperationsSerializer(serializers.Serializer):
+    """
+    An ordered list of add, update (quantity) and remove operations applied to
+    the cart in context as one unit.
+
+    Validation replays the operations against the cart's loaded items and
+    looks up every referenced product, allergen and flavour in one query each.
+    Saving then writes the result with bulk statements in one transaction.
+    """
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=MAX_CART_OPERATIONS)
+
+    def validate(self, data):
+        cart = self.context['cart']
+        operations = data['operations']
+        adds = [operation for operation in operations if operation['op'] == CartOperationSerializer.ADD]
+        boxes = [operation['box_customization'] for operation in adds if operation.get('box_customization')]
+
+        products = Product.objects.in_bulk({operation['product'] for operation in adds})
+        allergens = set(Allergen.objects.filter(
+            pk__in={allergen for box in boxes for allergen in box['allergens']}
+        ).values_list('pk', flat=True))
+        flavours = set(Flavour.objects.filter(
+            pk__in={selection['flavor'] for box in boxes for selection in box['flavor_selections']}
+        ).values_list('pk', flat=True))
+
+        items = {item.id: item for item in cart.items.all()}
+        quantities = {}
+        created = []
+        errors = {}
+        for index, operation in enumerate(operations):
+            try:
+                if operation['op'] == CartOperationSerializer.ADD:
+                    product = products.get(operation['product'])
+                    if product is None:
+                        raise serializers.ValidationError({'product': "Product not found"})
+                    box = operation.get('box_customization')
+                    validate_box_customization(product, box)
+                    if box:
+                        if not allergens.issuperset(box['allergens']):
+                            raise serializers.ValidationError({'box_customization': {'allergens': "Allergen not found"}})
+                        if not flavours.issuperset(selection['flavor'] for selection in box['flavor_selections']):
+                            raise serializers.ValidationError({
+                                'box_customization': {'flavor_selections': "Flavour not found"}
+                            })
+                    created.append((product, operation.get('quantity', 1), box))
+                elif operation['item'] not in items:
+                    raise serializers.ValidationError({'item': "Item not found in cart"})
+                elif operation['op'] == CartOperationSerializer.UPDATE:
+                    quantities[operation['item']] = operation['quantity']
+                else:
+                    items.pop(operation['item'])
+                    quantities.pop(operation['item'], None)
+            except serializers.ValidationError as e:
+                errors[index] = e.detail
+
+        if errors:
+            raise serializers.ValidationError({'operations': errors})
+
+        removed = [item.id for item in cart.items.all() if item.id not in items]
+        updated = []
+        for item_id, quantity in quantities.items():
+            items[item_id].quantity = quantity
+            updated.append(items[item_id])
+        return {'removed': removed, 'updated': updated, 'created': created}
+
+    def create(self, validated_data):
+        cart = self.context['cart']
+        created = validated_data['created']
+
+        with transaction.atomic():
+            if validated_data['removed']:
+                CartItem.objects.filter(cart=cart, pk__in=validated_data['removed']).delete()
+            if validated_data['updated']:
+                CartItem.objects.bulk_update(validated_data['updated'], ['quantity'])
+
+            new_items = CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=quantity)
+                for product, quantity, _ in created
+            ])
+            boxed = [(item, box) for item, (_, _, box) in zip(new_items, created) if box]
+            customizations = CartItemBoxCustomization.objects.bulk_create([
+                CartItemBoxCustomization(cart_item=item, selection_type=box['selection_type'])
+                for item, box in boxed
+            ])
+
+            AllergenLink = CartItemBoxCustomization.allergens.through
+            AllergenLink.objects.bulk_create([
+                AllergenLink(cartitemboxcustomization_id=customization.pk, allergen_id=allergen)
+                for customization, (_, box) in zip(customizations, boxed)
+                for allergen in dict.fromkeys(box['allergens'])
+            ])
+            CartItemBoxFlavorSelection.objects.bulk_create([
+                CartItemBoxFlavorSelection(
+                    box_customization=customization,
+                    flavor_id=selection['flavor'],
+                    quantity=selection['quantity']
+                )
+                for customization, (_, box) in zip(customizations, boxed)
+                for selection in box['flavor_selections']
+            ])
+
+        return cart
@@ -1,4 +1,8 @@
+from datetime import timedelta
 from decimal import Decimal
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from .test_base import BaseAPITest
 from carts.models import Cart
 
@@ -10,7 +14,7 @@ class CartAPITest(BaseAPITest):
         self.assertEqual(response.status_code, 200)
         self.assertIn('id', response.data)
         self.assertIn('items', response.data)
-        self.assertIn('total', response.data)
+        self.assertIn('discounted_total', response.data)
 
         # Verify cart was created
         cart_id = response.data['id']
@@ -49,7 +53,7 @@ class CartAPITest(BaseAPITest):
         self.assertEqual(len(response.data['items']), 1)
         self.assertEqual(response.data['items'][0]['product']['id'], 4)  # Changed to match product ID
         self.assertEqual(response.data['items'][0]['quantity'], 2)
-        self.assertEqual(response.data['total'], '29.98')  # 14.99 * 2
+        self.assertEqual(response.data['discounted_total'], '29.98')  # 14.99 * 2
 
     def test_add_item_to_cart_random(self):
         """Test POST /api/carts/items/ endpoint"""
@@ -74,7 +78,7 @@ class CartAPITest(BaseAPITest):
         self.assertEqual(len(response.data['items']), 1)
 
         # Verify cart total
-        self.assertEqual(response.data['total'], '29.98')  # 14.99 * 2
+        self.assertEqual(response.data['discounted_total'], '29.98')  # 14.99 * 2
 
     def test_update_cart_details(self):
         """Test POST /api/carts/ endpoint"""
@@ -82,10 +86,11 @@ class CartAPITest(BaseAPITest):
         cart_response = self.client.get('/api/carts/')
 
         # Update cart details
+        shipping_date = (timezone.now().date() + timedelta(days=30)).isoformat()
         data = {
             "discount_code": "NEWS10",  # Changed from discount to discount_code
             "gift_message": "Happy Birthday!",
-            "shipping_date": "2024-12-25"
+            "shipping_date": shipping_date
         }
 
         response = self.client.post('/api/carts/', data, format='json')
@@ -97,8 +102,94 @@ class CartAPITest(BaseAPITest):
         # Access the nested cart data
         cart_data = response.data['cart']
         self.assertEqual(cart_data['gift_message'], "Happy Birthday!")
-        self.assertEqual(cart_data['shipping_date'], "2024-12-25")
+        self.assertEqual(cart_data['shipping_date'], shipping_date)
 
         # If you need to verify the discount was applied
         if 'discount' in cart_data and cart_data['discount']:
             self.assertEqual(cart_data['discount']['code'], "NEWS10")
+
+    def test_get_cart_compact(self):
+        """Test GET /api/carts/?view=compact references catalog entries by ID"""
+        self.client.get('/api/carts/')
+        self.client.post('/api/carts/items/', {
+            "product": 4,
+            "quantity": 1,
+            "box_customization": {
+                "selection_type": "PICK_AND_MIX",
+                "allergens": [1],
+                "flavor_selections": [{"flavor": 1, "quantity": 9}]
+            }
+        }, format='json')
+
+        response = self.client.get('/api/carts/?view=compact')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['catalog_version'])
+        item = response.data['items'][0]
+        self.assertEqual(item['product'], 4)
+        self.assertEqual(item['box_customization']['allergens'], [1])
+        self.assertEqual(item['box_customization']['flavor_selections'][0]['flavor'], 1)
+        self.assertEqual(response.data['base_total'], '14.99')
+
+
+class CartOperationsTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.client.get('/api/carts/')
+
+    def box(self, flavour_ids, per_flavour):
+        return {
+            "selection_type": "PICK_AND_MIX",
+            "allergens": [1],
+            "flavor_selections": [{"flavor": flavour_id, "quantity": per_flavour} for flavour_id in flavour_ids]
+        }
+
+    def apply(self, *operations):
+        return self.client.post('/api/carts/ops/', {"operations": list(operations)}, format='json')
+
+    def test_operations_applied_in_order(self):
+        """Test POST /api/carts/ops/ adds, updates and removes items in one request"""
+        response = self.apply(
+            {"op": "add", "product": 4, "box_customization": self.box([1, 2, 3], 3)},
+            {"op": "add", "product": 3, "quantity": 2, "box_customization": self.box([1, 2, 3], 5)},
+            {"op": "add", "product": 4, "box_customization": {"selection_type": "RANDOM", "allergens": [1, 2]}},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 3)
+        first, second, random = (item['id'] for item in response.data['items'])
+
+        response = self.apply(
+            {"op": "update", "item": first, "quantity": 4},
+            {"op": "remove", "item": second},
+            {"op": "update", "item": random, "quantity": 2},
+            {"op": "remove", "item": random},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['id'], item['quantity']) for item in response.data['items']], [(first, 4)])
+        selections = response.data['items'][0]['box_customization']['flavor_selections']
+        self.assertEqual(len(selections), 3)
+
+    def test_invalid_operation_applies_nothing(self):
+        """Test one invalid operation rejects the batch with errors keyed by its index"""
+        response = self.apply(
+            {"op": "add", "product": 4, "box_customization": self.box([1], 9)},
+            {"op": "add", "product": 4, "box_customization": self.box([1], 8)},
+            {"op": "remove", "item": 999},
+            {"op": "add", "product": 999},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['operations']), {1, 2, 3})
+        self.assertFalse(Cart.objects.get(pk=self.client.session['cart_id']).items.exists())
+
+    def test_query_count_does_not_grow_with_operations(self):
+        """Test a batch writes with bulk statements rather than per operation"""
+        with CaptureQueriesContext(connection) as small:
+            self.apply({"op": "add", "product": 4, "box_customization": self.box([1, 2, 3], 3)})
+        with CaptureQueriesContext(connection) as large:
+            self.apply(*[
+                {"op": "add", "product": product_id, "box_customization": self.box([1, 2, 3], per_flavour)}
+                for product_id, per_flavour in [(1, 16), (2, 8), (3, 5), (4, 3)]
+            ])
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
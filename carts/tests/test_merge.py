@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .test_base import BaseAPITest
+from carts.models import Cart, CartItem, CartItemBoxCustomization, CartItemBoxFlavorSelection
+from discounts.models import Discount
+
+
+class CartMergeTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='shopper@example.com', password='chocolate')
+        response = self.client.get('/api/carts/')
+        self.guest_cart = Cart.objects.get(pk=response.data['id'])
+
+    def add_box(self, cart, product_id, flavour_ids, quantity=1):
+        item = CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+        customization = CartItemBoxCustomization.objects.create(cart_item=item, selection_type='PICK_AND_MIX')
+        customization.allergens.set([1])
+        for flavour_id in flavour_ids:
+            CartItemBoxFlavorSelection.objects.create(
+                box_customization=customization,
+                flavor_id=flavour_id,
+                quantity=1
+            )
+        return item
+
+    def login(self):
+        response = self.client.post('/api/users/jwt/create/', {
+            'email': 'shopper@example.com',
+            'password': 'chocolate',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        return response
+
+    def test_guest_cart_becomes_user_cart(self):
+        """Test logging in moves the guest's lines, customizations and discount into a new user cart"""
+        item = self.add_box(self.guest_cart, 1, [1, 2])
+        self.guest_cart.discount = Discount.objects.get(code='NEWS10')
+        self.guest_cart.save()
+
+        self.login()
+
+        cart = Cart.objects.get(user=self.user, active=True)
+        self.assertEqual(cart.discount.code, 'NEWS10')
+        item.refresh_from_db()
+        self.assertEqual(item.cart, cart)
+        self.assertEqual(item.box_customization.flavor_selections.count(), 2)
+        self.guest_cart.refresh_from_db()
+        self.assertFalse(self.guest_cart.active)
+        self.assertNotIn('cart_id', self.client.session)
+
+    def test_identical_lines_are_summed(self):
+        """Test lines the user's cart already has are collapsed by adding quantities"""
+        user_cart = Cart.objects.create(user=self.user)
+        kept = self.add_box(user_cart, 1, [1, 2], quantity=2)
+        self.add_box(self.guest_cart, 1, [1, 2], quantity=3)
+        different = self.add_box(self.guest_cart, 1, [1, 3])
+        plain = CartItem.objects.create(cart=self.guest_cart, product_id=2, quantity=1)
+        CartItem.objects.create(cart=self.guest_cart, product_id=2, quantity=4)
+
+        self.login()
+
+        quantities = dict(user_cart.items.values_list('id', 'quantity'))
+        self.assertEqual(quantities, {kept.id: 5, different.id: 1, plain.id: 5})
+        self.assertFalse(self.guest_cart.items.exists())
+        self.assertEqual(CartItemBoxCustomization.objects.filter(cart_item__cart=user_cart).count(), 2)
+
+    def test_merge_runs_a_fixed_number_of_queries(self):
+        """Test the merge does not issue statements per line"""
+        user_cart = Cart.objects.create(user=self.user)
+        request = self.client.get('/api/carts/').wsgi_request
+
+        self.add_box(user_cart, 1, [1, 2])
+        self.add_box(self.guest_cart, 1, [1, 2])
+        CartItem.objects.create(cart=self.guest_cart, product_id=2)
+        with CaptureQueriesContext(connection) as small:
+            Cart.objects.merge_session_cart(request, self.user)
+
+        for product_id in (2, 3, 4):
+            self.add_box(self.guest_cart, product_id, [1, 2, 3])
+            self.add_box(user_cart, product_id, [1, 2, 3])
+        CartItem.objects.create(cart=self.guest_cart, product_id=1)
+        Cart.objects.filter(pk=self.guest_cart.pk).update(active=True)
+        with CaptureQueriesContext(connection) as large:
+            Cart.objects.merge_session_cart(request, self.user)
+
+        self.assertEqual(user_cart.items.count(), 6)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_login_without_guest_cart_items(self):
+        """Test logging in with an empty guest cart leaves both carts as they were"""
+        self.login()
+
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.guest_cart.refresh_from_db()
+        self.assertTrue(self.guest_cart.active)
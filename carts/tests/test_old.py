@@ -1,8 +1,7 @@
-from django.test import TestCase, Client
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from .models import Cart, CartItem
+from carts.models import Cart, CartItem
 from products.models import Product, ProductCategory
 from flavours.models import Flavour, FlavourCategory
 from allergens.models import Allergen
@@ -15,9 +14,8 @@ logger = logging.getLogger(__name__)
 class CartAPITests(APITestCase):
     def setUp(self):
         """Set up test data"""
-        self.client = Client()
-        self.cart_url = reverse('session-cart')
-        self.items_url = reverse('cart-items')
+        self.cart_url = reverse('cart')
+        self.items_url = reverse('cart-items-list')
 
         # Create test product category
         self.category = ProductCategory.objects.create(
@@ -78,7 +76,7 @@ class CartAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('id', response.data)
         self.assertEqual(response.data['items'], [])
-        self.assertEqual(response.data['total'], '0')
+        self.assertEqual(response.data['discounted_total'], '0.00')
 
     def test_get_existing_session_cart(self):
         """Test retrieving an existing session cart"""
@@ -0,0 +1,61 @@
+from decimal import Decimal
+from .test_base import BaseAPITest
+from carts.models import Cart, CartItem
+from carts import pricing
+from discounts.models import Discount
+from products.models import Product
+
+
+class CartPricingTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.cart = Cart.objects.create(session_id='pricing-test')
+        self.box_48 = CartItem.objects.create(cart=self.cart, product_id=1, quantity=1)  # 74.99
+        self.box_9 = CartItem.objects.create(cart=self.cart, product_id=4, quantity=2)   # 14.99 * 2
+
+    def test_breakdown_without_discount(self):
+        breakdown = pricing.price_cart(self.cart)
+
+        self.assertEqual(breakdown.base_total, Decimal('104.97'))
+        self.assertEqual(breakdown.discounted_total, Decimal('104.97'))
+        self.assertEqual(breakdown.total_savings, Decimal('0.00'))
+        self.assertFalse(breakdown.is_discount_valid)
+        self.assertEqual(breakdown.item_count, 3)
+        self.assertEqual(breakdown.line(self.box_9.pk).base_price, Decimal('29.98'))
+
+    def test_percentage_discount_with_exclusion(self):
+        discount = Discount.objects.get(code='NEWS10')
+        discount.exclusions.add(Product.objects.get(pk=1))
+        self.cart.discount = discount
+        self.cart.save()
+
+        breakdown = pricing.price_cart(self.cart)
+
+        self.assertEqual(breakdown.discount.eligible_total, Decimal('29.98'))
+        self.assertEqual(breakdown.discounted_total, Decimal('101.972'))
+        self.assertEqual(breakdown.total_savings, Decimal('3.00'))
+        self.assertTrue(breakdown.is_discount_valid)
+        self.assertTrue(breakdown.line(self.box_48.pk).excluded)
+        self.assertEqual(breakdown.line(self.box_9.pk).savings, Decimal('2.998'))
+
+    def test_properties_share_one_breakdown(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        cart.discount = Discount.objects.get(code='NEWS10')
+        cart.save()
+
+        # items with products, discount exclusions, and the loop's own item query
+        with self.assertNumQueries(3):
+            cart.base_total
+            cart.discounted_total
+            cart.total_savings
+            cart.is_discount_valid
+            for item in cart.items.all():
+                item.discounted_price
+
+    def test_refresh_from_db_invalidates_breakdown(self):
+        self.assertEqual(self.cart.base_total, Decimal('104.97'))
+
+        self.box_9.delete()
+        self.cart.refresh_from_db()
+
+        self.assertEqual(self.cart.base_total, Decimal('74.99'))
@@ -0,0 +1,68 @@
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from .test_base import BaseAPITest
+from carts.models import Cart, CartItem, CartItemBoxCustomization, CartItemBoxFlavorSelection
+from discounts.models import Discount
+from products.models import Product
+
+# Ceiling for GET /api/carts/ including session and cart lookup queries.
+CART_GET_QUERY_BUDGET = 16
+
+
+class CartQueryBudgetTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        response = self.client.get('/api/carts/')
+        self.cart = Cart.objects.get(pk=response.data['id'])
+        self.cart.discount = Discount.objects.get(code='NEWS10')
+        self.cart.discount.exclusions.add(Product.objects.get(pk=1))
+        self.cart.save()
+
+    def add_pick_and_mix(self, product_id, flavour_ids):
+        item = CartItem.objects.create(cart=self.cart, product_id=product_id, quantity=1)
+        customization = CartItemBoxCustomization.objects.create(
+            cart_item=item,
+            selection_type='PICK_AND_MIX'
+        )
+        customization.allergens.set([1])
+        for flavour_id in flavour_ids:
+            CartItemBoxFlavorSelection.objects.create(
+                box_customization=customization,
+                flavor_id=flavour_id,
+                quantity=1
+            )
+
+    def count_get_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/carts/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        """GET /api/carts/ runs a fixed number of queries regardless of items or flavours"""
+        self.add_pick_and_mix(4, [1, 2])
+        small = self.count_get_queries()
+
+        for product_id in (1, 2, 3):
+            self.add_pick_and_mix(product_id, range(1, 10))
+        large = self.count_get_queries()
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, CART_GET_QUERY_BUDGET)
+
+    def test_repeat_get_takes_no_lock_and_writes_nothing(self):
+        """GET /api/carts/ finds the cart through the session pointer without locking or writing"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/carts/')
+
+        self.assertEqual(response.data['id'], self.cart.id)
+        self.assertEqual(self.client.session['cart_id'], self.cart.id)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertFalse([sql for sql in statements if 'FOR UPDATE' in sql or not sql.startswith('SELECT')])
+
+    def test_one_active_cart_per_session(self):
+        """The partial unique constraint rejects a second active cart for a session"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(session_id=self.cart.session_id, active=True)
+
+        Cart.objects.create(session_id=self.cart.session_id, active=False)
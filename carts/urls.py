@@ -1,10 +1,11 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import CartView, CartItemViewSet
+from .views import CartView, CartItemViewSet, CartOperationsView
 
 router = DefaultRouter()
 router.register(r'items', CartItemViewSet, basename='cart-items')
 
 carts_urls = [
     path('', CartView.as_view(), name='cart'),
+    path('ops/', CartOperationsView.as_view(), name='cart-ops'),
 ] + router.urls
@@ -2,7 +2,15 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Cart, CartItem, Product
-from .serializers import CartSerializer, CartItemCreateSerializer, CartUpdateSerializer, CartItemQuantityUpdateSerializer
+from .serializers import (
+    CartSerializer,
+    CompactCartSerializer,
+    CartItemCreateSerializer,
+    CartUpdateSerializer,
+    CartItemQuantityUpdateSerializer,
+    CartOperationsSerializer,
+    MAX_CART_OPERATIONS
+)
 from products.models import Product
 import logging
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, inline_serializer
@@ -15,6 +23,26 @@ from django.shortcuts import get_object_or_404
 
 logger = logging.getLogger(__name__)
 
+
+CART_VIEW_COMPACT = 'compact'
+
+CART_VIEW_PARAMETER = OpenApiParameter(
+    name='view',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    required=False,
+    enum=[CART_VIEW_COMPACT],
+    description="Use 'compact' to reference products and flavours by ID instead of embedding them"
+)
+
+
+def cart_data(request, cart):
+    """Serialize a cart in the representation the request asked for"""
+    if request.query_params.get('view') == CART_VIEW_COMPACT:
+        return CompactCartSerializer(Cart.objects.prefetch_compact_tree(cart)).data
+    return CartSerializer(Cart.objects.prefetch_display_tree(cart)).data
+
+
 class CartView(APIView):
     def get_cart(self, request):
         cart, _ = Cart.objects.get_or_create_from_request(request)
@@ -23,13 +51,13 @@ class CartView(APIView):
     @extend_schema(
         summary="Get or create session cart",
         description="Returns the current cart for the session or creates a new one",
+        parameters=[CART_VIEW_PARAMETER],
         responses={200: CartSerializer}
     )
     def get(self, request):
         """Get or create a session cart"""
         cart = self.get_cart(request)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return Response(cart_data(request, cart))
 
     @extend_schema(
         summary="Update cart details",
@@ -114,12 +142,65 @@ class CartView(APIView):
             cart = serializer.save()
             return Response({
                 "detail": "Cart updated successfully",
-                "cart": CartSerializer(cart).data
+                "cart": cart_data(request, cart)
             })
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CartOperationsView(APIView):
+    @extend_schema(
+        summary="Apply several cart item operations",
+        request=CartOperationsSerializer,
+        parameters=[CART_VIEW_PARAMETER],
+        responses={
+            200: CartSerializer,
+            400: OpenApiTypes.OBJECT
+        },
+        examples=[
+            OpenApiExample(
+                'Build A Box Example',
+                value={
+                    "operations": [
+                        {
+                            "op": "add",
+                            "product": 1,
+                            "quantity": 1,
+                            "box_customization": {
+                                "selection_type": "PICK_AND_MIX",
+                                "allergens": [1],
+                                "flavor_selections": [
+                                    {"flavor": 1, "quantity": 24},
+                                    {"flavor": 2, "quantity": 24}
+                                ]
+                            }
+                        },
+                        {"op": "update", "item": 7, "quantity": 2},
+                        {"op": "remove", "item": 8}
+                    ]
+                },
+                request_only=True,
+            )
+        ],
+        description=(
+            f"Applies up to {MAX_CART_OPERATIONS} add, update (quantity) and remove operations in order, "
+            "all or none, and returns the resulting cart. Errors are keyed by operation index."
+        )
+    )
+    def post(self, request):
+        """POST /ops/"""
+        cart, _ = Cart.objects.get_or_create_from_request(request)
+        serializer = CartOperationsSerializer(data=request.data, context={'cart': cart})
+
+        if serializer.is_valid():
+            serializer.save()
+            cart.refresh_from_db()
+            return Response(cart_data(request, cart), status=status.HTTP_200_OK)
+
+        logger.debug(f"Cart operations validation errors: {serializer.errors}")
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class CartItemViewSet(viewsets.ViewSet):
 
     @extend_schema(
@@ -188,7 +269,7 @@ class CartItemViewSet(viewsets.ViewSet):
             try:
                 cart_item = serializer.save(cart=cart)
                 cart.refresh_from_db()
-                return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
+                return Response(cart_data(request, cart), status=status.HTTP_201_CREATED)
             except Exception as e:
                 logger.error(f"Error creating cart item: {str(e)}")
                 return Response(
@@ -233,7 +314,7 @@ class CartItemViewSet(viewsets.ViewSet):
         if serializer.is_valid():
             cart_item = serializer.save()
             cart.refresh_from_db()
-            return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+            return Response(cart_data(request, cart), status=status.HTTP_200_OK)
 
         logger.debug(f"Update validation errors: {serializer.errors}")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -248,7 +329,7 @@ class CartItemViewSet(viewsets.ViewSet):
         cart_item = CartItem.objects.get(pk=pk, cart=cart)
         cart_item.delete()
         cart.refresh_from_db()
-        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+        return Response(cart_data(request, cart), status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['delete'], url_path='remove', url_name='remove')
     @extend_schema(
@@ -264,8 +345,7 @@ class CartItemViewSet(viewsets.ViewSet):
         cart_item = get_object_or_404(CartItem, pk=pk, cart=cart)
         cart_item.delete()
         cart.refresh_from_db()
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(cart_data(request, cart), status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['patch'], url_path='change-quantity', url_name='change_quantity')
     @extend_schema(
@@ -285,6 +365,6 @@ class CartItemViewSet(viewsets.ViewSet):
         if serializer.is_valid():
             serializer.save()
             cart.refresh_from_db()
-            return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+            return Response(cart_data(request, cart), status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.admin import register
-from checkout.models import CheckoutSession
+from checkout.models import CheckoutSession, ProcessedWebhookEvent
 
 
 # Register your models here.
@@ -9,3 +9,9 @@ class CheckoutSessionAdmin(admin.ModelAdmin):
     list_display = ('id', 'cart', 'email', 'created')
     search_fields = ('cart__id', 'email')
     list_filter = ('created',)
+
+@register(ProcessedWebhookEvent)
+class ProcessedWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'status_code', 'duration_ms', 'received')
+    search_fields = ('event_id',)
+    list_filter = ('event_type', 'received')
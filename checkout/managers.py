@@ -2,15 +2,21 @@ from django.db import models
 from django.core.exceptions import ValidationError
 import structlog
 
+from erp.request_scope import request_memo
+
 logger = structlog.get_logger(__name__)
 
 class CheckoutSessionManager(models.Manager):
     def get_or_create_from_request(self, request):
         """
-        Get or create checkout session from request.
+        Get or create checkout session from request, once per request.
         """
         from carts.models import Cart
 
+        memo = request_memo(request)
+        if 'checkout_session' in memo:
+            return memo['checkout_session']
+
         logger.info(
             "checkout_session_request_started",
             user_id=getattr(request.user, 'id', None),
@@ -29,20 +35,24 @@ class CheckoutSessionManager(models.Manager):
                 is_new_cart=is_new_cart,
                 user_id=cart.user_id if cart.user else None,
                 session_id=cart.session_id,
-                items_count=cart.items.count(),
+                items_count=len(cart.items.all()),
                 cart_active=cart.active
             )
 
             # Check for non-paid sessions
-            existing_sessions = self.filter(
+            existing_sessions = list(self.filter(
                 cart=cart,
                 payment_status=self.model.Status.PENDING
-            ).select_related('cart')
+            ).select_related(
+                'shipping_address',
+                'billing_address',
+                'shipping_option'
+            ).order_by('-created'))
 
             logger.debug(
                 "existing_sessions_check",
                 cart_id=cart.id,
-                sessions_count=existing_sessions.count(),
+                sessions_count=len(existing_sessions),
                 sessions=[{
                     'id': s.id,
                     'status': s.payment_status,
@@ -50,14 +60,14 @@ class CheckoutSessionManager(models.Manager):
                 } for s in existing_sessions]
             )
 
-            existing_session = existing_sessions.order_by('-created').first()
+            existing_session = existing_sessions[0] if existing_sessions else None
 
             if existing_session:
                 logger.info(
                     "existing_checkout_session_found",
                     checkout_session_id=existing_session.id,
                     cart_id=cart.id,
-                    items_count=cart.items.count(),
+                    items_count=len(cart.items.all()),
                     payment_status=existing_session.payment_status,
                     created=existing_session.created
                 )
@@ -65,6 +75,9 @@ class CheckoutSessionManager(models.Manager):
                 if not cart.user and 'email' in request.data:
                     existing_session.email = request.data['email']
                     existing_session.save(update_fields=['email'])
+                # Share the request's cart, items already loaded
+                existing_session.cart = cart
+                memo['checkout_session'] = existing_session
                 return existing_session
 
             # Create new session
@@ -86,11 +99,12 @@ class CheckoutSessionManager(models.Manager):
                 "new_checkout_session_created",
                 checkout_session_id=checkout_session.id,
                 cart_id=cart.id,
-                items_count=cart.items.count(),
+                items_count=len(cart.items.all()),
                 is_guest=not cart.user,
                 email=email
             )
 
+            memo['checkout_session'] = checkout_session
             return checkout_session
 
         except Exception as e:
@@ -117,7 +131,8 @@ class CheckoutSessionManager(models.Manager):
             if not session.email and not session.cart.user:
                 raise ValidationError("Email is required for guest checkout")
 
-            if not session.cart.items.exists():
+            items = list(session.cart.items.all())
+            if not items:
                 raise ValidationError("Cart is empty")
 
             if session.payment_status != self.model.Status.PENDING:
@@ -127,7 +142,7 @@ class CheckoutSessionManager(models.Manager):
                 "checkout_session_validated",
                 checkout_session_id=session.id,
                 cart_id=session.cart.id,
-                items_count=session.cart.items.count()
+                items_count=len(items)
             )
 
             return session
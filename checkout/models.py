@@ -80,7 +80,7 @@ class CheckoutSession(models.Model):
 
         # Free shipping logic for Regular 48
         if (self.shipping_option.delivery_speed == 'REGULAR' and
-            self.cart.base_total >= 50):
+            self.cart.price_breakdown.base_total >= 50):
             return 0
 
         return self.shipping_option.cents
@@ -95,7 +95,7 @@ class CheckoutSession(models.Model):
     @property
     def total_with_shipping(self):
         # Ensure that both cart.total and shipping_cost_pounds are Decimals
-        cart_total = Decimal(self.cart.total)
+        cart_total = Decimal(self.cart.price_breakdown.total)
         shipping = self.shipping_cost_pounds
 
         # Calculate the total
@@ -127,3 +127,20 @@ class CheckoutSession(models.Model):
         }
 
 
+class ProcessedWebhookEvent(models.Model):
+    """
+    Ledger of handled Stripe webhook events. The row is inserted in the same
+    transaction as the event's effects, so a redelivered event is rejected by
+    the unique event_id while a rolled-back one can be processed again.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Time spent handling the event")
+    received = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-received']
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
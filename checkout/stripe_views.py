@@ -6,10 +6,11 @@ from django.conf import settings
 from checkout.models import CheckoutSession
 from rest_framework.exceptions import ValidationError
 from carts.models import Cart
-from django.core.mail import send_mail
+from erp.async_views import AsyncAPIView
 
 import stripe
 import structlog
+from asgiref.sync import sync_to_async
 from datetime import timedelta
 from django.utils import timezone
 
@@ -17,12 +18,127 @@ logger = structlog.get_logger(__name__)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
-class StripeCheckoutSessionView(APIView):
+class StripeCheckoutSessionView(AsyncAPIView):
     """
     Creates a Stripe Checkout Session and redirects to Stripe's hosted checkout page.
     Requires an active cart and checkout session with shipping address.
     """
 
+    def prepare_session(self, request):
+        """Validate the cart and build the Stripe session parameters"""
+        # Get or create the checkout session from the request
+        checkout_session = CheckoutSession.objects.get_or_create_from_request(request)
+
+        logger.info(
+            "checkout_session_retrieved",
+            checkout_session_id=checkout_session.id,
+            cart_id=checkout_session.cart.id if checkout_session.cart else None
+        )
+
+        # Validate shipping address
+        if not checkout_session.shipping_address:
+            raise ValidationError("Shipping address is required")
+
+        # Cart items, with products, as loaded for this request
+        cart_items = list(checkout_session.cart.items.all())
+
+        logger.debug(
+            "cart_items_check",
+            cart_id=checkout_session.cart.id,
+            items_count=len(cart_items),
+            items=[{
+                'id': item.id,
+                'product_id': item.product.id,
+                'quantity': item.quantity,
+                'stripe_price_id': item.product.stripe_price_id
+            } for item in cart_items]
+        )
+
+        if not cart_items:
+            raise ValidationError("Cart is empty")
+
+        # Create line items for Stripe
+        line_items = []
+        for item in cart_items:
+            if not item.product.stripe_price_id:
+                logger.error(
+                    "missing_stripe_price",
+                    product_id=item.product.id,
+                    product_name=item.product.name
+                )
+                raise ValidationError(f"Product {item.product.name} is not configured for payment")
+
+            line_items.append({
+                'price': item.product.stripe_price_id,
+                'quantity': item.quantity,
+                'adjustable_quantity': {
+                    'enabled': True,
+                    'minimum': 1,
+                    'maximum': 100,
+                },
+            })
+
+        logger.info(
+            "line_items_created",
+            checkout_session_id=checkout_session.id,
+            items_count=len(line_items),
+            total_items=sum(item.quantity for item in cart_items)
+        )
+
+        # Configure invoice creation
+        invoice_creation = {
+            "enabled": True,
+            "invoice_data": {
+                "description": "CassPea.co.uk Invoice",
+                "footer": "Thank you for your business!",
+                "rendering_options": {
+                    "amount_tax_display": "include_inclusive_tax"
+                },
+            },
+        }
+
+        PROTOCOL = "https"
+        API_DOMAIN = "api.casspea.co.uk"
+        FRONTEND_DOMAIN = "new.casspea.co.uk"
+        FULL_API_DOMAIN = f"{PROTOCOL}://{API_DOMAIN}"
+        FULL_FRONTEND_DOMAIN = f"{PROTOCOL}://{FRONTEND_DOMAIN}"
+
+        # Handle discounts
+        discounts = []
+        if checkout_session.cart.discount and checkout_session.cart.discount.status[0]:
+            discounts = [{'coupon': checkout_session.cart.discount.stripe_id}]
+
+        logger.info(
+            "shipping_stripe_format",
+            checkout_session_id=checkout_session.id,
+            shipping_stripe_format=checkout_session.shipping_stripe_format
+        )
+
+        shipping_options = [checkout_session.shipping_stripe_format]
+
+        return checkout_session, dict(
+            payment_method_types=['card'],
+            line_items=line_items,
+            customer_email=checkout_session.email,
+            currency='GBP',
+            mode='payment',
+            discounts=discounts,
+            shipping_options=shipping_options,
+            client_reference_id=str(checkout_session.id),
+            success_url=f"{FULL_FRONTEND_DOMAIN}/checkout/success?session_id={checkout_session.id}",
+            cancel_url=f"{FULL_FRONTEND_DOMAIN}/checkout/cancel?session_id={checkout_session.id}",
+            invoice_creation=invoice_creation,
+            custom_text={
+                'submit': {
+                    'message': 'We\'ll send your order confirmation by email.'
+                }
+            },
+            metadata={
+                'checkout_session_id': checkout_session.id,
+            },
+            expires_at=int((timezone.now() + timedelta(minutes=30)).timestamp())
+        )
+
     @extend_schema(
         summary="Create Stripe Checkout Session",
         description="""
@@ -65,125 +181,17 @@ class StripeCheckoutSessionView(APIView):
         },
         tags=["checkout"]
     )
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
+        checkout_session = None
         try:
-            # Get or create the checkout session from the request
-            checkout_session = CheckoutSession.objects.get_or_create_from_request(request)
-
-            logger.info(
-                "checkout_session_retrieved",
-                checkout_session_id=checkout_session.id,
-                cart_id=checkout_session.cart.id if checkout_session.cart else None
-            )
-
-            # Validate shipping address
-            if not checkout_session.shipping_address:
-                raise ValidationError("Shipping address is required")
-
-            # Retrieve cart items
-            cart_items = checkout_session.cart.items.select_related('product').all()
-
-            logger.debug(
-                "cart_items_check",
-                cart_id=checkout_session.cart.id,
-                items_count=cart_items.count(),
-                items=[{
-                    'id': item.id,
-                    'product_id': item.product.id,
-                    'quantity': item.quantity,
-                    'stripe_price_id': item.product.stripe_price_id
-                } for item in cart_items]
-            )
-
-            if not cart_items.exists():
-                raise ValidationError("Cart is empty")
-
-            # Create line items for Stripe
-            line_items = []
-            for item in cart_items:
-                if not item.product.stripe_price_id:
-                    logger.error(
-                        "missing_stripe_price",
-                        product_id=item.product.id,
-                        product_name=item.product.name
-                    )
-                    raise ValidationError(f"Product {item.product.name} is not configured for payment")
-
-                line_items.append({
-                    'price': item.product.stripe_price_id,
-                    'quantity': item.quantity,
-                    'adjustable_quantity': {
-                        'enabled': True,
-                        'minimum': 1,
-                        'maximum': 100,
-                    },
-                })
-
-            logger.info(
-                "line_items_created",
-                checkout_session_id=checkout_session.id,
-                items_count=len(line_items),
-                total_items=sum(item.quantity for item in cart_items)
-            )
-
-            # Configure invoice creation
-            invoice_creation = {
-                "enabled": True,
-                "invoice_data": {
-                    "description": "CassPea.co.uk Invoice",
-                    "footer": "Thank you for your business!",
-                    "rendering_options": {
-                        "amount_tax_display": "include_inclusive_tax"
-                    },
-                },
-            }
-
-            PROTOCOL = "https"
-            API_DOMAIN = "api.casspea.co.uk"
-            FRONTEND_DOMAIN = "new.casspea.co.uk"
-            FULL_API_DOMAIN = f"{PROTOCOL}://{API_DOMAIN}"
-            FULL_FRONTEND_DOMAIN = f"{PROTOCOL}://{FRONTEND_DOMAIN}"
+            checkout_session, params = await sync_to_async(self.prepare_session)(request)
 
-            # Handle discounts
-            discounts = []
-            if checkout_session.cart.discount and checkout_session.cart.discount.status[0]:
-                discounts = [{'coupon': checkout_session.cart.discount.stripe_id}]
-
-            logger.info(
-                "shipping_stripe_format",
-                checkout_session_id=checkout_session.id,
-                shipping_stripe_format=checkout_session.shipping_stripe_format
-            )
-
-            shipping_options = [checkout_session.shipping_stripe_format]
-
-            # Create Stripe checkout session
-            stripe_session = stripe.checkout.Session.create(
-                payment_method_types=['card'],
-                line_items=line_items,
-                customer_email=checkout_session.email,
-                currency='GBP',
-                mode='payment',
-                discounts=discounts,
-                shipping_options=shipping_options,
-                client_reference_id=str(checkout_session.id),
-                success_url=f"{FULL_FRONTEND_DOMAIN}/checkout/success?session_id={checkout_session.id}",
-                cancel_url=f"{FULL_FRONTEND_DOMAIN}/checkout/cancel?session_id={checkout_session.id}",
-                invoice_creation=invoice_creation,
-                custom_text={
-                    'submit': {
-                        'message': 'We\'ll send your order confirmation by email.'
-                    }
-                },
-                metadata={
-                    'checkout_session_id': checkout_session.id,
-                },
-                expires_at=int((timezone.now() + timedelta(minutes=30)).timestamp())
-            )
+            # Create Stripe checkout session without blocking the worker
+            stripe_session = await stripe.checkout.Session.create_async(**params)
 
             # Save Stripe session ID to CheckoutSession
             checkout_session.stripe_session_id = stripe_session.id
-            checkout_session.save()
+            await sync_to_async(checkout_session.save)()
 
             logger.info(
                 "stripe_checkout_session_created",
@@ -232,7 +240,7 @@ class StripeCheckoutSessionView(APIView):
                 status=500
             )
 
-class StripeSuccessView(APIView):
+class StripeSuccessView(AsyncAPIView):
     """
     Handles the success URL redirection after a successful Stripe checkout.
     """
@@ -241,7 +249,7 @@ class StripeSuccessView(APIView):
         description="Redirects to the frontend cart page after a successful checkout.",
         responses={302: OpenApiResponse(description="Redirect to frontend cart")}
     )
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         session_id = request.GET.get('session_id')
         if not session_id:
             logger.error("Missing session_id in request")
@@ -249,7 +257,7 @@ class StripeSuccessView(APIView):
 
         try:
             # Verify the session with Stripe
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = await stripe.checkout.Session.retrieve_async(session_id)
             if session.payment_status == 'paid':
                 logger.info("stripe_checkout_success", session_id=session_id)
                 return redirect(f'https://new.casspea.co.uk/checkout/success?session_id={session_id}')
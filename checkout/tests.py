@@ -1,3 +1,112 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from carts.models import Cart, CartItem
+from checkout.models import CheckoutSession, ProcessedWebhookEvent
+from mails.models import EmailSent
+from orders.models import Order
 
-# Create your tests here.
+WEBHOOK_SECRET = 'whsec_test'
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        cart = Cart.objects.create(session_id='webhook-test')
+        self.checkout_session = CheckoutSession.objects.create(cart=cart, email='customer@example.com')
+
+    def post_event(self, event_id, event_type='checkout.session.completed', checkout_session_id=None):
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'data': {'object': {
+                'id': 'cs_test',
+                'payment_intent': 'pi_test',
+                'metadata': {'checkout_session_id': str(checkout_session_id or self.checkout_session.id)},
+            }},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(),
+            f'{timestamp}.{payload}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            '/api/checkout/stripe/webhook/',
+            payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}'
+        )
+
+    def test_checkout_completed_is_processed_once(self):
+        """Test a redelivered event is skipped by the event ledger"""
+        response = self.post_event('evt_1')
+
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(checkout_session=self.checkout_session)
+        self.assertEqual((order.total, order.item_count), (Decimal('0.00'), 0))
+        self.assertEqual(EmailSent.objects.filter(status=EmailSent.PENDING).count(), 2)
+        ledger = ProcessedWebhookEvent.objects.get(event_id='evt_1')
+        self.assertEqual(ledger.status_code, 200)
+        self.assertIsNotNone(ledger.duration_ms)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.post_event('evt_1')
+
+        # One ledger insert, rejected inside its savepoint
+        statements = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT INTO "checkout_processedwebhookevent"'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(EmailSent.objects.count(), 2)
+
+    def test_failed_event_is_not_recorded(self):
+        """Test an event whose handling fails can be processed on retry"""
+        response = self.post_event('evt_2', checkout_session_id=self.checkout_session.id + 1)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ProcessedWebhookEvent.objects.exists())
+
+class StripeCheckoutSessionViewTest(TestCase):
+    def test_validation_runs_before_calling_stripe(self):
+        """Test the async checkout view rejects a session without a shipping address"""
+        user = get_user_model().objects.create_user(email='customer@example.com', password='x')
+        self.client.force_login(user)
+
+        response = self.client.post('/api/checkout/stripe/create-session/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Shipping address is required', response.json()['error'])
+
+
+class RequestScopedCheckoutTest(TestCase):
+    fixtures = ['initial_products.json', 'initial_product_category.json', 'initial_allergens.json']
+
+    def test_cart_and_checkout_session_resolved_once(self):
+        """Test managers, views and serializers of one request share one cart and checkout session"""
+        user = get_user_model().objects.create_user(email='customer@example.com', password='x')
+        request = RequestFactory().post('/api/checkout/')
+        SessionMiddleware(lambda request: None).process_request(request)
+        request.user = user
+        request.data = {}
+
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product_id=1, quantity=2)
+
+        checkout_session = CheckoutSession.objects.get_or_create_from_request(request)
+
+        with self.assertNumQueries(0):
+            cart, created = Cart.objects.get_or_create_from_request(request)
+            self.assertIs(CheckoutSession.objects.get_or_create_from_request(request), checkout_session)
+            self.assertEqual([item.quantity for item in cart.items.all()], [2])
+
+        self.assertIs(cart, checkout_session.cart)
+        self.assertFalse(created)
@@ -2,20 +2,155 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.http import HttpResponse
 from django.conf import settings
+import json
 import stripe
-from django.template.loader import render_to_string
-from django.utils import timezone
+import time
+from django.db import IntegrityError, transaction
+from mails import outbox
 from mails.models import EmailType, EmailSent
-from orders.models import Order, OrderStatusHistory
-from checkout.models import CheckoutSession
-from django.core.mail import send_mail
-from erp.settings import STAFF_EMAILS, ADMINS
+from orders.models import Order, OrderLine, OrderStatusHistory
+from orders import analytics
+from orders.managers import totals_for
+from checkout.models import CheckoutSession, ProcessedWebhookEvent
+from erp.settings import STAFF_EMAILS
 import structlog
 from django.contrib.contenttypes.models import ContentType
 
 # Initialize structlog logger
 logger = structlog.get_logger(__name__)
 
+def queue_order_emails(order, checkout_session):
+    """Queue the customer and staff order confirmations unless already queued"""
+    if EmailSent.objects.filter(
+        content_type=ContentType.objects.get_for_model(order),
+        object_id=order.id,
+        email_type__name=EmailType.ORDER_PAID
+    ).exclude(status=EmailSent.FAILED).exists():
+        return
+
+    recipient_email = checkout_session.email or (
+        checkout_session.cart.user.email if checkout_session.cart.user else None
+    )
+    if not recipient_email:
+        logger.warning("No recipient email found for sending order confirmation", order_id=order.order_id)
+        return
+
+    outbox.enqueue(
+        EmailType.ORDER_PAID,
+        order,
+        subject='Your CassPea Order Confirmation',
+        message='Thank you for your order!',
+        recipients=[recipient_email, 'info@casspea.com'],
+        template='mails/order_paid.html',
+    )
+    outbox.enqueue(
+        EmailType.ORDER_PAID_STAFF,
+        order,
+        subject='New Order Confirmation',
+        message='A new order has been placed',
+        recipients=STAFF_EMAILS,
+        template='mails/order_paid_staff.html',
+    )
+    logger.info("Order confirmation emails queued", order_id=order.order_id)
+
+def handle_checkout_completed(event):
+    session = event['data']['object']
+    logger.info("Processing checkout.session.completed event", session_id=session.get('id'))
+    checkout_session = None
+    order = None
+
+    try:
+        # Step 1: Retrieve and update CheckoutSession
+        checkout_session_id = session['metadata'].get('checkout_session_id')
+        try:
+            checkout_session = CheckoutSession.objects.select_for_update().get(id=checkout_session_id)
+
+            # Check if this session was already processed
+            if checkout_session.payment_status == CheckoutSession.Status.PAID:
+                logger.warning("CheckoutSession already processed",
+                    checkout_session_id=checkout_session_id)
+                return HttpResponse(status=200)
+
+            checkout_session.payment_status = CheckoutSession.Status.PAID
+            checkout_session.stripe_payment_intent = session.get('payment_intent')
+            checkout_session.stripe_session_id = session.get('id')
+            checkout_session.save()
+            logger.info("CheckoutSession updated", checkout_session_id=checkout_session_id)
+        except CheckoutSession.DoesNotExist as csde:
+            logger.error("CheckoutSession does not exist",
+                checkout_session_id=checkout_session_id, error=str(csde))
+            return HttpResponse(status=404)
+
+        # Step 2: Create Order if it doesn't exist
+        try:
+            order = Order.objects.get(checkout_session=checkout_session)
+            logger.info("Order already exists", order_id=order.order_id)
+        except Order.DoesNotExist:
+            order = Order.objects.create(
+                checkout_session=checkout_session,
+                status='processing',
+                **totals_for(checkout_session)
+            )
+            OrderLine.objects.snapshot(order)
+            analytics.record(order)
+            logger.info("Order created", order_id=order.order_id)
+
+            # Create initial status history
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='processing',
+                notes='Order has been created and is processing.',
+                created_by=checkout_session.cart.user if checkout_session.cart.user else None
+            )
+            logger.info("OrderStatusHistory logged", order_id=order.order_id)
+
+        # Step 3: Mark cart as inactive if still active
+        cart = checkout_session.cart
+        if cart.active:
+            cart.active = False
+            cart.save()
+            logger.info("Cart marked as inactive", cart_id=cart.id)
+
+        # Step 4: Queue confirmation emails for the send_queued_emails worker
+        queue_order_emails(order, checkout_session)
+
+    except Exception as e:
+        logger.exception("Unexpected error during webhook processing", error=str(e))
+        return HttpResponse(status=500)
+
+    return HttpResponse(status=200)
+
+def handle_payment_failed(event):
+    session = event['data']['object']
+    logger.info("Processing payment_intent.payment_failed event",
+        session_id=session.get('id')
+    )
+
+    try:
+        # Retrieve the CheckoutSession using metadata
+        checkout_session_id = session['metadata'].get('checkout_session_id')
+        checkout_session = CheckoutSession.objects.select_for_update().get(id=checkout_session_id)
+        logger.info("CheckoutSession retrieved for failed payment", checkout_session_id=checkout_session_id)
+
+        # Update CheckoutSession status
+        checkout_session.payment_status = CheckoutSession.Status.FAILED
+        checkout_session.save()
+        logger.info("CheckoutSession updated to FAILED", checkout_session_id=checkout_session_id)
+
+    except CheckoutSession.DoesNotExist as csde:
+        logger.error("CheckoutSession does not exist for failed payment", checkout_session_id=checkout_session_id, error=str(csde))
+        return HttpResponse(status=404)
+    except Exception as e:
+        logger.exception("Unexpected error during payment failure processing", error=str(e))
+        return HttpResponse(status=500)
+
+    return HttpResponse(status=200)
+
+EVENT_HANDLERS = {
+    'checkout.session.completed': handle_checkout_completed,
+    'payment_intent.payment_failed': handle_payment_failed,
+}
+
 @csrf_exempt
 def stripe_webhook(request):
     payload = request.body
@@ -36,9 +171,11 @@ def stripe_webhook(request):
     )
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, endpoint_secret
         )
+        # Handlers work on the verified payload as plain dicts, whatever the stripe library version
+        event = json.loads(payload)
         logger.info("Stripe webhook constructed successfully",
             event_id=event.get('id'),
             event_type=event.get('type')
@@ -55,172 +192,34 @@ def stripe_webhook(request):
         )
         return HttpResponse(status=400)
 
-    if event and event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        logger.info("Processing checkout.session.completed event", session_id=session.get('id'))
-        checkout_session = None
-        order = None
-
-        try:
-            # Step 1: Retrieve and update CheckoutSession
-            checkout_session_id = session['metadata'].get('checkout_session_id')
-            try:
-                checkout_session = CheckoutSession.objects.get(id=checkout_session_id)
-
-                # Check if this session was already processed
-                if checkout_session.payment_status == CheckoutSession.Status.PAID:
-                    logger.warning("CheckoutSession already processed",
-                        checkout_session_id=checkout_session_id)
-                    return HttpResponse(status=200)
-
-                checkout_session.payment_status = CheckoutSession.Status.PAID
-                checkout_session.stripe_payment_intent = session.get('payment_intent')
-                checkout_session.stripe_session_id = session.get('id')
-                checkout_session.save()
-                logger.info("CheckoutSession updated", checkout_session_id=checkout_session_id)
-            except CheckoutSession.DoesNotExist as csde:
-                logger.error("CheckoutSession does not exist",
-                    checkout_session_id=checkout_session_id, error=str(csde))
-                return HttpResponse(status=404)
-
-            # Step 2: Create Order if it doesn't exist
-            try:
-                order = Order.objects.get(checkout_session=checkout_session)
-                logger.info("Order already exists", order_id=order.order_id)
-            except Order.DoesNotExist:
-                order = Order.objects.create(
-                    checkout_session=checkout_session,
-                    status='processing'
-                )
-                logger.info("Order created", order_id=order.order_id)
-
-                # Create initial status history
-                OrderStatusHistory.objects.create(
-                    order=order,
-                    status='processing',
-                    notes='Order has been created and is processing.',
-                    created_by=checkout_session.cart.user if checkout_session.cart.user else None
-                )
-                logger.info("OrderStatusHistory logged", order_id=order.order_id)
-
-            # Step 3: Mark cart as inactive if still active
-            cart = checkout_session.cart
-            if cart.active:
-                cart.active = False
-                cart.save()
-                logger.info("Cart marked as inactive", cart_id=cart.id)
-
-            # Step 4: Send confirmation email
-            try:
-                # Get the content type for Order
-                content_type = ContentType.objects.get_for_model(order)
-
-                # Check if email was already sent - Modified query
-                if not EmailSent.objects.filter(
-                    content_type=content_type,
-                    object_id=order.id,  # Use the actual ID
-                    email_type__name=EmailType.ORDER_PAID,
-                    status=EmailSent.SENT
-                ).exists():
-                    try:
-                        email_type = EmailType.objects.get(name=EmailType.ORDER_PAID)
-
-                        # Create EmailSent entry first
-                        email_sent = EmailSent.objects.create(
-                            email_type=email_type,
-                            content_type=content_type,
-                            object_id=order.id,
-                            status=EmailSent.PENDING,
-                            sent=timezone.now()
-                        )
-
-                        # Render email template
-                        html_content = render_to_string('mails/order_paid.html', {
-                            'order': order,
-                            'current_year': timezone.now().year,
-                        })
-
-                        # Get recipient email
-                        recipient_email = checkout_session.email or (
-                            checkout_session.cart.user.email if checkout_session.cart.user else None
-                        )
-
-                        if recipient_email:
-                            send_mail(
-                                subject='Your CassPea Order Confirmation',
-                                message='Thank you for your order!',
-                                from_email=settings.DEFAULT_FROM_EMAIL,
-                                recipient_list=[recipient_email, 'info@casspea.com'],
-                                html_message=html_content,
-                                fail_silently=False,
-                            )
-
-                            # Update email status to SENT only after successful sending
-                            email_sent.status = EmailSent.SENT
-                            email_sent.save()
-
-                            logger.info("Order confirmation email sent",
-                                recipient_email=recipient_email,
-                                order_id=order.order_id
-                            )
-
-                            # Send email to staff
-
-                            staff_html_content = render_to_string('mails/order_paid_staff.html', {
-                                'order': order,
-                                'current_year': timezone.now().year,
-                            })
-
-                            send_mail(
-                                subject='New Order Confirmation',
-                                message='A new order has been placed',
-                                from_email=settings.DEFAULT_FROM_EMAIL,
-                                recipient_list=STAFF_EMAILS,
-                                html_message=staff_html_content,
-                                fail_silently=False,
-                            )
-                        else:
-                            logger.warning("No recipient email found for sending order confirmation", order_id=order.order_id)
-
-                    except Exception as email_exc:
-                        email_sent.status = EmailSent.FAILED
-                        email_sent.error_message = str(email_exc)
-                        email_sent.save()
-                        logger.exception("Failed to send order confirmation email",
-                            error=str(email_exc),
-                            email_sent_id=email_sent.id
-                        )
-
-            except EmailSent.DoesNotExist as esde:
-                logger.error("EmailSent entry does not exist", email_sent_id=esde.id)
-                return HttpResponse(status=500)
-
-        except Exception as e:
-            logger.exception("Unexpected error during webhook processing", error=str(e))
-            return HttpResponse(status=500)
-
-    if event and event['type'] == 'payment_intent.payment_failed':
-        session = event['data']['object']
-        logger.info("Processing payment_intent.payment_failed event",
-            session_id=session.get('id')
-        )
+    handler = EVENT_HANDLERS.get(event['type'])
+    if handler is None:
+        return HttpResponse(status=200)
 
+    started = time.monotonic()
+    with transaction.atomic():
+        # Insert-or-skip on the event ID; a concurrent delivery waits here until the first commits
         try:
-            # Retrieve the CheckoutSession using metadata
-            checkout_session_id = session['metadata'].get('checkout_session_id')
-            checkout_session = CheckoutSession.objects.get(id=checkout_session_id)
-            logger.info("CheckoutSession retrieved for failed payment", checkout_session_id=checkout_session_id)
-
-            # Update CheckoutSession status
-            checkout_session.payment_status = CheckoutSession.Status.FAILED
-            checkout_session.save()
-            logger.info("CheckoutSession updated to FAILED", checkout_session_id=checkout_session_id)
-
-        except CheckoutSession.DoesNotExist as csde:
-            logger.error("CheckoutSession does not exist for failed payment", checkout_session_id=checkout_session_id, error=str(csde))
-            return HttpResponse(status=404)
-        except Exception as e:
-            logger.exception("Unexpected error during payment failure processing", error=str(e))
-            return HttpResponse(status=500)
-
-    return HttpResponse(status=200)
+            with transaction.atomic():
+                ledger = ProcessedWebhookEvent.objects.create(event_id=event['id'], event_type=event['type'])
+        except IntegrityError:
+            logger.info("Duplicate webhook event skipped", event_id=event['id'], event_type=event['type'])
+            return HttpResponse(status=200)
+
+        response = handler(event)
+
+        if response.status_code >= 400:
+            # Forget the event so Stripe's retry is processed again
+            transaction.set_rollback(True)
+        else:
+            ledger.status_code = response.status_code
+            ledger.duration_ms = round((time.monotonic() - started) * 1000)
+            ledger.save(update_fields=['status_code', 'duration_ms'])
+
+    logger.info("Webhook event handled",
+        event_id=event['id'],
+        event_type=event['type'],
+        status_code=response.status_code,
+        duration_ms=round((time.monotonic() - started) * 1000)
+    )
+    return response
@@ -0,0 +1,71 @@
+import asyncio
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.views import APIView
+
+# Items pulled from a sync iterator per thread hop when streaming under ASGI
+STREAM_BATCH = 100
+
+
+class AsyncAPIViewMixin:
+    """
+    Lets an APIView declare async handlers, so outbound HTTP calls can be
+    awaited instead of holding a worker thread. Authentication, permissions
+    and throttling still run through DRF, on a thread since they may hit the
+    database; handlers must wrap their own ORM access in sync_to_async.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncAPIViewMixin, APIView):
+    pass
+
+
+async def _aiterate(iterator, batch):
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch)))
+    while True:
+        items = await next_batch()
+        if not items:
+            return
+        for item in items:
+            yield item
+
+
+def streaming_content(request, content, batch=STREAM_BATCH):
+    """
+    Content for a StreamingHttpResponse that streams under either server.
+
+    Under ASGI, Django reads a sync iterator into a list before sending
+    anything, so there the iterator is wrapped in an async generator that
+    pulls a batch at a time on the sync thread (keeping database cursors on
+    the thread that opened them). Under WSGI it is returned as is.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _aiterate(iter(content), batch)
+    return content
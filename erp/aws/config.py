@@ -42,7 +42,7 @@ class AWSConfig:
         self.AWS_S3_FILE_OVERWRITE = False
 
         # Storage Configuration
-        self.USE_S3 = env.bool('USE_S3', default=Tru)
+        self.USE_S3 = env.bool('USE_S3', default=True)
         self.STATICFILES_STORAGE = 'erp.aws.aws.AWSConfig.StaticStorage'
         self.DEFAULT_FILE_STORAGE = 'erp.aws.aws.AWSConfig.MediaStorage'
         self.PRIVATE_FILE_STORAGE = 'erp.aws.aws.AWSConfig.PrivateMediaStorage'
@@ -51,3 +51,6 @@ class AWSConfig:
 
 # Create single instance to export
 aws_config = AWSConfig()
+
+# Importable by dotted path, e.g. as a STORAGES backend
+PrivateMediaStorage = AWSConfig.PrivateMediaStorage
@@ -0,0 +1,12 @@
+def request_memo(request):
+    """
+    A dict that lives as long as the request, for objects several layers
+    would otherwise each look up again. The Django request and every DRF
+    Request wrapping it share the same dict.
+    """
+    http_request = getattr(request, '_request', request)
+    try:
+        return http_request._memo
+    except AttributeError:
+        http_request._memo = {}
+        return http_request._memo
@@ -0,0 +1,84 @@
+"""
+Session engine that keeps sessions in the cache and writes to the database
+only when they change or their expiry needs extending.
+
+With SESSION_SAVE_EVERY_REQUEST the stock database engines rewrite the
+session row on every request just to push the expiry forward. Here a
+request that leaves the session unchanged writes nothing until the stored
+expiry has fallen SESSION_REFRESH_AFTER seconds behind. Changed sessions are
+still written straight through, since workers that do not share a cache
+read each other's sessions from the database.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+KEY_PREFIX = 'erp.sessions'
+
+logger = logging.getLogger('django.contrib.sessions')
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._expire_date = None
+
+    def _cache_entry(self, data):
+        # Bounded so a worker picks up changes other workers wrote within the TTL
+        timeout = min(getattr(settings, 'SESSION_CACHE_TTL', 60), self.get_expiry_age(expiry=self._expire_date))
+        try:
+            self._cache.set(self.cache_key, (data, self._expire_date), timeout)
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
+
+    def load(self):
+        try:
+            cached = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends raise on invalid cache keys; treat it as a miss
+            cached = None
+
+        if cached is not None:
+            data, self._expire_date = cached
+            return data
+
+        s = self._get_session_from_db()
+        if s is None:
+            return {}
+        data = self.decode(s.session_data)
+        self._expire_date = s.expire_date
+        self._cache_entry(data)
+        return data
+
+    def refresh_due(self):
+        """Whether extending the expiry now would move it by more than the threshold"""
+        if self._expire_date is None:
+            return True
+        threshold = timedelta(seconds=getattr(settings, 'SESSION_REFRESH_AFTER', 60 * 60 * 24))
+        return self.get_expiry_date() - self._expire_date >= threshold
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        if not must_create:
+            # Loads the session, and with it the stored expiry
+            self._get_session()
+            if not self.modified and not self.refresh_due():
+                return
+
+        DBStore.save(self, must_create)
+        self._expire_date = self.get_expiry_date()
+        self._cache_entry(self._session)
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
@@ -147,6 +147,17 @@ else:
     }
 
 
+# Cache
+# Local memory by default; point CACHE_URL at a shared backend to share entries between workers.
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://casspea'),
+}
+
+# Seconds a built catalog snapshot stays cached; bounds staleness between workers
+# that do not share a cache.
+CATALOG_SNAPSHOT_TIMEOUT = env.int('CATALOG_SNAPSHOT_TIMEOUT', default=300)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -199,12 +210,16 @@ CSRF_TRUSTED_ORIGINS = [
 
 # Cookie Settings
 # ------------------------------------------------------------------------------
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'erp.sessions'
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 7  # 7 days in seconds
 SESSION_COOKIE_SECURE = True if not DEBUG else False
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_SAVE_EVERY_REQUEST = True
+# Unchanged sessions only get their stored expiry extended once it lags by this many seconds
+SESSION_REFRESH_AFTER = env.int('SESSION_REFRESH_AFTER', default=60 * 60 * 24)
+# Seconds a worker serves a session from its cache before re-reading the database
+SESSION_CACHE_TTL = env.int('SESSION_CACHE_TTL', default=60)
 
 CSRF_COOKIE_NAME = 'csrftoken'
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'
@@ -332,6 +347,8 @@ USE_S3 = env.bool('USE_S3', default=True)
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = Path('/vol/web/static')
 MEDIA_ROOT = Path('/vol/web/media')
+# Files that must never be publicly served, e.g. shipping labels
+PRIVATE_MEDIA_ROOT = Path('/vol/web/private')
 
 if USE_S3:
     # AWS S3 Configuration
@@ -372,6 +389,12 @@ if USE_S3:
                 'location': 'static',
                 'bucket_name': AWS_STORAGE_BUCKET_NAME,
             }
+        },
+        'private': {
+            'BACKEND': 'erp.aws.config.PrivateMediaStorage',
+            'OPTIONS': {
+                'bucket_name': AWS_STORAGE_BUCKET_NAME,
+            }
         }
     }
 
@@ -395,6 +418,12 @@ else:
                 'location': str(STATIC_ROOT),
                 'base_url': '/static/',
             }
+        },
+        'private': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {
+                'location': str(PRIVATE_MEDIA_ROOT),
+            }
         }
     }
 
@@ -402,7 +431,7 @@ else:
     MEDIA_URL = '/media/'
 
 # Ensure storage directories exist
-for directory in [STATIC_ROOT, MEDIA_ROOT]:
+for directory in [STATIC_ROOT, MEDIA_ROOT, PRIVATE_MEDIA_ROOT]:
     directory.mkdir(parents=True, exist_ok=True)
 
 
@@ -467,6 +496,12 @@ else:
                 'location': str(STATIC_ROOT),
                 'base_url': STATIC_URL,
             }
+        },
+        'private': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {
+                'location': str(PRIVATE_MEDIA_ROOT),
+            }
         }
     }
 
@@ -478,3 +513,12 @@ if IS_HEROKU:
 
 ROYAL_MAIL_API_KEY = env('ROYAL_MAIL_API_KEY')
 ROYAL_MAIL_BASE_URL = 'https://api.parcel.royalmail.com/api/v1'
+
+# Royal Mail client: seconds to connect and to wait for a response, retries of
+# idempotent calls, and failures in a row before calls fail fast for
+# ROYAL_MAIL_CIRCUIT_RESET seconds.
+ROYAL_MAIL_CONNECT_TIMEOUT = env.float('ROYAL_MAIL_CONNECT_TIMEOUT', default=5)
+ROYAL_MAIL_READ_TIMEOUT = env.float('ROYAL_MAIL_READ_TIMEOUT', default=20)
+ROYAL_MAIL_MAX_RETRIES = env.int('ROYAL_MAIL_MAX_RETRIES', default=2)
+ROYAL_MAIL_CIRCUIT_FAILURES = env.int('ROYAL_MAIL_CIRCUIT_FAILURES', default=5)
+ROYAL_MAIL_CIRCUIT_RESET = env.float('ROYAL_MAIL_CIRCUIT_RESET', default=30)
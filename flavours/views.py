@@ -5,5 +5,5 @@ from flavours.serializers import FlavourSerializer
 
 # Create your views here.
 class FlavourListView(ListAPIView):
-    queryset = Flavour.objects.active()
+    queryset = Flavour.objects.active().select_related('category').prefetch_related('allergens')
     serializer_class = FlavourSerializer
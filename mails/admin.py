@@ -8,8 +8,9 @@ class EmailTypeAdmin(admin.ModelAdmin):
 
 @admin.register(EmailSent)
 class EmailSentAdmin(admin.ModelAdmin):
-    list_display = ['email_type', 'get_related_object', 'status', 'sent', 'created']
+    list_display = ['email_type', 'get_related_object', 'status', 'attempts', 'sent', 'created']
     list_filter = ['email_type', 'status', 'sent']
+    readonly_fields = ['attempts', 'next_attempt', 'started', 'error_message']
     search_fields = ['email_type__name', 'content_object__email']
 
     def get_related_object(self, obj):
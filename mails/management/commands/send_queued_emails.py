@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mails.outbox import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the EmailSent outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Emails claimed per batch')
+        parser.add_argument('--concurrency', type=int, default=4, help='Emails sent in parallel')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Sending queued emails...')
+
+        while True:
+            processed = process_pending(options['batch_size'], options['concurrency'])
+            if processed:
+                self.stdout.write(f'Processed {processed} email(s)')
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS('Email outbox drained'))
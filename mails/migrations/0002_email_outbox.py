@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('mails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='message',
+            field=models.TextField(blank=True, help_text='Plain text fallback'),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='next_attempt',
+            field=models.DateTimeField(blank=True, help_text='Not retried before this time', null=True),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='recipients',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='subject',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='emailsent',
+            name='template',
+            field=models.CharField(blank=True, help_text='HTML template rendered with the related object', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='emailsent',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='emailtype',
+            name='name',
+            field=models.CharField(choices=[('newsletter', 'Newsletter'), ('contact', 'Contact'), ('order_paid', 'Order Paid'), ('order_paid_staff', 'Order Paid (Staff)')], max_length=50, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='emailsent',
+            index=models.Index(fields=['status', 'next_attempt'], name='mails_email_status_a8c962_idx'),
+        ),
+    ]
@@ -9,11 +9,13 @@ class EmailType(models.Model):
     NEWSLETTER = 'newsletter'
     CONTACT = 'contact'
     ORDER_PAID = 'order_paid'
+    ORDER_PAID_STAFF = 'order_paid_staff'
 
     CHOICES = [
         (NEWSLETTER, 'Newsletter'),
         (CONTACT, 'Contact'),
         (ORDER_PAID, 'Order Paid'),
+        (ORDER_PAID_STAFF, 'Order Paid (Staff)'),
     ]
 
     name = models.CharField(
@@ -29,14 +31,18 @@ class EmailType(models.Model):
 class EmailSent(models.Model):
     """
     Logs sent emails with references to associated objects (e.g., Lead, Order).
+    Pending rows that carry a template double as an outbox, drained by the
+    send_queued_emails command.
     """
 
     PENDING = 'pending'
+    SENDING = 'sending'
     SENT = 'sent'
     FAILED = 'failed'
 
     STATUS_CHOICES = [
         (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
         (SENT, 'Sent'),
         (FAILED, 'Failed'),
     ]
@@ -49,9 +55,23 @@ class EmailSent(models.Model):
 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
 
+    # Outbox message, rendered and sent by the worker
+    subject = models.CharField(max_length=255, blank=True)
+    message = models.TextField(blank=True, help_text="Plain text fallback")
+    template = models.CharField(max_length=255, blank=True, help_text="HTML template rendered with the related object")
+    recipients = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(blank=True, null=True, help_text="Not retried before this time")
+    started = models.DateTimeField(blank=True, null=True)
+
     error_message = models.TextField(blank=True, null=True)
     sent = models.DateTimeField(blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
+
     def __str__(self):
         return f"{self.email_type.name} for {self.content_object} - {self.status}"
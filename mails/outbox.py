@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import structlog
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailType, EmailSent
+
+logger = structlog.get_logger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = timedelta(minutes=1)
+# Emails stuck in sending longer than this are assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=15)
+
+
+def enqueue(email_type_name, obj, subject, recipients, template, message=''):
+    """
+    Queue an email about obj. Call inside the transaction that persists obj,
+    so the email exists if and only if the state it describes does.
+    """
+    email_type, _ = EmailType.objects.get_or_create(
+        name=email_type_name,
+        defaults={'template_name': email_type_name}
+    )
+    email = EmailSent.objects.create(
+        email_type=email_type,
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=obj.id,
+        status=EmailSent.PENDING,
+        subject=subject,
+        message=message,
+        template=template,
+        recipients=list(recipients),
+    )
+    logger.info("email_enqueued", email_sent_id=email.id, email_type=email_type_name)
+    return email
+
+
+def claim_emails(batch_size):
+    """Mark up to batch_size due emails as sending and return them"""
+    now = timezone.now()
+    stale = EmailSent.objects.filter(
+        status=EmailSent.SENDING,
+        started__lt=now - STALE_AFTER
+    )
+    # An email that keeps taking its worker down is not handed out again
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=EmailSent.FAILED,
+        error_message=f"Worker stopped while sending, {MAX_ATTEMPTS} times"
+    )
+    if failed:
+        logger.warning("emails_abandoned", count=failed)
+    stale.update(status=EmailSent.PENDING)
+
+    with transaction.atomic():
+        emails = list(
+            EmailSent.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailSent.PENDING)
+            .exclude(template='')
+            .filter(Q(next_attempt__isnull=True) | Q(next_attempt__lte=now))
+            .order_by('created')[:batch_size]
+        )
+        for email in emails:
+            email.status = EmailSent.SENDING
+            email.attempts += 1
+            email.started = now
+        EmailSent.objects.bulk_update(emails, ['status', 'attempts', 'started'])
+    return emails
+
+
+def build_message(email):
+    """Render an outbox row into a message ready to send"""
+    obj = email.content_object
+    html_content = render_to_string(email.template, {
+        email.content_type.model: obj,
+        'current_year': timezone.now().year,
+    })
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=email.recipients,
+    )
+    message.attach_alternative(html_content, 'text/html')
+    return message
+
+
+def _send(message):
+    """Deliver one message, returning the error instead of raising it"""
+    try:
+        message.send(fail_silently=False)
+    except Exception as e:
+        return e
+    return None
+
+
+def _finish(email, error=None):
+    now = timezone.now()
+    if error is None:
+        email.status = EmailSent.SENT
+        email.sent = now
+        email.error_message = None
+        logger.info("email_sent", email_sent_id=email.id, attempts=email.attempts)
+    else:
+        email.error_message = str(error)
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = EmailSent.FAILED
+        else:
+            email.status = EmailSent.PENDING
+            email.next_attempt = now + RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        logger.error(
+            "email_send_failed",
+            email_sent_id=email.id,
+            attempts=email.attempts,
+            error=str(error)
+        )
+    email.save(update_fields=['status', 'sent', 'error_message', 'next_attempt'])
+
+
+def process_pending(batch_size=10, concurrency=4):
+    """
+    Claim and send one batch; returns the number of emails handled. Rendering
+    and bookkeeping stay on this thread, only SMTP delivery runs concurrently.
+    """
+    emails = claim_emails(batch_size)
+    if not emails:
+        return 0
+
+    messages = []
+    for email in emails:
+        try:
+            messages.append(build_message(email))
+        except Exception as e:
+            messages.append(None)
+            _finish(email, e)
+
+    pending = [(email, message) for email, message in zip(emails, messages) if message is not None]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        errors = list(pool.map(_send, [message for _, message in pending]))
+
+    for (email, _), error in zip(pending, errors):
+        _finish(email, error)
+    return len(emails)
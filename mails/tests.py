@@ -1,3 +1,69 @@
+from datetime import timedelta
+from django.core import mail
 from django.test import TestCase
+from django.utils import timezone
+from leads.models import Lead
+from mails import outbox
+from mails.models import EmailType, EmailSent
 
-# Create your tests here.
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        self.lead = Lead.objects.create(email='user@example.com', lead_type=Lead.NEWSLETTER)
+
+    def enqueue(self, template='leads/mails/newsletter.html'):
+        return outbox.enqueue(
+            EmailType.NEWSLETTER,
+            self.lead,
+            subject='Newsletter Discount Code',
+            recipients=[self.lead.email],
+            template=template,
+        )
+
+    def test_enqueue_does_not_send(self):
+        """Test queued emails are only sent when the outbox is drained"""
+        email = self.enqueue()
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(outbox.process_pending(concurrency=2), 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailSent.SENT)
+        self.assertIsNotNone(email.sent)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertEqual(outbox.process_pending(), 0)
+
+    def test_failure_is_retried_later(self):
+        """Test a failed email goes back to pending with a backoff, then fails for good"""
+        email = self.enqueue(template='mails/missing.html')
+
+        outbox.process_pending()
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailSent.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.next_attempt)
+
+        # Not due yet
+        self.assertEqual(outbox.process_pending(), 0)
+
+        EmailSent.objects.filter(pk=email.pk).update(attempts=outbox.MAX_ATTEMPTS - 1, next_attempt=None)
+        outbox.process_pending()
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailSent.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_stale_emails_requeued_until_attempts_run_out(self):
+        """Test an email whose worker keeps dying is failed instead of reclaimed and resent forever"""
+        email = self.enqueue()
+        long_ago = timezone.now() - outbox.STALE_AFTER - timedelta(minutes=1)
+
+        for attempt in range(1, outbox.MAX_ATTEMPTS + 1):
+            claimed, = outbox.claim_emails(10)
+            self.assertEqual(claimed.attempts, attempt)
+            EmailSent.objects.filter(pk=email.pk).update(started=long_ago)
+
+        self.assertEqual(outbox.claim_emails(10), [])
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailSent.FAILED)
+        self.assertTrue(email.error_message)
+        self.assertEqual(len(mail.outbox), 0)
@@ -1,9 +1,17 @@
 from django.contrib import admin
-from .models import Order
+from .models import Order, OrderLine
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    fields = ['product_name', 'quantity', 'unit_price', 'base_price', 'discounted_price', 'selection_type']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
 
 # Register your models here.
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_id', 'status', 'created']
+    list_display = ['order_id', 'status', 'total', 'created']
     search_fields = ['order_id']
     list_filter = ['status']
+    inlines = [OrderLineInline]
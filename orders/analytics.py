@@ -0,0 +1,153 @@
+"""
+Daily sales rollups by product, flavour and discount code.
+
+Each paid order adds its figures to the DailySales rows of the day it was
+placed, so reports read a handful of rows per day however many orders
+there are. rebuild() recomputes the rows from order lines.
+"""
+from decimal import Decimal
+
+import structlog
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailySales, Order
+
+logger = structlog.get_logger(__name__)
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+METRICS = ['orders', 'units', 'revenue', 'discount', 'shipping']
+
+# Orders read per chunk while rebuilding
+CHUNK_SIZE = 500
+
+
+def contributions(order):
+    """
+    What a paid order adds to each rollup row, keyed by (dimension, key).
+    Flavours share their line's revenue by how many of the box they fill.
+    """
+    rows = {}
+
+    def add(dimension, key, label, units=0, revenue=ZERO, discount=ZERO, shipping=ZERO):
+        row = rows.setdefault((dimension, str(key)), {
+            'label': label, 'orders': 1, 'units': 0, 'revenue': ZERO, 'discount': ZERO, 'shipping': ZERO,
+        })
+        row['units'] += units
+        row['revenue'] += revenue
+        row['discount'] += discount
+        row['shipping'] += shipping
+
+    figures = {
+        'units': order.item_count or 0,
+        'revenue': order.total or ZERO,
+        'discount': order.discount_amount or ZERO,
+        'shipping': order.shipping or ZERO,
+    }
+    add(DailySales.Dimension.TOTAL, '', '', **figures)
+    if order.discount_code:
+        add(DailySales.Dimension.DISCOUNT, order.discount_code, order.discount_code, **figures)
+
+    for line in order.lines.all():
+        revenue = line.base_price if line.discounted_price is None else line.discounted_price
+        add(
+            DailySales.Dimension.PRODUCT,
+            line.product_id or line.product_name,
+            line.product_name,
+            units=line.quantity,
+            revenue=revenue,
+            discount=line.base_price - revenue,
+        )
+
+        selections = list(line.flavor_selections.all())
+        filled = sum(selection.quantity for selection in selections)
+        for selection in selections:
+            add(
+                DailySales.Dimension.FLAVOR,
+                selection.flavor_name,
+                selection.flavor_name,
+                units=selection.quantity * line.quantity,
+                revenue=(revenue * selection.quantity / filled).quantize(CENT),
+            )
+
+    return rows
+
+
+def record(order):
+    """Add a newly paid order to its day's rollups, in the caller's transaction"""
+    date = timezone.localdate(order.created)
+    rows = contributions(order)
+
+    DailySales.objects.bulk_create([
+        DailySales(date=date, dimension=dimension, key=key, label=row['label'])
+        for (dimension, key), row in rows.items()
+    ], ignore_conflicts=True)
+    # Increments rather than read-modify-write, so concurrent orders never lose an update
+    for (dimension, key), row in rows.items():
+        DailySales.objects.filter(date=date, dimension=dimension, key=key).update(
+            **{metric: F(metric) + row[metric] for metric in METRICS}
+        )
+
+
+def paid_orders():
+    return Order.objects.filter(checkout_session__payment_status='paid')
+
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from paid orders, for every day or for days from
+    since onwards. Returns the number of orders counted.
+    """
+    orders = paid_orders().prefetch_related('lines__flavor_selections').order_by('pk')
+    rollups = DailySales.objects.all()
+    if since is not None:
+        orders = orders.filter(created__date__gte=since)
+        rollups = rollups.filter(date__gte=since)
+
+    totals = {}
+    counted = 0
+    for order in orders.iterator(chunk_size=CHUNK_SIZE):
+        date = timezone.localdate(order.created)
+        for (dimension, key), row in contributions(order).items():
+            total = totals.setdefault((date, dimension, key), {'label': row['label'], **dict.fromkeys(METRICS, 0)})
+            for metric in METRICS:
+                total[metric] += row[metric]
+        counted += 1
+
+    with transaction.atomic():
+        rollups.delete()
+        DailySales.objects.bulk_create([
+            DailySales(date=date, dimension=dimension, key=key, **row)
+            for (date, dimension, key), row in totals.items()
+        ], batch_size=CHUNK_SIZE)
+
+    logger.info("sales_rollups_rebuilt", orders=counted, rows=len(totals), since=str(since) if since else None)
+    return counted
+
+
+def report(start, end, dimension=DailySales.Dimension.TOTAL):
+    """
+    Figures for start..end inclusive, per day and summed per key. Reads one
+    row per day and key, however many orders those days had.
+    """
+    days = list(
+        DailySales.objects.filter(dimension=dimension, date__range=(start, end))
+        .values('date', 'key', 'label', *METRICS)
+        .order_by('date', 'key')
+    )
+
+    totals = {}
+    for day in days:
+        total = totals.setdefault(day['key'], {'key': day['key'], 'label': day['label'], **dict.fromkeys(METRICS, 0)})
+        for metric in METRICS:
+            total[metric] += day[metric]
+
+    return {
+        'start': start,
+        'end': end,
+        'dimension': dimension,
+        'totals': sorted(totals.values(), key=lambda total: total['revenue'], reverse=True),
+        'days': days,
+    }
@@ -0,0 +1,156 @@
+"""
+Order export for fulfilment and accounting, one row per order or per line.
+
+Rows are produced lazily from a server-side cursor, chunk by chunk, so an
+export of any size runs in constant memory and the header goes out before
+the query has finished.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import OrderLine
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = {
+    CSV: 'text/csv',
+    NDJSON: 'application/x-ndjson',
+}
+ORDERS = 'orders'
+LINES = 'lines'
+ROWS = [ORDERS, LINES]
+
+# Rows fetched from the database cursor at a time
+CHUNK_SIZE = 500
+
+ADDRESS_FIELDS = ['full_name', 'street_address', 'street_address2', 'city', 'county', 'postcode', 'country']
+
+ORDER_COLUMNS = [
+    'order_id',
+    'status',
+    'created',
+    'payment_status',
+    'email',
+    'phone',
+    'shipping_option',
+    'tracking_number',
+    'shipped',
+    'delivered',
+    'item_count',
+    'subtotal',
+    'discount_amount',
+    'shipping',
+    'total',
+    *[f'shipping_{name}' for name in ADDRESS_FIELDS],
+    *[f'billing_{name}' for name in ADDRESS_FIELDS],
+]
+
+LINE_COLUMNS = [
+    *ORDER_COLUMNS,
+    'product_name',
+    'quantity',
+    'unit_price',
+    'base_price',
+    'discounted_price',
+    'selection_type',
+    'allergens',
+    'flavors',
+]
+
+
+def _address(prefix, address):
+    if address is None:
+        return {}
+    return {f'{prefix}_{name}': getattr(address, name) for name in ADDRESS_FIELDS}
+
+
+def order_row(order):
+    checkout_session = order.checkout_session
+    row = {
+        'order_id': order.order_id,
+        'status': order.status,
+        'created': order.created,
+        'payment_status': checkout_session.payment_status,
+        'email': order.email,
+        'phone': checkout_session.phone,
+        'shipping_option': checkout_session.shipping_option.name if checkout_session.shipping_option else None,
+        'tracking_number': order.tracking_number,
+        'shipped': order.shipped,
+        'delivered': order.delivered,
+        'item_count': order.item_count,
+        'subtotal': order.subtotal,
+        'discount_amount': order.discount_amount,
+        'shipping': order.shipping,
+        'total': order.total,
+    }
+    row.update(_address('shipping', checkout_session.shipping_address))
+    row.update(_address('billing', checkout_session.billing_address))
+    return row
+
+
+def line_row(line):
+    row = order_row(line.order)
+    row.update({
+        'product_name': line.product_name,
+        'quantity': line.quantity,
+        'unit_price': line.unit_price,
+        'base_price': line.base_price,
+        'discounted_price': line.discounted_price,
+        'selection_type': line.selection_type,
+        'allergens': ', '.join(line.allergens),
+        'flavors': ', '.join(
+            f'{selection.quantity}x {selection.flavor_name}' for selection in line.flavor_selections.all()
+        ),
+    })
+    return row
+
+
+ORDER_RELATIONS = [
+    'checkout_session__cart__user',
+    'checkout_session__shipping_address',
+    'checkout_session__billing_address',
+    'checkout_session__shipping_option',
+]
+
+
+def rows(orders, per=ORDERS):
+    """The columns and a lazy iterator of row dicts for a filtered Order queryset"""
+    if per == LINES:
+        lines = OrderLine.objects.filter(
+            order__in=orders.values('pk')
+        ).select_related(
+            *[f'order__{relation}' for relation in ORDER_RELATIONS]
+        ).prefetch_related('flavor_selections').order_by('order__created', 'order_id', 'id')
+        return LINE_COLUMNS, (line_row(line) for line in lines.iterator(chunk_size=CHUNK_SIZE))
+
+    orders = orders.select_related(*ORDER_RELATIONS).order_by('created', 'id')
+    return ORDER_COLUMNS, (order_row(order) for order in orders.iterator(chunk_size=CHUNK_SIZE))
+
+
+class _Echo:
+    """File-like object whose write hands back the line csv.writer formatted"""
+
+    def write(self, value):
+        return value
+
+
+def as_csv(columns, rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def as_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def export(orders, output=CSV, per=ORDERS):
+    """Lazily encode the export of a filtered Order queryset, one chunk per row"""
+    columns, records = rows(orders, per)
+    if output == NDJSON:
+        return as_ndjson(columns, records)
+    return as_csv(columns, records)
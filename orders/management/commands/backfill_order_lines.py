@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import OrderLine
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the cart contents of orders paid before order lines were recorded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Orders snapshotted per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Backfilling order lines...')
+        filled = OrderLine.objects.backfill(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recorded lines for {filled} order(s)'))
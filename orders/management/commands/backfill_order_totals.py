@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Capture subtotal, discount, shipping, total and item count on orders that predate them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders priced and updated per batch')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Backfilling order totals...')
+        filled = Order.objects.backfill_totals(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Captured totals for {filled} order(s)'))
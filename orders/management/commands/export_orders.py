@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import export
+from orders.filters import OrderFilter
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Write orders as CSV or NDJSON, filtered like the order list (e.g. --filter status=processing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(export.FORMATS), default=export.CSV, help='File format')
+        parser.add_argument('--rows', choices=export.ROWS, default=export.ORDERS, help='One row per order or per line')
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='NAME=VALUE',
+            help='OrderFilter parameter, repeatable, e.g. --filter created_after=2025-01-01'
+        )
+        parser.add_argument('--file', help='Write to this path instead of standard output')
+
+    def handle(self, *args, **options):
+        data = {}
+        for item in options['filter']:
+            name, separator, value = item.partition('=')
+            if not separator:
+                raise CommandError(f"Filters are NAME=VALUE, got '{item}'")
+            data[name] = value
+
+        order_filter = OrderFilter(data, queryset=Order.objects.all())
+        if not order_filter.is_valid():
+            raise CommandError(order_filter.errors.as_text())
+
+        chunks = export.export(order_filter.qs, options['output'], options['rows'])
+        if options['file']:
+            with open(options['file'], 'w', newline='') as file:
+                file.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
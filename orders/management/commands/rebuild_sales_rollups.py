@@ -0,0 +1,21 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from orders import analytics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='Only rebuild days from this date (YYYY-MM-DD) onwards'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding sales rollups...')
+        counted = analytics.rebuild(options['since'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {counted} order(s)'))
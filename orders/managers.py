@@ -1,9 +1,76 @@
+from decimal import Decimal
+
 import structlog
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
 logger = structlog.get_logger(__name__)
 
+CART = 'checkout_session__cart__'
+CENT = Decimal('0.01')
+TOTAL_FIELDS = ['subtotal', 'discount_amount', 'discount_code', 'shipping', 'total', 'item_count']
+
+
+def _under_cart(lookups):
+    """Re-root cart prefetch lookups so they start from an order"""
+    rooted = []
+    for lookup in lookups:
+        if isinstance(lookup, Prefetch):
+            lookup.add_prefix(CART.rstrip('_'))
+            rooted.append(lookup)
+        else:
+            rooted.append(CART + lookup)
+    return rooted
+
+
+def totals_for(checkout_session):
+    """The money columns of an order, from one price breakdown of its cart"""
+    breakdown = checkout_session.cart.price_breakdown
+    discount = breakdown.discount
+    return {
+        'subtotal': breakdown.base_total.quantize(CENT),
+        'discount_amount': (breakdown.base_total - breakdown.discounted_total).quantize(CENT),
+        'discount_code': discount.code if discount and discount.active else '',
+        'shipping': checkout_session.shipping_cost_pounds,
+        'total': checkout_session.total_with_shipping,
+        'item_count': breakdown.item_count,
+    }
+
+
 class OrderManager(models.Manager):
+    def with_summary(self):
+        """Orders with what OrderSummarySerializer reads"""
+        return self.select_related(
+            'checkout_session__cart__user',
+            'checkout_session__shipping_address',
+            'checkout_session__shipping_option',
+        )
+
+    def with_pricing(self):
+        """Orders with what pricing their checkout session reads"""
+        from carts.managers import cart_compact_prefetches
+
+        return self.select_related(
+            'checkout_session__cart__discount',
+            'checkout_session__shipping_option',
+        ).prefetch_related(*_under_cart(cart_compact_prefetches()))
+
+    def with_detail(self):
+        """Orders with the full checkout session tree OrderDetailSerializer renders"""
+        from carts.managers import cart_display_prefetches
+
+        return self.select_related(
+            'checkout_session__cart__user',
+            'checkout_session__cart__discount',
+            'checkout_session__shipping_address',
+            'checkout_session__billing_address',
+            'checkout_session__shipping_option',
+        ).prefetch_related(
+            'status_history',
+            'lines__flavor_selections',
+            *_under_cart(cart_display_prefetches())
+        )
+
     def create_from_checkout(self, checkout_session):
         """
         Create a new order from a completed checkout session
@@ -15,7 +82,7 @@ class OrderManager(models.Manager):
                     "order_already_exists",
                     checkout_session_id=checkout_session.id
                 )
-                return self.objects.get(checkout_session=checkout_session)
+                return self.get(checkout_session=checkout_session)
 
             logger.info(
                 "creating_order_from_checkout",
@@ -24,10 +91,16 @@ class OrderManager(models.Manager):
             )
 
             # Create the order
+            from . import analytics
+            from .models import OrderLine
+
             order = self.create(
                 checkout_session=checkout_session,
-                status='processing'
+                status='processing',
+                **totals_for(checkout_session)
             )
+            OrderLine.objects.snapshot(order)
+            analytics.record(order)
 
             logger.info(
                 "order_created_successfully",
@@ -45,3 +118,109 @@ class OrderManager(models.Manager):
                 exc_info=True
             )
             raise
+
+    def backfill_totals(self, batch_size=500):
+        """
+        Capture the money columns of orders that predate them, batch_size
+        orders per query and bulk update. Returns the number filled in.
+        """
+        filled = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                self.with_pricing().filter(total__isnull=True, pk__gt=last_pk).order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return filled
+
+            for order in batch:
+                for name, value in totals_for(order.checkout_session).items():
+                    setattr(order, name, value)
+            self.bulk_update(batch, TOTAL_FIELDS)
+
+            filled += len(batch)
+            last_pk = batch[-1].pk
+            logger.info("order_totals_backfilled", count=len(batch), last_order_pk=last_pk)
+
+
+class OrderLineManager(models.Manager):
+    def build(self, order):
+        """
+        Unsaved order lines for the order's cart items, with the flavour
+        selections of each box as (line, selections) pairs.
+        """
+        from carts.models import CartItem, CartItemBoxFlavorSelection
+
+        cart = order.checkout_session.cart
+        prefetch_related_objects(
+            [cart],
+            Prefetch('items', queryset=CartItem.objects.select_related('product', 'box_customization')),
+            'items__box_customization__allergens',
+            Prefetch(
+                'items__box_customization__flavor_selections',
+                queryset=CartItemBoxFlavorSelection.objects.select_related('flavor')
+            ),
+            'discount__exclusions',
+        )
+        breakdown = cart.price_breakdown
+
+        lines = []
+        selections = []
+        for item in cart.items.all():
+            price = breakdown.line(item.pk)
+            customization = getattr(item, 'box_customization', None)
+            line = self.model(
+                order=order,
+                product=item.product,
+                product_name=item.product.name,
+                quantity=item.quantity,
+                unit_price=price.unit_price,
+                base_price=price.base_price,
+                discounted_price=price.discounted_price,
+                weight=item.product.weight + item.product.box_weight,
+                selection_type=customization.selection_type if customization else '',
+                allergens=[allergen.name for allergen in customization.allergens.all()] if customization else [],
+            )
+            lines.append(line)
+            if customization:
+                selections.append((line, list(customization.flavor_selections.all())))
+        return lines, selections
+
+    def snapshot(self, order):
+        """
+        Copy the order's cart items, with their box customizations, into
+        order lines using one bulk insert for lines and one for flavours.
+        """
+        from .models import OrderLineFlavorSelection
+
+        lines, selections = self.build(order)
+        self.bulk_create(lines)
+        OrderLineFlavorSelection.objects.bulk_create(
+            OrderLineFlavorSelection(line=line, flavor_name=selection.flavor.name, quantity=selection.quantity)
+            for line, flavor_selections in selections
+            for selection in flavor_selections
+        )
+        return lines
+
+    def backfill(self, batch_size=100):
+        """Snapshot the lines of orders paid before lines were recorded"""
+        from .models import Order
+
+        filled = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Order.objects.select_related('checkout_session__cart__discount')
+                .filter(lines__isnull=True, pk__gt=last_pk)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return filled
+
+            with transaction.atomic():
+                for order in batch:
+                    self.snapshot(order)
+
+            filled += len(batch)
+            last_pk = batch[-1].pk
+            logger.info("order_lines_backfilled", count=len(batch), last_order_pk=last_pk)
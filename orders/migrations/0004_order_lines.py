@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_totals'),
+        ('products', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255)),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('base_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discounted_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('weight', models.PositiveIntegerField(help_text='Weight of one box, packaging included, in grams')),
+                ('selection_type', models.CharField(blank=True, max_length=20)),
+                ('allergens', models.JSONField(blank=True, default=list, help_text='Names of the allergens left out')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='orders.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderLineFlavorSelection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flavor_name', models.CharField(max_length=255)),
+                ('quantity', models.PositiveIntegerField()),
+                ('line', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flavor_selections', to='orders.orderline')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_code',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('product', 'Product'), ('flavor', 'Flavor'), ('discount', 'Discount')], max_length=20)),
+                ('key', models.CharField(blank=True, help_text='Product ID, flavour name or discount code', max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('shipping', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'ordering': ['date', 'dimension', 'key'],
+                'indexes': [models.Index(fields=['dimension', 'date'], name='orders_dail_dimensi_7809d0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'dimension', 'key'), name='unique_daily_sales_row')],
+            },
+        ),
+    ]
@@ -1,28 +1,27 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.utils.crypto import get_random_string
-from django.utils import timezone
-from .managers import OrderManager
-import random
+from .managers import OrderManager, OrderLineManager
 User = get_user_model()
 
 def generate_order_id():
     """Generate a unique order ID
     Format: CPYY-XXXX where:
     - CPYY: CassPea prefix with year
-    - XXXX: Random 4-character alphanumeric string
+    - XXXX: 4 characters from the year's order number sequence
     Example: CP25-B4K9
     """
-    year = timezone.now().strftime("%y")
-    prefix = f'CP{year}-'
+    from .numbers import allocator
+
+    return allocator.next()
 
-    # Generate a random 4-character string using letters and numbers
-    random_str = get_random_string(
-        length=4,
-        allowed_chars='23456789ABCDEFGHJKLMNPQRSTUVWXYZ'  # Excluding confusing chars like 0,1,I,O
-    )
 
-    return f'{prefix}{random_str}'
+class OrderNumberCounter(models.Model):
+    """How many order numbers of a year have been reserved, see orders.numbers"""
+    year = models.PositiveSmallIntegerField(unique=True)
+    next_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.next_count}"
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -55,6 +54,15 @@ class Order(models.Model):
 
     tracking_number = models.CharField(max_length=100, null=True, blank=True)
 
+    # Money captured when the order is paid, so later price, discount or
+    # shipping changes never alter it. Null until backfilled for older orders.
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_code = models.CharField(max_length=50, blank=True, default='')
+    shipping = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True)
+    item_count = models.PositiveIntegerField(null=True, blank=True)
+
     # Timestamps
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -95,11 +103,81 @@ class Order(models.Model):
         """Get Stripe payment intent from checkout session"""
         return self.checkout_session.stripe_payment_intent
 
-    # check if ID is unique
-    def save(self, *args, **kwargs):
-        if Order.objects.filter(order_id=self.order_id).exists():
-            self.order_id = generate_order_id()
-        super().save(*args, **kwargs)
+
+class OrderLine(models.Model):
+    """
+    What was bought on an order, copied from the cart when it was paid.
+    Later product, price or cart changes never alter it.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey('products.Product', on_delete=models.SET_NULL, null=True, blank=True)
+
+    product_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    base_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discounted_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    weight = models.PositiveIntegerField(help_text="Weight of one box, packaging included, in grams")
+
+    selection_type = models.CharField(max_length=20, blank=True)
+    allergens = models.JSONField(default=list, blank=True, help_text="Names of the allergens left out")
+
+    objects = OrderLineManager()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_name} on {self.order.order_id}"
+
+
+class OrderLineFlavorSelection(models.Model):
+    line = models.ForeignKey(OrderLine, on_delete=models.CASCADE, related_name='flavor_selections')
+    flavor_name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.flavor_name}"
+
+
+class DailySales(models.Model):
+    """
+    Running sales figures for one day, either overall or for one product,
+    flavour or discount code. Maintained as orders are paid, see
+    orders.analytics.
+    """
+    class Dimension(models.TextChoices):
+        TOTAL = 'total'
+        PRODUCT = 'product'
+        FLAVOR = 'flavor'
+        DISCOUNT = 'discount'
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=20, choices=Dimension.choices)
+    key = models.CharField(max_length=255, blank=True, help_text="Product ID, flavour name or discount code")
+    label = models.CharField(max_length=255, blank=True)
+
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    shipping = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date', 'dimension', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'dimension', 'key'], name='unique_daily_sales_row'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'date']),
+        ]
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"{self.date} {self.dimension} {self.label or self.key}"
 
 
 class OrderStatusHistory(models.Model):
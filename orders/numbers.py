@@ -0,0 +1,92 @@
+"""
+Order numbers in the CPYY-XXXX format, without a lookup per order.
+
+Each year counts from 0 to 32**4 - 1. Processes reserve blocks of that
+count from OrderNumberCounter under a row lock, then hand them out from
+memory. A fixed permutation turns each count into its four characters, so
+consecutive orders do not get consecutive-looking numbers and no two counts
+share a number.
+"""
+import threading
+
+import structlog
+from django.db import transaction
+from django.utils import timezone
+
+logger = structlog.get_logger(__name__)
+
+# Excluding confusing chars like 0, 1, I and O
+ALPHABET = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+LENGTH = 4
+SPACE = len(ALPHABET) ** LENGTH
+
+# Odd multiplier: multiplying by it modulo SPACE (a power of two) is a bijection
+MULTIPLIER = 0x9E3B5
+OFFSET = 0x5A3C1
+
+# Numbers reserved per counter update
+BLOCK_SIZE = 20
+
+
+class OrderNumbersExhausted(Exception):
+    """Raised when every number of the year has been handed out"""
+
+
+def encode(year, count):
+    """The order number of the count'th order of a two digit year"""
+    value = (count * MULTIPLIER + OFFSET) % SPACE
+    characters = []
+    for _ in range(LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        characters.append(ALPHABET[digit])
+    return f"CP{year:02d}-{''.join(reversed(characters))}"
+
+
+class OrderNumberAllocator:
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.blocks = {}
+
+    def _reserve(self, year):
+        """Claim the next block of counts for year and return its numbers"""
+        from .models import Order, OrderNumberCounter
+
+        with transaction.atomic():
+            OrderNumberCounter.objects.get_or_create(year=year)
+            counter = OrderNumberCounter.objects.select_for_update().get(year=year)
+            start = counter.next_count
+            if start >= SPACE:
+                raise OrderNumbersExhausted(f"All {SPACE} order numbers for {year} are used")
+            counter.next_count = min(start + self.block_size, SPACE)
+            counter.save(update_fields=['next_count'])
+
+        numbers = [encode(year % 100, count) for count in range(start, counter.next_count)]
+        # Orders from before the counter were numbered at random; skip any they hold
+        taken = set(Order.objects.filter(order_id__in=numbers).values_list('order_id', flat=True))
+        logger.info("order_numbers_reserved", year=year, start=start, count=len(numbers), skipped=len(taken))
+        return [number for number in numbers if number not in taken]
+
+    def _adopt(self, year, numbers):
+        with self.lock:
+            self.blocks.setdefault(year, []).extend(numbers)
+
+    def next(self):
+        year = timezone.now().year
+        with self.lock:
+            block = self.blocks.get(year)
+            if block:
+                return block.pop(0)
+
+        numbers = []
+        while not numbers:
+            numbers = self._reserve(year)
+
+        # The rest of the block is only kept once the reservation is committed;
+        # if the caller rolls back, the counter does too and may hand them out again
+        rest = numbers[1:]
+        transaction.on_commit(lambda: self._adopt(year, rest))
+        return numbers[0]
+
+
+allocator = OrderNumberAllocator()
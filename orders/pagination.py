@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Newest orders first. The cursor is positioned on created, with id
+    breaking ties between orders created in the same instant, so pages stay
+    stable while new orders arrive.
+    """
+    ordering = ('-created', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
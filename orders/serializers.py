@@ -1,5 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Order
+from .models import DailySales, Order, OrderLine, OrderLineFlavorSelection
 from checkout.models import CheckoutSession
 from addresses.serializers import AddressSerializer
 from carts.models import CartItem
@@ -7,6 +8,9 @@ from carts.models import Cart, CartItemBoxCustomization, CartItemBoxFlavorSelect
 from products.models import Product
 from checkout.models import ShippingOption
 
+# Longest range one sales report may cover
+MAX_REPORT_DAYS = 366
+
 class OrderProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -130,8 +134,136 @@ class CheckoutSessionSerializer(serializers.ModelSerializer):
     def get_shipping_stripe_format(self, obj):
         return obj.shipping_stripe_format
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderLineFlavorSelectionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLineFlavorSelection
+        fields = ['flavor_name', 'quantity']
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    flavor_selections = OrderLineFlavorSelectionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = OrderLine
+        fields = [
+            'id',
+            'product',
+            'product_name',
+            'quantity',
+            'unit_price',
+            'base_price',
+            'discounted_price',
+            'weight',
+            'selection_type',
+            'allergens',
+            'flavor_selections',
+        ]
+
+class OrderDetailSerializer(serializers.ModelSerializer):
     checkout_session = CheckoutSessionSerializer()
+    lines = OrderLineSerializer(many=True, read_only=True)
     class Meta:
         model = Order
         fields = '__all__'
+
+
+def query_list(request, name):
+    """Comma separated query parameter as a set, e.g. ?fields=order_id,status"""
+    value = request.query_params.get(name, '') if request is not None else ''
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class SelectableFieldsMixin:
+    """
+    Serializer that returns only the ?fields= named in the request, and adds
+    the nested representations named in ?expand= out of `expandable`.
+    """
+    expandable = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+
+        expand = query_list(request, 'expand') & self.expandable.keys()
+        for name in expand:
+            self.fields[name] = self.expandable[name]()
+
+        selected = query_list(request, 'fields')
+        if selected:
+            for name in set(self.fields) - selected - expand:
+                self.fields.pop(name)
+
+
+class OrderSummarySerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    email = serializers.EmailField(read_only=True)
+    customer_name = serializers.CharField(
+        source='checkout_session.shipping_address.full_name',
+        read_only=True,
+        default=None
+    )
+    shipping_option = serializers.CharField(
+        source='checkout_session.shipping_option.name',
+        read_only=True,
+        default=None
+    )
+    payment_status = serializers.CharField(source='checkout_session.payment_status', read_only=True)
+    expandable = {
+        'lines': lambda: OrderLineSerializer(many=True, read_only=True),
+        'checkout_session': CheckoutSessionSerializer,
+    }
+
+    class Meta:
+        model = Order
+        fields = [
+            'id',
+            'order_id',
+            'status',
+            'tracking_number',
+            'created',
+            'updated',
+            'shipped',
+            'delivered',
+            'email',
+            'customer_name',
+            'shipping_option',
+            'payment_status',
+            'item_count',
+            'total',
+        ]
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    dimension = serializers.ChoiceField(choices=DailySales.Dimension.choices, default=DailySales.Dimension.TOTAL)
+
+    def validate(self, data):
+        today = timezone.localdate()
+        data.setdefault('start', today.replace(day=1))
+        data.setdefault('end', today)
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end")
+        if (data['end'] - data['start']).days > MAX_REPORT_DAYS:
+            raise serializers.ValidationError(f"Reports cover at most {MAX_REPORT_DAYS} days")
+        return data
+
+
+class SalesFiguresSerializer(serializers.Serializer):
+    key = serializers.CharField()
+    label = serializers.CharField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    shipping = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class SalesDaySerializer(SalesFiguresSerializer):
+    date = serializers.DateField()
+
+
+class SalesReportSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    dimension = serializers.CharField()
+    totals = SalesFiguresSerializer(many=True)
+    days = SalesDaySerializer(many=True)
@@ -1,3 +1,256 @@
-from django.test import TestCase
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from addresses.models import Address
+from carts.models import Cart, CartItem
+from checkout.models import CheckoutSession
+from products.models import Product
+from . import numbers as numbers_module
+from .models import DailySales, Order, OrderLine, OrderNumberCounter
 
-# Create your tests here.
+
+def create_order(number):
+    """A processing order with one box and a shipping address"""
+    cart = Cart.objects.create(session_id=f'orders-{number}')
+    CartItem.objects.create(cart=cart, product_id=1, quantity=1)
+    address = Address.objects.create(
+        address_type=Address.AddressType.SHIPPING_ADDRESS,
+        full_name='Jane Doe',
+        street_address='1 Cocoa Lane',
+        city='London',
+        postcode='E1 6AN'
+    )
+    checkout_session = CheckoutSession.objects.create(
+        cart=cart,
+        email=f'customer{number}@example.com',
+        shipping_address=address,
+        shipping_option_id=1
+    )
+    return Order.objects.create_from_checkout(checkout_session)
+
+
+class OrderListTest(APITestCase):
+    fixtures = [
+        'initial_discounts.json',
+        'initial_products.json',
+        'initial_product_category.json',
+        'initial_allergens.json',
+        'initial_shipping.json'
+    ]
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='x')
+        self.client.force_authenticate(self.admin)
+        self.orders = [create_order(number) for number in range(5)]
+
+    def test_list_returns_summaries(self):
+        """Test GET /api/orders/ returns slim summaries instead of the checkout session tree"""
+        response = self.client.get('/api/orders/')
+
+        self.assertEqual(response.status_code, 200)
+        newest = response.data['results'][0]
+        self.assertEqual(newest['order_id'], self.orders[-1].order_id)
+        self.assertEqual(newest['email'], 'customer4@example.com')
+        self.assertEqual(newest['customer_name'], 'Jane Doe')
+        self.assertIn('total', newest)
+        self.assertNotIn('checkout_session', newest)
+
+    def test_cursor_pages(self):
+        """Test pages follow the cursor through every order exactly once, newest first"""
+        seen = []
+        url = '/api/orders/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [order['order_id'] for order in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, [order.order_id for order in reversed(self.orders)])
+
+    def test_fields_selection(self):
+        """Test ?fields= trims each summary to the named fields"""
+        response = self.client.get('/api/orders/?fields=order_id,status')
+
+        self.assertEqual(
+            response.data['results'][0],
+            {'order_id': self.orders[-1].order_id, 'status': 'processing'}
+        )
+
+    def test_query_count_does_not_grow_with_orders(self):
+        """Test a summary page is loaded with a fixed number of queries"""
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/api/orders/')
+        for number in range(5, 10):
+            create_order(number)
+        with CaptureQueriesContext(connection) as more:
+            response = self.client.get('/api/orders/')
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(more.captured_queries), len(few.captured_queries))
+
+    def test_expand_checkout_session(self):
+        """Test ?expand=checkout_session nests the full checkout session"""
+        response = self.client.get('/api/orders/?fields=order_id&expand=checkout_session')
+
+        summary = response.data['results'][0]
+        self.assertEqual(set(summary), {'order_id', 'checkout_session'})
+        self.assertEqual(summary['checkout_session']['email'], 'customer4@example.com')
+        self.assertEqual(len(summary['checkout_session']['cart']['items']), 1)
+
+    def test_backfill_totals_and_filter(self):
+        """Test backfilled totals match the live checkout figures and can be range filtered"""
+        Order.objects.update(subtotal=None, discount_amount=None, shipping=None, total=None, item_count=None)
+        call_command('backfill_order_totals', batch_size=2, stdout=StringIO())
+
+        order = Order.objects.get(pk=self.orders[0].pk)
+        checkout_session = order.checkout_session
+        self.assertEqual(order.total, checkout_session.total_with_shipping)
+        self.assertEqual(order.subtotal, checkout_session.cart.base_total)
+        self.assertEqual(order.shipping, checkout_session.shipping_cost_pounds)
+        self.assertEqual(order.item_count, 1)
+        self.assertFalse(Order.objects.filter(total__isnull=True).exists())
+
+        response = self.client.get(f'/api/orders/?min_total={order.total}&fields=order_id')
+        self.assertEqual(len(response.data['results']), 5)
+        response = self.client.get(f'/api/orders/?min_total={order.total + Decimal("0.01")}')
+        self.assertEqual(response.data['results'], [])
+
+    def test_lines_keep_what_was_paid(self):
+        """Test order lines keep the price paid after the product price changes"""
+        product = Product.objects.get(pk=1)
+        paid = product.base_price
+        Product.objects.filter(pk=1).update(base_price=paid + 10)
+
+        response = self.client.get('/api/orders/?fields=order_id&expand=lines')
+
+        line = response.data['results'][0]['lines'][0]
+        self.assertEqual(line['product_name'], product.name)
+        self.assertEqual(line['quantity'], 1)
+        self.assertEqual(line['base_price'], str(paid))
+        self.assertEqual(line['weight'], product.weight + product.box_weight)
+
+    def test_backfill_lines(self):
+        """Test orders paid before lines were recorded get them from their cart"""
+        OrderLine.objects.all().delete()
+        call_command('backfill_order_lines', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(OrderLine.objects.count(), 5)
+        self.assertEqual(self.orders[0].lines.get().product_id, 1)
+
+
+    def test_export_lines_as_csv(self):
+        """Test the export streams one CSV row per order line, filtered like the list"""
+        Order.objects.filter(pk=self.orders[0].pk).update(status='shipped', tracking_number='RM1')
+
+        response = self.client.get('/api/orders/export/?rows=lines&status=shipped')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['order_id'], self.orders[0].order_id)
+        self.assertEqual(rows[0]['tracking_number'], 'RM1')
+        self.assertEqual(rows[0]['shipping_postcode'], 'E1 6AN')
+        self.assertEqual(rows[0]['quantity'], '1')
+
+    async def test_export_streams_under_asgi(self):
+        """Test the export is sent row by row from an async iterator instead of being buffered first"""
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.admin)))()
+        response = await AsyncClient().get(
+            '/api/orders/export/?output=ndjson', headers={'Authorization': f'Bearer {token}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), len(self.orders))
+        self.assertEqual(
+            [json.loads(chunk)['order_id'] for chunk in chunks],
+            [order.order_id for order in self.orders]
+        )
+
+    def test_export_command_as_ndjson(self):
+        """Test export_orders writes one JSON object per order with the same filters"""
+        out = StringIO()
+        call_command('export_orders', output='ndjson', filter=[f'max_total={self.orders[0].total}'], stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [order.order_id for order in self.orders])
+        self.assertEqual(rows[0]['total'], str(self.orders[0].total))
+
+    def test_sales_report_reads_rollups(self):
+        """Test paid orders are rolled up per day and product as they are created"""
+        response = self.client.get('/api/orders/analytics/?dimension=product')
+
+        self.assertEqual(response.status_code, 200)
+        product = Product.objects.get(pk=1)
+        self.assertEqual(len(response.data['totals']), 1)
+        totals = response.data['totals'][0]
+        self.assertEqual((totals['key'], totals['label']), ('1', product.name))
+        self.assertEqual((totals['orders'], totals['units']), (5, 5))
+        self.assertEqual(Decimal(totals['revenue']), sum(order.lines.get().base_price for order in self.orders))
+
+        response = self.client.get('/api/orders/analytics/')
+        self.assertEqual(Decimal(response.data['totals'][0]['revenue']), sum(order.total for order in self.orders))
+
+    def test_rebuild_sales_rollups(self):
+        """Test rebuilding gives the same rollups as recording orders one at a time"""
+        CheckoutSession.objects.update(payment_status=CheckoutSession.Status.PAID)
+        recorded = list(DailySales.objects.values('date', 'dimension', 'key', 'orders', 'units', 'revenue'))
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        self.assertEqual(
+            list(DailySales.objects.values('date', 'dimension', 'key', 'orders', 'units', 'revenue')),
+            recorded
+        )
+
+    def test_sales_report_rejects_reversed_range(self):
+        response = self.client.get('/api/orders/analytics/?start=2025-02-01&end=2025-01-01')
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderNumberTest(TestCase):
+    def test_permutation_covers_the_year(self):
+        """Test every count of the year encodes to a distinct CPYY-XXXX number"""
+        numbers = {numbers_module.encode(26, count) for count in range(numbers_module.SPACE)}
+        self.assertEqual(len(numbers), numbers_module.SPACE)
+        self.assertRegex(numbers_module.encode(26, 0), r'^CP26-[2-9A-HJ-NP-Z]{4}$')
+
+    def test_processes_never_share_numbers(self):
+        """Test two allocators reserve separate blocks and hand out numbers from memory"""
+        first = numbers_module.OrderNumberAllocator(block_size=5)
+        second = numbers_module.OrderNumberAllocator(block_size=5)
+
+        issued = []
+        for _ in range(3):
+            for allocator in (first, second):
+                with self.captureOnCommitCallbacks(execute=True):
+                    issued.append(allocator.next())
+        with self.assertNumQueries(0):
+            issued.append(first.next())
+
+        self.assertEqual(len(set(issued)), len(issued))
+        self.assertEqual(OrderNumberCounter.objects.get().next_count, 10)
+
+    def test_legacy_numbers_are_skipped(self):
+        """Test numbers already held by randomly numbered orders are not issued again"""
+        year = timezone.now().year
+        legacy = numbers_module.encode(year % 100, 0)
+        cart = Cart.objects.create(session_id='legacy')
+        checkout_session = CheckoutSession.objects.create(cart=cart, email='legacy@example.com')
+        Order.objects.create(checkout_session=checkout_session, order_id=legacy)
+        OrderNumberCounter.objects.filter(year=year).delete()
+
+        allocator = numbers_module.OrderNumberAllocator(block_size=2)
+        self.assertEqual(allocator.next(), numbers_module.encode(year % 100, 1))
@@ -5,5 +5,7 @@ app_name = 'orders'
 
 urlpatterns = [
     path('', views.OrderListView.as_view(), name='order-list'),
+    path('export/', views.OrderExportView.as_view(), name='order-export'),
+    path('analytics/', views.SalesReportView.as_view(), name='sales-report'),
     path('<str:order_id>/', views.OrderDetailView.as_view(), name='order-detail'),
 ]
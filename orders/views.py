@@ -1,52 +1,143 @@
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import analytics, export
+from .filters import OrderFilter
 from .models import Order
-from .serializers import OrderListSerializer
+from .pagination import OrderCursorPagination
+from .serializers import (
+    OrderDetailSerializer,
+    OrderSummarySerializer,
+    SalesReportQuerySerializer,
+    SalesReportSerializer,
+    query_list
+)
+from erp.async_views import streaming_content
 from users.authentication import CustomJWTAuthentication
 
+
+@extend_schema(parameters=[
+    OpenApiParameter(
+        name='fields',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description="Comma separated summary fields to return, e.g. 'order_id,status,total'"
+    ),
+    OpenApiParameter(
+        name='expand',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description=f"Comma separated related objects to nest: {', '.join(OrderSummarySerializer.expandable)}"
+    ),
+])
 class OrderListView(generics.ListAPIView):
     """
-    List all orders with filtering and search capabilities
-    GET /api/orders/
+    List orders as summaries, newest first, one cursor page at a time
+    GET /api/orders/?fields=order_id,status&expand=lines
     """
-    serializer_class = OrderListSerializer
+    serializer_class = OrderSummarySerializer
+    pagination_class = OrderCursorPagination
+    filterset_class = OrderFilter
     permission_classes = [permissions.IsAdminUser]
     authentication_classes = [CustomJWTAuthentication]
-    ordering = ['-created']
+    ordering = ['-created', '-id']
+    ordering_fields = ['created']
 
     def get_queryset(self):
-        return Order.objects.select_related(
-            'checkout_session',
-            'checkout_session__cart',
-            'checkout_session__shipping_address',
-            'checkout_session__billing_address',
-            'checkout_session__shipping_option'
-        ).prefetch_related(
-            'status_history',
-            'checkout_session__cart__items',
-            'checkout_session__cart__items__product'
-        )
+        expand = query_list(self.request, 'expand')
+        if 'checkout_session' in expand:
+            return Order.objects.with_detail()
+        queryset = Order.objects.with_summary()
+        if 'lines' in expand:
+            queryset = queryset.prefetch_related('lines__flavor_selections')
+        return queryset
 
 class OrderDetailView(generics.RetrieveAPIView):
     """
-    Retrieve a specific order
+    Retrieve a specific order with its full checkout session
     GET /api/orders/<order_id>/
     """
-    queryset = Order.objects.all()
-    serializer_class = OrderListSerializer
+    serializer_class = OrderDetailSerializer
     permission_classes = [permissions.IsAdminUser]
     authentication_classes = [CustomJWTAuthentication]
     lookup_field = 'order_id'
 
     def get_queryset(self):
-        return Order.objects.select_related(
-            'checkout_session',
-            'checkout_session__cart',
-            'checkout_session__shipping_address',
-            'checkout_session__billing_address',
-            'checkout_session__shipping_option'
-        ).prefetch_related(
-            'status_history',
-            'checkout_session__cart__items',
-            'checkout_session__cart__items__product'
+        return Order.objects.with_detail()
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            name='output',
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            required=False,
+            enum=list(export.FORMATS),
+            description="File format, CSV by default"
+        ),
+        OpenApiParameter(
+            name='rows',
+            type=OpenApiTypes.STR,
+            location=OpenApiParameter.QUERY,
+            required=False,
+            enum=export.ROWS,
+            description="One row per order (default) or per order line"
+        ),
+    ],
+    responses={200: OpenApiTypes.BINARY}
+)
+class OrderExportView(generics.GenericAPIView):
+    """
+    Stream filtered orders as CSV or NDJSON, oldest first
+    GET /api/orders/export/?output=csv&rows=lines&status=processing
+    """
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CustomJWTAuthentication]
+    filterset_class = OrderFilter
+    queryset = Order.objects.all()
+
+    def get(self, request):
+        output = request.query_params.get('output', export.CSV)
+        per = request.query_params.get('rows', export.ORDERS)
+        if output not in export.FORMATS or per not in export.ROWS:
+            return Response(
+                {'error': f"output must be one of {', '.join(export.FORMATS)} and rows one of {', '.join(export.ROWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        orders = self.filter_queryset(self.get_queryset())
+        # Rows are read from the database cursor as the response is sent
+        response = StreamingHttpResponse(
+            streaming_content(request, export.export(orders, output, per), batch=export.CHUNK_SIZE),
+            content_type=export.FORMATS[output]
         )
+        filename = f"{per}-{timezone.now():%Y%m%d-%H%M}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SalesReportView(APIView):
+    """
+    Daily sales overall or per product, flavour or discount code, read from
+    the rollups. Defaults to the current month.
+    GET /api/orders/analytics/?dimension=product&start=2025-01-01&end=2025-01-31
+    """
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CustomJWTAuthentication]
+
+    @extend_schema(parameters=[SalesReportQuerySerializer], responses=SalesReportSerializer)
+    def get(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response({'error': query.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = analytics.report(**query.validated_data)
+        return Response(SalesReportSerializer(report).data)
@@ -1,6 +1,49 @@
 from django.contrib import admin
-from .models import Product, ProductCategory, ProductGalleryImage
+from django.contrib import messages
+from .derivatives import with_derivative_status
+from .models import Product, ProductCategory, ProductGalleryImage, ImageDerivativeJob
+
+class DerivativeStatusMixin:
+    def get_queryset(self, request):
+        return with_derivative_status(super().get_queryset(request))
+
+    def get_derivative_status(self, obj):
+        return obj.derivative_status or '-'
+    get_derivative_status.short_description = 'Derivatives'
+
+@admin.register(Product)
+class ProductAdmin(DerivativeStatusMixin, admin.ModelAdmin):
+    list_display = ['name', 'category', 'base_price', 'active', 'sold_out', 'get_derivative_status']
+    list_filter = ['category', 'active', 'sold_out']
+    search_fields = ['name', 'slug']
+    readonly_fields = ['get_derivative_status']
+
+@admin.register(ProductGalleryImage)
+class ProductGalleryImageAdmin(DerivativeStatusMixin, admin.ModelAdmin):
+    list_display = ['id', 'product', 'order', 'alt_text', 'get_derivative_status']
+    list_filter = ['product']
+    readonly_fields = ['get_derivative_status']
+
+@admin.register(ImageDerivativeJob)
+class ImageDerivativeJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'content_type', 'object_id', 'source_name', 'status', 'attempts', 'created', 'finished']
+    list_filter = ['status', 'content_type']
+    search_fields = ['source_name']
+    readonly_fields = [
+        'content_type', 'object_id', 'source_name', 'source_hash', 'attempts',
+        'error_message', 'started', 'finished', 'created', 'updated'
+    ]
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(
+            status=ImageDerivativeJob.PROCESSING
+        ).update(status=ImageDerivativeJob.PENDING, attempts=0, error_message=None)
+        self.message_user(
+            request,
+            f'{updated} jobs have been queued again.',
+            messages.SUCCESS
+        )
+    retry.short_description = "Queue selected jobs again"
 
-admin.site.register(Product)
 admin.site.register(ProductCategory)
-admin.site.register(ProductGalleryImage)
@@ -0,0 +1,101 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from allergens.models import Allergen
+from allergens.serializers import AllergenSerializer
+from flavours.models import Flavour
+from flavours.serializers import FlavourSerializer
+from .models import Product
+from .serializers import ProductSerializer
+
+CATALOG_GENERATION_KEY = 'catalog:generation'
+CATALOG_CURRENT_KEY = 'catalog:current:{generation}'
+CATALOG_SNAPSHOT_KEY = 'catalog:snapshot:{version}'
+
+
+class CatalogSnapshot:
+    """A pre-rendered catalog document and the content hash it is keyed by"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+
+    @property
+    def etag(self):
+        return f'"{self.version}"'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_SNAPSHOT_TIMEOUT', 300)
+
+
+def _generation():
+    # Seeded from the clock so an evicted counter never reuses an old generation
+    return cache.get_or_set(CATALOG_GENERATION_KEY, time.time_ns, None)
+
+
+def catalog_content():
+    """Serialize the active catalog: products, flavours and allergens"""
+    products = Product.objects.active().select_related('category').prefetch_related('gallery_images')
+    flavours = Flavour.objects.active().select_related('category').prefetch_related('allergens')
+
+    return {
+        'products': ProductSerializer(products, many=True).data,
+        'flavours': FlavourSerializer(flavours, many=True).data,
+        'allergens': AllergenSerializer(Allergen.objects.order_by('id'), many=True).data,
+    }
+
+
+def build_snapshot():
+    """Render the catalog once and key it by a hash of its content"""
+    renderer = JSONRenderer()
+    content = catalog_content()
+    version = hashlib.sha256(renderer.render(content)).hexdigest()[:16]
+    body = renderer.render({'version': version, **content})
+    return CatalogSnapshot(version, body)
+
+
+def get_snapshot():
+    """
+    Return the current snapshot from the cache, building it on a miss.
+
+    The pointer to the current version is scoped by a generation counter that
+    invalidate() bumps, so a snapshot built while the catalog was changing is
+    never published as current.
+    """
+    generation = _generation()
+    current_key = CATALOG_CURRENT_KEY.format(generation=generation)
+
+    version = cache.get(current_key)
+    if version is not None:
+        body = cache.get(CATALOG_SNAPSHOT_KEY.format(version=version))
+        if body is not None:
+            return CatalogSnapshot(version, body)
+
+    snapshot = build_snapshot()
+    cache.set(CATALOG_SNAPSHOT_KEY.format(version=snapshot.version), snapshot.body, _timeout())
+    cache.set(current_key, snapshot.version, _timeout())
+    return snapshot
+
+
+def catalog_version():
+    """
+    Content hash of the current catalog snapshot. Clients use it to tell
+    whether their cached catalog can resolve compact cart references.
+    """
+    version = cache.get(CATALOG_CURRENT_KEY.format(generation=_generation()))
+    if version is None:
+        version = get_snapshot().version
+    return version
+
+
+def invalidate():
+    """Retire the current snapshot; the next read rebuilds it"""
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        cache.set(CATALOG_GENERATION_KEY, time.time_ns(), None)
@@ -0,0 +1,193 @@
+import hashlib
+from datetime import timedelta
+
+import structlog
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+logger = structlog.get_logger(__name__)
+
+DERIVATIVE_FIELDS = ['image_webp', 'thumbnail', 'thumbnail_webp', 'image_variants']
+MAX_ATTEMPTS = 3
+# Jobs stuck in processing longer than this are assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=15)
+
+
+def file_hash(file):
+    """SHA-256 of a file's content, leaving it rewound for whoever reads it next"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def has_derivatives(instance):
+    return all(getattr(instance, field) for field in DERIVATIVE_FIELDS)
+
+
+class SourceChange:
+    """Whether a save replaces the image, and the new upload's hash if known"""
+
+    def __init__(self, changed, source_hash=''):
+        self.changed = changed
+        self.source_hash = source_hash
+
+    @classmethod
+    def detect(cls, instance):
+        image = instance.image
+        if not image:
+            return cls(False)
+
+        loaded_name = getattr(instance, '_loaded_image_name', None)
+        if image._committed and image.name == loaded_name:
+            return cls(False)
+
+        # A fresh upload is still in memory, so hashing it costs no storage round trip
+        source_hash = '' if image._committed else file_hash(image)
+        return cls(True, source_hash)
+
+    def enqueue(self, instance):
+        instance._loaded_image_name = instance.image.name
+        if not self.changed:
+            return None
+
+        if self.source_hash and self.source_hash == instance.image_hash and has_derivatives(instance):
+            logger.info(
+                "image_derivatives_unchanged",
+                model=instance._meta.label,
+                object_id=instance.pk
+            )
+            return None
+
+        return enqueue(instance, self.source_hash)
+
+
+def enqueue(instance, source_hash=''):
+    """Queue derivative generation, folding into a job that has not started yet"""
+    from .models import ImageDerivativeJob
+
+    content_type = ContentType.objects.get_for_model(instance)
+    pending = ImageDerivativeJob.objects.filter(
+        content_type=content_type,
+        object_id=instance.pk,
+        status=ImageDerivativeJob.PENDING
+    )
+    if pending.update(source_name=instance.image.name, source_hash=source_hash, updated=timezone.now()):
+        return pending.first()
+
+    job = ImageDerivativeJob.objects.create(
+        content_type=content_type,
+        object_id=instance.pk,
+        source_name=instance.image.name,
+        source_hash=source_hash
+    )
+    logger.info(
+        "image_derivatives_enqueued",
+        job_id=job.id,
+        model=instance._meta.label,
+        object_id=instance.pk
+    )
+    return job
+
+
+def with_derivative_status(queryset):
+    """Annotate each image owner with its latest job's status, in the same query"""
+    from .models import ImageDerivativeJob
+
+    latest = ImageDerivativeJob.objects.filter(
+        content_type=ContentType.objects.get_for_model(queryset.model),
+        object_id=OuterRef('pk')
+    ).order_by('-created').values('status')[:1]
+    return queryset.annotate(latest_derivative_status=Subquery(latest))
+
+
+def claim_jobs(batch_size):
+    """Mark up to batch_size pending jobs as processing and return them"""
+    from .models import ImageDerivativeJob
+
+    stale = ImageDerivativeJob.objects.filter(
+        status=ImageDerivativeJob.PROCESSING,
+        started__lt=timezone.now() - STALE_AFTER
+    )
+    # A job that keeps taking its worker down is not handed out again
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=ImageDerivativeJob.FAILED,
+        error_message=f"Worker stopped while processing, {MAX_ATTEMPTS} times",
+        finished=timezone.now()
+    )
+    if failed:
+        logger.warning("image_derivative_jobs_abandoned", count=failed)
+    stale.update(status=ImageDerivativeJob.PENDING)
+
+    with transaction.atomic():
+        jobs = list(
+            ImageDerivativeJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageDerivativeJob.PENDING)
+            .order_by('created')[:batch_size]
+        )
+        now = timezone.now()
+        for job in jobs:
+            job.status = ImageDerivativeJob.PROCESSING
+            job.attempts += 1
+            job.started = now
+        ImageDerivativeJob.objects.bulk_update(jobs, ['status', 'attempts', 'started'])
+    return jobs
+
+
+def _finish(job, status, error_message=None):
+    job.status = status
+    job.error_message = error_message
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished', 'updated'])
+
+
+def process_job(job):
+    """Generate derivatives for one claimed job"""
+    from .models import ImageDerivativeJob
+
+    instance = job.content_object
+    if instance is None or instance.image.name != job.source_name:
+        # Deleted, or replaced by a newer upload with its own job
+        _finish(job, ImageDerivativeJob.SKIPPED)
+        return job
+
+    try:
+        source_hash = job.source_hash or file_hash(instance.image)
+        if source_hash == instance.image_hash and has_derivatives(instance):
+            _finish(job, ImageDerivativeJob.SKIPPED)
+            return job
+
+        instance.generate_derivatives()
+        instance.image_hash = source_hash
+        instance.save(update_fields=DERIVATIVE_FIELDS + ['image_hash', 'updated'])
+    except Exception as e:
+        status = ImageDerivativeJob.FAILED if job.attempts >= MAX_ATTEMPTS else ImageDerivativeJob.PENDING
+        _finish(job, status, str(e))
+        logger.exception(
+            "image_derivatives_failed",
+            job_id=job.id,
+            attempts=job.attempts,
+            error=str(e)
+        )
+        return job
+
+    _finish(job, ImageDerivativeJob.DONE)
+    logger.info(
+        "image_derivatives_generated",
+        job_id=job.id,
+        model=instance._meta.label,
+        object_id=instance.pk
+    )
+    return job
+
+
+def process_pending(batch_size=10):
+    """Claim and process one batch; returns the number of jobs handled"""
+    jobs = claim_jobs(batch_size)
+    for job in jobs:
+        process_job(job)
+    return len(jobs)
@@ -0,0 +1,78 @@
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, F, Max, Value, When
+
+
+def _gallery(product_id):
+    from .models import ProductGalleryImage
+
+    return ProductGalleryImage.objects.filter(product_id=product_id)
+
+
+def lock_gallery(product_id):
+    """Serialize gallery edits for one product by locking its product row"""
+    from .models import Product
+
+    list(Product.objects.select_for_update().filter(pk=product_id).values_list('pk', flat=True))
+
+
+def _park(product_id, ids):
+    """
+    Move rows clear of every position in the gallery in one UPDATE, so the
+    next UPDATE can place them without tripping unique_together(product, order)
+    part-way through the statement. Returns the offset used.
+    """
+    # Past top + 1, the furthest make_room shifts an image, so no parked
+    # value is also a target of the UPDATE that follows
+    offset = (_gallery(product_id).aggregate(top=Max('order'))['top'] or 0) + 2
+    _gallery(product_id).filter(pk__in=ids).update(order=F('order') + offset)
+    return offset
+
+
+def make_room(product_id, position, moving_pk=None):
+    """
+    Shift every image at or after position down by one. An existing image
+    being moved (moving_pk) is parked out of the way until it is saved.
+    """
+    ids = list(
+        _gallery(product_id).filter(order__gte=position).exclude(pk=moving_pk).values_list('pk', flat=True)
+    )
+    if not ids:
+        return 0
+
+    offset = _park(product_id, ids + ([moving_pk] if moving_pk else []))
+    return _gallery(product_id).filter(pk__in=ids).update(order=F('order') - offset + 1)
+
+
+def close_gap(product_id, position):
+    """Shift every image after a removed position up by one"""
+    ids = list(_gallery(product_id).filter(order__gt=position).values_list('pk', flat=True))
+    if not ids:
+        return 0
+
+    offset = _park(product_id, ids)
+    return _gallery(product_id).filter(pk__in=ids).update(order=F('order') - offset - 1)
+
+
+@transaction.atomic
+def set_order(product_id, image_ids):
+    """Reorder a product's gallery to match image_ids, at positions 0..n-1"""
+    lock_gallery(product_id)
+    image_ids = [int(image_id) for image_id in image_ids]
+    existing = set(_gallery(product_id).values_list('pk', flat=True))
+
+    if len(image_ids) != len(set(image_ids)) or set(image_ids) != existing:
+        raise ValidationError("Image IDs must list every image in the gallery exactly once")
+    if not image_ids:
+        return 0
+
+    from . import catalog
+
+    transaction.on_commit(catalog.invalidate)
+    _park(product_id, image_ids)
+    return _gallery(product_id).update(
+        order=Case(
+            *[When(pk=image_id, then=Value(position)) for position, image_id in enumerate(image_ids)],
+            output_field=models.PositiveIntegerField()
+        )
+    )
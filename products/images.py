@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+DEFAULT_VARIANT_WIDTHS = [320, 640, 1280]
+# Preference order; formats whose encoder is not installed (e.g. AVIF without
+# a Pillow AVIF plugin) are skipped, JPEG is the universal fallback.
+DEFAULT_VARIANT_FORMATS = ['avif', 'webp', 'jpeg']
+DEFAULT_VARIANT_QUALITY = {'avif': 60, 'webp': 80, 'jpeg': 82}
+DEFAULT_THUMBNAIL_SIZE = (300, 300)
+
+FORMATS = {
+    'avif': ('AVIF', 'avif'),
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+@dataclass(frozen=True)
+class VariantConfig:
+    widths: tuple
+    formats: tuple
+    quality: dict
+    thumbnail_size: tuple
+
+
+def variant_config():
+    """
+    Variant widths, formats and quality. The defaults above apply unless
+    settings define IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY or IMAGE_THUMBNAIL_SIZE.
+    """
+    Image.init()
+    formats = tuple(
+        name for name in getattr(settings, 'IMAGE_VARIANT_FORMATS', DEFAULT_VARIANT_FORMATS)
+        if name in FORMATS and FORMATS[name][0] in Image.SAVE
+    )
+    return VariantConfig(
+        widths=tuple(sorted(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_VARIANT_WIDTHS))),
+        formats=formats,
+        quality={**DEFAULT_VARIANT_QUALITY, **getattr(settings, 'IMAGE_VARIANT_QUALITY', {})},
+        thumbnail_size=tuple(getattr(settings, 'IMAGE_THUMBNAIL_SIZE', DEFAULT_THUMBNAIL_SIZE)),
+    )
+
+
+def decode(image_file):
+    """Open and fully decode an image once, upright and in RGB"""
+    image_file.seek(0)
+    img = Image.open(image_file)
+    img.load()
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def encode(img, name, config):
+    """Encode a decoded image in one of the configured formats"""
+    pil_format = FORMATS[name][0]
+    output = BytesIO()
+    img.save(output, pil_format, quality=config.quality[name], optimize=True)
+    return ContentFile(output.getvalue())
+
+
+def resized(img, width):
+    """Scale to a target width, keeping the aspect ratio"""
+    if img.width <= width:
+        return img
+    height = round(img.height * width / img.width)
+    return img.resize((width, height), Image.LANCZOS)
+
+
+def variant_widths(img, config):
+    """Configured widths below the source width, plus the source width itself"""
+    return [width for width in config.widths if width < img.width] + [img.width]
+
+
+def render_variants(img, base_name, storage, config=None):
+    """
+    Produce every width/format variant from one decoded image. Each width is
+    resized once and encoded in every format. Returns {format: {width: name}}.
+    """
+    config = config or variant_config()
+    variants = {name: {} for name in config.formats}
+
+    for width in variant_widths(img, config):
+        scaled = resized(img, width)
+        for name in config.formats:
+            extension = FORMATS[name][1]
+            saved_name = storage.save(f"{base_name}_{width}w.{extension}", encode(scaled, name, config))
+            variants[name][str(width)] = saved_name
+
+    return variants
+
+
+def delete_variants(variants, storage):
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def render_derivatives(instance, config=None):
+    """
+    Generate an instance's legacy WebP/thumbnail fields and its responsive
+    variants from a single decode of the source image.
+    """
+    config = config or variant_config()
+    img = decode(instance.image)
+    base_name = os.path.splitext(instance.image.name)[0]
+
+    instance.image_webp.save(f"{base_name}.webp", encode(img, 'webp', config), save=False)
+
+    thumb = img.copy()
+    thumb.thumbnail(config.thumbnail_size)
+    instance.thumbnail.save(f"{base_name}_thumb.jpg", encode(thumb, 'jpeg', config), save=False)
+    instance.thumbnail_webp.save(f"{base_name}_thumb.webp", encode(thumb, 'webp', config), save=False)
+
+    storage = instance.image.storage
+    old_variants = instance.image_variants
+    instance.image_variants = render_variants(img, base_name, storage, config)
+    delete_variants(old_variants, storage)
+
+
+def srcset(variants, storage):
+    """Map each format to a srcset string, e.g. {'webp': 'a_320w.webp 320w, ...'}"""
+    return {
+        name: ', '.join(
+            f"{storage.url(path)} {width}w"
+            for width, path in sorted(names.items(), key=lambda item: int(item[0]))
+        )
+        for name, names in (variants or {}).items()
+        if names
+    }
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.derivatives import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Generate queued product image derivatives (WebP and thumbnails)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per batch')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Processing image derivative jobs...')
+
+        while True:
+            processed = process_pending(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} job(s)')
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS('Image derivative queue drained'))
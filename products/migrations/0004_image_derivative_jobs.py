@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('products', '0003_alter_product_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the image the current derivatives were built from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='productgalleryimage',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the image the current derivatives were built from', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ImageDerivativeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('source_name', models.CharField(help_text='Image file the derivatives are built from', max_length=255)),
+                ('source_hash', models.CharField(blank=True, help_text='SHA-256 of the source, if known', max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['status', 'created'], name='products_im_status_a19df7_idx'), models.Index(fields=['content_type', 'object_id'], name='products_im_content_30d503_idx')],
+            },
+        ),
+    ]
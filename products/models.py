@@ -1,14 +1,110 @@
 from django.db import models, transaction
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from allergens.models import Allergen
 from django.utils.text import slugify
 from storages.backends.s3boto3 import S3Boto3Storage
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
-import os
+
+from . import derivatives, gallery, images
 
 s3_storage = S3Boto3Storage(location='media')
 
+class ImageDerivativeJob(models.Model):
+    """
+    Queued generation of an image's WebP and thumbnail derivatives, drained
+    off-request by the process_image_jobs command.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (SKIPPED, 'Skipped'),
+        (FAILED, 'Failed'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    source_name = models.CharField(max_length=255, help_text="Image file the derivatives are built from")
+    source_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the source, if known")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['status', 'created']),
+            models.Index(fields=['content_type', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"Derivatives for {self.content_type.model} {self.object_id} - {self.status}"
+
+
+class ImageSourceMixin(models.Model):
+    """
+    Remembers the image name loaded from the database so save() can tell
+    whether the source changed without re-querying the row.
+    """
+    image_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text="SHA-256 of the image the current derivatives were built from"
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Responsive variants as {format: {width: file name}}"
+    )
+    derivative_jobs = GenericRelation(ImageDerivativeJob)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image_name = instance.__dict__.get('image')
+        return instance
+
+    def generate_derivatives(self):
+        """Create the WebP, thumbnails and responsive variants from one decode of the image"""
+        images.render_derivatives(self)
+
+    @property
+    def image_srcset(self):
+        return images.srcset(self.image_variants, self.image.storage)
+
+    def delete_derivatives(self):
+        for field in (self.image_webp, self.thumbnail, self.thumbnail_webp):
+            if field:
+                field.delete(save=False)
+        images.delete_variants(self.image_variants, self.image.storage)
+
+    @property
+    def derivative_status(self):
+        # Set by derivatives.with_derivative_status() on list querysets
+        if hasattr(self, 'latest_derivative_status'):
+            return self.latest_derivative_status
+        job = self.derivative_jobs.order_by('-created').first()
+        return job.status if job else None
+
+
 class ProductCategoryManager(models.Manager):
     def active(self):
         return self.filter(active=True)
@@ -33,7 +129,7 @@ class ProductManager(models.Manager):
     def active(self):
         return self.filter(active=True)
 
-class Product(models.Model):
+class Product(ImageSourceMixin):
     name = models.CharField(max_length=255)
     description = models.TextField()
     category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE)
@@ -93,102 +189,20 @@ class Product(models.Model):
     class Meta:
         ordering = ['base_price']
 
-    def create_webp_version(self, image_field, webp_field, is_thumbnail=False):
-        """Create WebP version of the image"""
-        if not image_field:
-            return
-
-        # Open image using PIL
-        img = Image.open(image_field)
-
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-
-        # Resize if it's a thumbnail
-        if is_thumbnail:
-            img.thumbnail((300, 300))  # Adjust size as needed
-
-        # Save as WebP
-        webp_io = BytesIO()
-        img.save(webp_io, 'WEBP', quality=85, optimize=True)
-        webp_io.seek(0)
-
-        # Generate filename
-        original_name = os.path.splitext(image_field.name)[0]
-        webp_filename = f"{original_name}.webp"
-
-        # Save the WebP version
-        webp_field.save(
-            webp_filename,
-            ContentFile(webp_io.getvalue()),
-            save=False
-        )
-
-    def create_thumbnail(self, image_field, thumbnail_field):
-        """Create thumbnail version of the image"""
-        if not image_field:
-            return
-
-        # Open image using PIL
-        img = Image.open(image_field)
-
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-
-        # Create thumbnail
-        img.thumbnail((300, 300))  # Adjust size as needed
-
-        # Save as JPEG
-        thumb_io = BytesIO()
-        img.save(thumb_io, 'JPEG', quality=85, optimize=True)
-        thumb_io.seek(0)
-
-        # Generate filename
-        original_name = os.path.splitext(image_field.name)[0]
-        thumbnail_filename = f"{original_name}_thumb.jpg"
-
-        # Save the thumbnail
-        thumbnail_field.save(
-            thumbnail_filename,
-            ContentFile(thumb_io.getvalue()),
-            save=False
-        )
-
     def save(self, *args, **kwargs):
-        # Check if this is a new instance or if the image has changed
-        if self.pk:
-            original = Product.objects.get(pk=self.pk)
-            if original.image != self.image and self.image:
-                # Create WebP version of main image
-                self.create_webp_version(self.image, self.image_webp)
-                # Create thumbnail and its WebP version
-                self.create_thumbnail(self.image, self.thumbnail)
-                self.create_webp_version(self.thumbnail, self.thumbnail_webp, is_thumbnail=True)
-        else:
-            if self.image:
-                # Create WebP version of main image
-                self.create_webp_version(self.image, self.image_webp)
-                # Create thumbnail and its WebP version
-                self.create_thumbnail(self.image, self.thumbnail)
-                self.create_webp_version(self.thumbnail, self.thumbnail_webp, is_thumbnail=True)
-
+        # Derivatives are generated off-request by the process_image_jobs worker
+        source = derivatives.SourceChange.detect(self)
         super().save(*args, **kwargs)
+        source.enqueue(self)
 
     def delete(self, *args, **kwargs):
         # Delete all associated images
+        self.delete_derivatives()
         if self.image:
-            self.image.delete()
-        if self.image_webp:
-            self.image_webp.delete()
-        if self.thumbnail:
-            self.thumbnail.delete()
-        if self.thumbnail_webp:
-            self.thumbnail_webp.delete()
+            self.image.delete(save=False)
         super().delete(*args, **kwargs)
 
-class ProductGalleryImage(models.Model):
+class ProductGalleryImage(ImageSourceMixin):
     product = models.ForeignKey(
         Product,
         related_name='gallery_images',
@@ -236,106 +250,36 @@ class ProductGalleryImage(models.Model):
         ordering = ['order', 'created']
         unique_together = ['product', 'order']
 
-    def create_webp_version(self, image_field, webp_field, is_thumbnail=False):
-        """Create WebP version of the image"""
-        if not image_field:
-            return
-
-        img = Image.open(image_field)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-
-        if is_thumbnail:
-            img.thumbnail((300, 300))
-
-        webp_io = BytesIO()
-        img.save(webp_io, 'WEBP', quality=85, optimize=True)
-        webp_io.seek(0)
-
-        original_name = os.path.splitext(image_field.name)[0]
-        webp_filename = f"{original_name}.webp"
-
-        webp_field.save(
-            webp_filename,
-            ContentFile(webp_io.getvalue()),
-            save=False
-        )
-
-    def create_thumbnail(self, image_field, thumbnail_field):
-        """Create thumbnail version of the image"""
-        if not image_field:
-            return
-
-        img = Image.open(image_field)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-
-        img.thumbnail((300, 300))
-
-        thumb_io = BytesIO()
-        img.save(thumb_io, 'JPEG', quality=85, optimize=True)
-        thumb_io.seek(0)
-
-        original_name = os.path.splitext(image_field.name)[0]
-        thumbnail_filename = f"{original_name}_thumb.jpg"
-
-        thumbnail_field.save(
-            thumbnail_filename,
-            ContentFile(thumb_io.getvalue()),
-            save=False
-        )
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_order = instance.__dict__.get('order')
+        return instance
 
     def save(self, *args, **kwargs):
-        # Handle image ordering
-        if not self.pk or (
-            self.pk and
-            ProductGalleryImage.objects.get(pk=self.pk).order != self.order
-        ):
-            with transaction.atomic():
-                # If an image already exists at this order, shift other images
-                existing_images = ProductGalleryImage.objects.filter(
-                    product=self.product,
-                    order__gte=self.order
-                ).exclude(pk=self.pk).select_for_update()
-
-                # Shift the order of other images
-                for img in existing_images:
-                    img.order += 1
-                    img.save()
-
-        # Process images
-        if self.pk:
-            original = ProductGalleryImage.objects.get(pk=self.pk)
-            if original.image != self.image and self.image:
-                self.create_webp_version(self.image, self.image_webp)
-                self.create_thumbnail(self.image, self.thumbnail)
-                self.create_webp_version(self.thumbnail, self.thumbnail_webp, is_thumbnail=True)
-        else:
-            if self.image:
-                self.create_webp_version(self.image, self.image_webp)
-                self.create_thumbnail(self.image, self.thumbnail)
-                self.create_webp_version(self.thumbnail, self.thumbnail_webp, is_thumbnail=True)
+        with transaction.atomic():
+            # Make room when inserting or moving, with set-based shifts instead of per-row saves
+            if self._state.adding or self.order != getattr(self, '_loaded_order', None):
+                gallery.lock_gallery(self.product_id)
+                gallery.make_room(self.product_id, self.order, moving_pk=self.pk)
 
-        super().save(*args, **kwargs)
+            # Derivatives are generated off-request by the process_image_jobs worker
+            source = derivatives.SourceChange.detect(self)
+            super().save(*args, **kwargs)
+            source.enqueue(self)
+            self._loaded_order = self.order
 
     def delete(self, *args, **kwargs):
         old_order = self.order
 
         # Delete image files
+        self.delete_derivatives()
         if self.image:
-            self.image.delete()
-        if self.image_webp:
-            self.image_webp.delete()
-        if self.thumbnail:
-            self.thumbnail.delete()
-        if self.thumbnail_webp:
-            self.thumbnail_webp.delete()
-
-        # Reorder remaining images
-        with transaction.atomic():
-            ProductGalleryImage.objects.filter(
-                product=self.product,
-                order__gt=old_order
-            ).update(order=models.F('order') - 1)
+            self.image.delete(save=False)
 
-            super().delete(*args, **kwargs)
+        # Remove the row first, then close the gap it leaves
+        with transaction.atomic():
+            gallery.lock_gallery(self.product_id)
+            result = super().delete(*args, **kwargs)
+            gallery.close_gap(self.product_id, old_order)
+        return result
@@ -7,6 +7,8 @@ class ProductCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class ProductGalleryImageSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.DictField(child=serializers.CharField(), read_only=True)
+
     class Meta:
         model = ProductGalleryImage
         fields = [
@@ -15,6 +17,7 @@ class ProductGalleryImageSerializer(serializers.ModelSerializer):
             'image_webp',
             'thumbnail',
             'thumbnail_webp',
+            'image_srcset',
             'alt_text',
             'order'
         ]
@@ -22,6 +25,7 @@ class ProductGalleryImageSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     category = ProductCategorySerializer()
     gallery_images = ProductGalleryImageSerializer(many=True, read_only=True)
+    image_srcset = serializers.DictField(child=serializers.CharField(), read_only=True)
 
     class Meta:
         model = Product
@@ -45,7 +49,15 @@ class ProductSerializer(serializers.ModelSerializer):
             'image_webp',
             'thumbnail',
             'thumbnail_webp',
+            'image_srcset',
             'gallery_images',
             'created',
             'updated'
         ]
+
+class GalleryOrderSerializer(serializers.Serializer):
+    image_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="Every gallery image ID for the product, in display order"
+    )
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from allergens.models import Allergen
+from flavours.models import Flavour, FlavourCategory
+from . import catalog
+from .models import Product, ProductCategory, ProductGalleryImage
+
+CATALOG_MODELS = (Product, ProductCategory, ProductGalleryImage, Flavour, FlavourCategory, Allergen)
+
+
+def invalidate_catalog(sender, **kwargs):
+    """Retire the catalog snapshot once the change is committed"""
+    transaction.on_commit(catalog.invalidate)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f'catalog_save_{model._meta.label_lower}')
+    post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f'catalog_delete_{model._meta.label_lower}')
+
+
+@receiver(m2m_changed, sender=Flavour.allergens.through, dispatch_uid='catalog_flavour_allergens')
+def invalidate_catalog_on_allergens(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog(sender)
@@ -1,5 +1,20 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+import tempfile
+from io import BytesIO
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
 from rest_framework.test import APIClient
+from products import derivatives, gallery, images
+from products.models import Product, ProductGalleryImage, ImageDerivativeJob
 
 class BaseAPITest(TestCase):
     fixtures = [
@@ -42,3 +57,207 @@ class ProductAPITest(BaseAPITest):
         """Test GET /api/products/{slug}/ with invalid slug"""
         response = self.client.get('/api/products/invalid-slug/')
         self.assertEqual(response.status_code, 404)
+
+class CatalogSnapshotTest(BaseAPITest):
+    fixtures = BaseAPITest.fixtures + [
+        'initial_flavours.json',
+        'initial_flavour_categories.json'
+    ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_catalog_snapshot(self):
+        """Test GET /api/products/catalog/ returns products, flavours and allergens"""
+        response = self.client.get('/api/products/catalog/')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(len(data['products']), 4)
+        self.assertTrue(data['flavours'])
+        self.assertTrue(data['allergens'])
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+
+    def test_catalog_snapshot_not_modified(self):
+        """Test If-None-Match with the current ETag returns 304 without rebuilding"""
+        etag = self.client.get('/api/products/catalog/')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/catalog/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_snapshot_invalidated_on_save(self):
+        """Test saving a product publishes a new snapshot version"""
+        etag = self.client.get('/api/products/catalog/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=1).update(name='Renamed Box')
+            Product.objects.get(pk=1).save()
+
+        response = self.client.get('/api/products/catalog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class ImageDerivativeJobTest(BaseAPITest):
+    def test_image_change_enqueues_job(self):
+        """Test changing a product image queues derivatives instead of generating them inline"""
+        product = Product.objects.get(pk=1)
+
+        # No re-fetch of the row to detect image changes
+        with self.assertNumQueries(1):
+            product.name = 'Renamed Box'
+            product.save()
+        self.assertFalse(ImageDerivativeJob.objects.exists())
+
+        product.image = 'flavours/new-box.jpg'
+        product.save()
+        product.image = 'flavours/newer-box.jpg'
+        product.save()
+
+        job = ImageDerivativeJob.objects.get()
+        self.assertEqual(job.status, ImageDerivativeJob.PENDING)
+        self.assertEqual(job.source_name, 'flavours/newer-box.jpg')
+        self.assertEqual(Product.objects.get(pk=1).derivative_status, ImageDerivativeJob.PENDING)
+
+    def test_stale_jobs_requeued_until_attempts_run_out(self):
+        """Test a job whose worker keeps dying is failed instead of reclaimed forever"""
+        product = Product.objects.get(pk=1)
+        product.image = 'flavours/poison.jpg'
+        product.save()
+        long_ago = timezone.now() - derivatives.STALE_AFTER - timedelta(minutes=1)
+
+        for attempt in range(1, derivatives.MAX_ATTEMPTS + 1):
+            job, = derivatives.claim_jobs(10)
+            self.assertEqual(job.attempts, attempt)
+            ImageDerivativeJob.objects.filter(pk=job.pk).update(started=long_ago)
+
+        self.assertEqual(derivatives.claim_jobs(10), [])
+        job = ImageDerivativeJob.objects.get()
+        self.assertEqual(job.status, ImageDerivativeJob.FAILED)
+        self.assertTrue(job.error_message)
+
+    def test_admin_list_reads_status_in_one_query(self):
+        """Test the changelist's derivative column does not query jobs per row"""
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='x')
+        self.client.force_login(admin)
+        # The admin templates need no collected static manifest
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        }}
+        override = override_settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+        ProductGalleryImage.objects.create(product_id=1, image='products/gallery/a.jpg', order=0)
+
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/admin/products/productgalleryimage/')
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        one = changelist_queries()
+        for order, name in enumerate(['b', 'c', 'd'], start=1):
+            ProductGalleryImage.objects.create(product_id=1, image=f'products/gallery/{name}.jpg', order=order)
+        self.assertEqual(changelist_queries(), one)
+        self.assertEqual(
+            set(derivatives.with_derivative_status(ProductGalleryImage.objects.all())
+                .values_list('latest_derivative_status', flat=True)),
+            {ImageDerivativeJob.PENDING}
+        )
+
+class ImageVariantTest(TestCase):
+    def test_render_variants_from_one_decode(self):
+        """Test every configured width and format is produced without upscaling, plus the full size"""
+        source = BytesIO()
+        Image.new('RGB', (800, 400), 'brown').save(source, 'PNG')
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        config = images.VariantConfig(
+            widths=(320, 640, 1280),
+            formats=('webp', 'jpeg'),
+            quality=images.DEFAULT_VARIANT_QUALITY,
+            thumbnail_size=(300, 300)
+        )
+
+        variants = images.render_variants(images.decode(source), 'box', storage, config)
+
+        self.assertEqual(set(variants), {'webp', 'jpeg'})
+        self.assertEqual(set(variants['webp']), {'320', '640', '800'})
+        with storage.open(variants['jpeg']['320']) as variant:
+            self.assertEqual(Image.open(variant).size, (320, 160))
+        with storage.open(variants['jpeg']['800']) as variant:
+            self.assertEqual(Image.open(variant).size, (800, 400))
+        self.assertTrue(images.srcset(variants, storage)['webp'].endswith('box_800w.webp 800w'))
+
+class GalleryOrderTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.images = [
+            ProductGalleryImage.objects.create(product_id=1, image=f'products/gallery/{name}.jpg', order=order)
+            for order, name in enumerate(['front', 'side', 'open'])
+        ]
+
+    def gallery_names(self):
+        return [image.image.name for image in ProductGalleryImage.objects.filter(product_id=1)]
+
+    def test_insert_shifts_neighbours(self):
+        """Test inserting or moving onto a taken position shifts the rest down"""
+        ProductGalleryImage.objects.create(product_id=1, image='products/gallery/top.jpg', order=1)
+        self.assertEqual(self.gallery_names(), [
+            'products/gallery/front.jpg',
+            'products/gallery/top.jpg',
+            'products/gallery/side.jpg',
+            'products/gallery/open.jpg',
+        ])
+
+        opened = ProductGalleryImage.objects.get(pk=self.images[2].pk)
+        opened.order = 0
+        opened.save()
+        self.assertEqual(self.gallery_names()[0], 'products/gallery/open.jpg')
+
+    def test_insert_at_top_of_reordered_gallery(self):
+        """Test inserting at position 0 shifts every image without colliding with a parked one"""
+        front, side, opened = self.images
+        gallery.set_order(1, [opened.pk, side.pk, front.pk])
+
+        ProductGalleryImage.objects.create(product_id=1, image='products/gallery/top.jpg', order=0)
+
+        self.assertEqual(self.gallery_names(), [
+            'products/gallery/top.jpg',
+            'products/gallery/open.jpg',
+            'products/gallery/side.jpg',
+            'products/gallery/front.jpg',
+        ])
+        self.assertEqual(
+            list(ProductGalleryImage.objects.filter(product_id=1).values_list('order', flat=True)),
+            [0, 1, 2, 3]
+        )
+
+    def test_set_order(self):
+        """Test the gallery is reordered with set-based updates"""
+        front, side, opened = self.images
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gallery.set_order(1, [opened.pk, front.pk, side.pk])
+
+        self.assertEqual(self.gallery_names(), [
+            'products/gallery/open.jpg',
+            'products/gallery/front.jpg',
+            'products/gallery/side.jpg',
+        ])
+        with self.assertRaises(ValidationError):
+            gallery.set_order(1, [opened.pk, front.pk])
+
+    def test_set_order_endpoint(self):
+        """Test POST /api/products/<slug>/gallery/order/ is admin only and validates the IDs"""
+        url = '/api/products/48-bonbons/gallery/order/'
+        response = self.client.post(url, {'image_ids': [self.images[0].pk]}, format='json')
+        self.assertIn(response.status_code, [401, 403])
+
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='x')
+        self.client.force_authenticate(admin)
+        response = self.client.post(url, {'image_ids': [self.images[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import ProductListView, ProductDetailView
+from .views import ProductListView, ProductDetailView, CatalogSnapshotView, GalleryOrderView
 
 products_urls = [
     path('', ProductListView.as_view(), name='product-list'),
+    path('catalog/', CatalogSnapshotView.as_view(), name='product-catalog'),
     path('<slug:slug>/', ProductDetailView.as_view(), name='product-detail'),
+    path('<slug:slug>/gallery/order/', GalleryOrderView.as_view(), name='product-gallery-order'),
 ]
@@ -1,12 +1,76 @@
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+from rest_framework import permissions, status
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.authentication import CustomJWTAuthentication
+from . import gallery
+from .catalog import get_snapshot
 from .models import Product
-from .serializers import ProductSerializer
+from .serializers import ProductSerializer, ProductGalleryImageSerializer, GalleryOrderSerializer
 
 class ProductListView(ListAPIView):
-    queryset = Product.objects.active()
+    queryset = Product.objects.active().select_related('category').prefetch_related('gallery_images')
     serializer_class = ProductSerializer
 
 class ProductDetailView(RetrieveAPIView):
     lookup_field = 'slug'
-    queryset = Product.objects.active()
+    queryset = Product.objects.active().select_related('category').prefetch_related('gallery_images')
     serializer_class = ProductSerializer
+
+class CatalogSnapshotView(APIView):
+    """
+    Serves the whole catalog (products, flavours, allergens) as one cached,
+    pre-rendered document with a strong ETag.
+    """
+
+    @extend_schema(
+        summary="Catalog snapshot",
+        description="Returns active products, flavours and allergens in one document. "
+                    "Send If-None-Match with the last ETag to get a 304 when nothing changed.",
+        responses={
+            200: OpenApiResponse(description="Catalog document keyed by its content hash"),
+            304: OpenApiResponse(description="Catalog unchanged")
+        }
+    )
+    def get(self, request):
+        snapshot = get_snapshot()
+
+        if snapshot.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(snapshot.body, content_type='application/json')
+
+        response['ETag'] = snapshot.etag
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
+
+class GalleryOrderView(APIView):
+    """Reorder a product's gallery in one request"""
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CustomJWTAuthentication, SessionAuthentication]
+
+    @extend_schema(
+        summary="Set gallery order",
+        description="Sets the display order of every gallery image of a product from a list of image IDs.",
+        request=GalleryOrderSerializer,
+        responses={200: ProductGalleryImageSerializer(many=True)}
+    )
+    def post(self, request, slug):
+        product = get_object_or_404(Product, slug=slug)
+        serializer = GalleryOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            gallery.set_order(product.id, serializer.validated_data['image_ids'])
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        images = product.gallery_images.all()
+        return Response(ProductGalleryImageSerializer(images, many=True).data)
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import ShippingLabel
 
-# Register your models here.
+@admin.register(ShippingLabel)
+class ShippingLabelAdmin(admin.ModelAdmin):
+    list_display = ['order', 'file_name', 'size', 'created']
+    search_fields = ['order__order_id', 'order__tracking_number']
+    readonly_fields = ['order', 'file_name', 'size', 'created']
@@ -0,0 +1,158 @@
+import asyncio
+import random
+import time
+import weakref
+
+import httpx
+import structlog
+from django.conf import settings
+
+logger = structlog.get_logger(__name__)
+
+# Methods that can be sent twice without creating a second order
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Royal Mail while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets a single trial call through. A success
+    closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        state = self.state
+        if state == 'open' or (state == 'half_open' and self.trial_in_flight):
+            raise CircuitOpenError("Royal Mail is unavailable, try again shortly")
+        if state == 'half_open':
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            logger.warning("royal_mail_circuit_opened", failures=self.failures)
+
+
+class RoyalMailClient:
+    """
+    Async HTTP client for the Royal Mail API with a keep-alive connection
+    pool, connect/read timeouts, jittered retries and a circuit breaker.
+
+    Only idempotent requests are retried after a response or a read failure;
+    a POST is retried only when the connection could not be opened, since
+    the order was then never sent.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=20, max_retries=2, backoff=0.5,
+                 max_connections=10, breaker=None, transport=None):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        # httpx pools are bound to the event loop that opened them
+        self._pools = weakref.WeakKeyDictionary()
+
+    def _pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None or pool.is_closed:
+            pool = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, transport=self.transport)
+            self._pools[loop] = pool
+        return pool
+
+    def _delay(self, attempt):
+        # Full jitter keeps retries from many workers from arriving together
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _should_retry(self, method, attempt, response=None, error=None):
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(error, httpx.ConnectError | httpx.ConnectTimeout | httpx.PoolTimeout):
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if error is not None:
+            return isinstance(error, httpx.TransportError)
+        return response.status_code in RETRY_STATUSES
+
+    async def request(self, method, url, **kwargs):
+        """Send a request, raising httpx.HTTPStatusError for error responses"""
+        method = method.upper()
+        attempt = 0
+
+        while True:
+            self.breaker.before_call()
+            try:
+                response = await self._pool().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                if not self._should_retry(method, attempt, error=e):
+                    raise
+                logger.warning("royal_mail_request_retry", method=method, url=url, attempt=attempt, error=str(e))
+            else:
+                if response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+                if not self._should_retry(method, attempt, response=response):
+                    response.raise_for_status()
+                    return response
+                logger.warning(
+                    "royal_mail_request_retry",
+                    method=method,
+                    url=url,
+                    attempt=attempt,
+                    status_code=response.status_code
+                )
+
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+
+_client = None
+
+
+def get_client():
+    """The process-wide client, so every request shares its pool and breaker"""
+    global _client
+    if _client is None:
+        _client = RoyalMailClient(
+            connect_timeout=getattr(settings, 'ROYAL_MAIL_CONNECT_TIMEOUT', 5),
+            read_timeout=getattr(settings, 'ROYAL_MAIL_READ_TIMEOUT', 20),
+            max_retries=getattr(settings, 'ROYAL_MAIL_MAX_RETRIES', 2),
+            breaker=CircuitBreaker(
+                failure_threshold=getattr(settings, 'ROYAL_MAIL_CIRCUIT_FAILURES', 5),
+                reset_timeout=getattr(settings, 'ROYAL_MAIL_CIRCUIT_RESET', 30),
+            ),
+        )
+    return _client
@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from orders.models import Order
+from .services import RoyalMailService
+
+logger = structlog.get_logger(__name__)
+
+# Orders sent to Royal Mail per create request
+BATCH_SIZE = 50
+
+
+@dataclass
+class DispatchResult:
+    """Outcome of a dispatch run, keyed by our order IDs"""
+    created: dict = field(default_factory=dict)
+    failed: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            'created_count': len(self.created),
+            'failed_count': len(self.failed),
+            'created': self.created,
+            'failed': self.failed,
+        }
+
+
+def orders_awaiting_labels(**filters):
+    """
+    Orders with no tracking number yet, loaded with everything a Royal Mail
+    order item reads. Defaults to processing orders.
+    """
+    filters.setdefault('status', 'processing')
+    return Order.objects.filter(
+        tracking_number__isnull=True,
+        **filters
+    ).select_related(
+        'checkout_session__cart__user',
+        'checkout_session__shipping_address',
+        'checkout_session__shipping_option',
+    ).prefetch_related('lines').order_by('created')
+
+
+def _failure_messages(failed_order):
+    return '; '.join(
+        error.get('errorMessage', '') for error in failed_order.get('errors', [])
+    ) or 'Rejected by Royal Mail'
+
+
+def apply_response(orders, response, result):
+    """Map a create response back onto its orders; returns the orders to save"""
+    by_reference = {order.order_id: order for order in orders}
+    updated = []
+    now = timezone.now()
+
+    for created in response.get('createdOrders', []):
+        tracking_number = created.get('trackingNumber')
+        if not tracking_number or created.get('orderReference') not in by_reference:
+            continue
+        order = by_reference.pop(created['orderReference'])
+        order.tracking_number = tracking_number
+        order.updated = now
+        updated.append(order)
+        result.created[order.order_id] = tracking_number
+
+    for failed in response.get('failedOrders', []):
+        reference = (failed.get('order') or {}).get('orderReference')
+        if by_reference.pop(reference, None) is not None:
+            result.failed[reference] = _failure_messages(failed)
+
+    # Anything Royal Mail did not mention, e.g. created without a tracking number yet
+    for reference in by_reference:
+        result.failed[reference] = 'No tracking number received from Royal Mail'
+
+    return updated
+
+
+async def create_labels(queryset, batch_size=BATCH_SIZE, service=None):
+    """
+    Create Royal Mail orders for every order in queryset, batch_size orders
+    per request, and store the tracking numbers with one bulk update per batch.
+    """
+    service = service or RoyalMailService()
+    result = DispatchResult()
+    orders = await sync_to_async(list)(queryset)
+
+    for start in range(0, len(orders), batch_size):
+        batch = orders[start:start + batch_size]
+        try:
+            response = await service.create_orders(batch)
+        except ValidationError as e:
+            for order in batch:
+                result.failed[order.order_id] = e.messages[0]
+            continue
+
+        updated = apply_response(batch, response or {}, result)
+        if updated:
+            await Order.objects.abulk_update(updated, ['tracking_number', 'updated'])
+
+        logger.info(
+            "royal_mail_batch_created",
+            batch_size=len(batch),
+            created=len(updated)
+        )
+
+    return result
@@ -0,0 +1,109 @@
+import asyncio
+import base64
+import binascii
+from functools import partial
+
+import structlog
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import IntegrityError, transaction
+
+from . import pdfmerge
+from .models import ShippingLabel
+from .services import RoyalMailService
+
+logger = structlog.get_logger(__name__)
+
+
+def label_storage():
+    return storages['private']
+
+
+def save_label(order, pdf):
+    """Store a label PDF for an order, keeping the first one if two race"""
+    storage = label_storage()
+    file_name = storage.save(f"shipping-labels/{order.order_id}.pdf", ContentFile(pdf))
+
+    try:
+        with transaction.atomic():
+            label = ShippingLabel.objects.create(order=order, file_name=file_name, size=len(pdf))
+    except IntegrityError:
+        storage.delete(file_name)
+        return ShippingLabel.objects.get(order=order)
+
+    logger.info("shipping_label_stored", order_id=order.order_id, size=len(pdf))
+    return label
+
+
+def save_inline_label(order, encoded):
+    """Store the base64 label returned by an order create call, if there is one"""
+    if not encoded:
+        return None
+    try:
+        pdf = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        logger.warning("shipping_label_not_base64", order_id=order.order_id)
+        return None
+    return save_label(order, pdf)
+
+
+async def get_label(order, service=None):
+    """The stored label for an order, fetched from Royal Mail only on a miss"""
+    label = await ShippingLabel.objects.filter(order=order).afirst()
+    if label is not None:
+        return label
+
+    service = service or RoyalMailService()
+    pdf = await service.get_shipping_label(order.tracking_number)
+    return await sync_to_async(save_label)(order, pdf)
+
+
+def open_label(label):
+    return label_storage().open(label.file_name, 'rb')
+
+
+def stored_label(order):
+    """The label already loaded with the order (select_related), or None"""
+    try:
+        return order.shipping_label
+    except ObjectDoesNotExist:
+        return None
+
+
+async def ensure_labels(orders, concurrency=4, service=None):
+    """
+    Labels for every order, fetching the ones not stored yet a few at a
+    time. Returns the labels in order and the IDs of orders that have none.
+    """
+    service = service or RoyalMailService()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(order):
+        async with semaphore:
+            try:
+                return await get_label(order, service)
+            except ValidationError:
+                return None
+
+    missing = [order for order in orders if stored_label(order) is None]
+    fetched = dict(zip(
+        [order.order_id for order in missing],
+        await asyncio.gather(*[fetch(order) for order in missing])
+    ))
+
+    found, skipped = [], []
+    for order in orders:
+        label = fetched[order.order_id] if order.order_id in fetched else stored_label(order)
+        if label is None:
+            skipped.append(order.order_id)
+        else:
+            found.append(label)
+    return found, skipped
+
+
+def merged_pdf(labels):
+    """Stream the labels as one PDF, opening each stored file only while it is copied"""
+    storage = label_storage()
+    return pdfmerge.merge(partial(storage.open, label.file_name, 'rb') for label in labels)
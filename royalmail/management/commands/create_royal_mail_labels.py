@@ -0,0 +1,70 @@
+from argparse import ArgumentTypeError
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from royalmail.dispatch import BATCH_SIZE, create_labels, orders_awaiting_labels
+
+
+def aware_datetime(value):
+    """An ISO date or datetime, in the current time zone unless it names one"""
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ArgumentTypeError(f"{value!r} is not an ISO date or datetime")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = 'Create Royal Mail orders in batches for orders without a tracking number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', default='processing', help='Order status to dispatch')
+        parser.add_argument(
+            '--order-id', action='append', dest='order_ids',
+            help='Limit to these order IDs (repeatable)'
+        )
+        parser.add_argument(
+            '--created-after', type=aware_datetime,
+            help='Only orders created at or after this date/time'
+        )
+        parser.add_argument(
+            '--created-before', type=aware_datetime,
+            help='Only orders created at or before this date/time'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Orders per Royal Mail request')
+        parser.add_argument('--limit', type=int, help='Dispatch at most this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='List the matching orders and exit')
+
+    def handle(self, *args, **options):
+        filters = {'status': options['status']}
+        if options['order_ids']:
+            filters['order_id__in'] = options['order_ids']
+        if options['created_after']:
+            filters['created__gte'] = options['created_after']
+        if options['created_before']:
+            filters['created__lte'] = options['created_before']
+
+        orders = orders_awaiting_labels(**filters)
+        if options['limit']:
+            orders = orders[:options['limit']]
+
+        if options['dry_run']:
+            for order in orders:
+                self.stdout.write(order.order_id)
+            return
+
+        result = async_to_sync(create_labels)(orders, options['batch_size'])
+
+        for order_id, tracking_number in result.created.items():
+            self.stdout.write(f'{order_id}: {tracking_number}')
+        for order_id, error in result.failed.items():
+            self.stderr.write(f'{order_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(result.created)} label(s), {len(result.failed)} failed'
+        ))
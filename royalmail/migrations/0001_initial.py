@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0002_order_tracking_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(help_text='Name in the private storage', max_length=255)),
+                ('size', models.PositiveIntegerField(help_text='Size in bytes')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shipping_label', to='orders.order')),
+            ],
+        ),
+    ]
@@ -1,3 +1,19 @@
 from django.db import models
 
-# Create your models here.
+
+class ShippingLabel(models.Model):
+    """
+    A Royal Mail label PDF kept in private storage, so downloads are served
+    from storage and Royal Mail is asked for each label at most once.
+    """
+    order = models.OneToOneField(
+        'orders.Order',
+        on_delete=models.CASCADE,
+        related_name='shipping_label'
+    )
+    file_name = models.CharField(max_length=255, help_text="Name in the private storage")
+    size = models.PositiveIntegerField(help_text="Size in bytes")
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Label for {self.order.order_id}"
@@ -0,0 +1,161 @@
+"""
+Stream several PDFs out as one document, one input at a time.
+
+A merging writer normally holds every page until it writes the file. Here
+each input's pages, and the objects they reference, are renumbered and
+written out straight away. Only the byte offset of every written object
+and the page numbers are kept until the end, where the page tree, catalog
+and cross-reference table close the document.
+"""
+from io import BytesIO
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+
+CATALOG = 1
+PAGES = 2
+# Page attributes a page may inherit from its ancestors in the page tree
+INHERITABLE = ['/MediaBox', '/CropBox', '/Resources', '/Rotate']
+HEADER = b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n'
+# Cross-reference entries written per chunk
+XREF_CHUNK = 1024
+
+
+class _Renumbering:
+    """New object numbers for the objects of one input document"""
+
+    def __init__(self, merger, reader):
+        self.merger = merger
+        self.reader = reader
+        self.numbers = {}
+        self.queue = []
+        self.pages = set()
+
+    def number(self, ref):
+        key = (ref.idnum, ref.generation)
+        if key not in self.numbers:
+            self.numbers[key] = self.merger.allocate()
+            self.queue.append(ref)
+        return self.numbers[key]
+
+
+def _with_inherited(page):
+    """A copy of a page dictionary holding the attributes it inherits from its ancestors"""
+    page = DictionaryObject(page)
+    node = page.get('/Parent')
+    while node is not None:
+        node = node.get_object()
+        for key in INHERITABLE:
+            if key not in page and key in node:
+                page[NameObject(key)] = node.raw_get(key)
+        node = node.get('/Parent')
+    return page
+
+
+class StreamingPdfMerger:
+    def __init__(self):
+        self.offsets = [0, 0, 0]  # index 0 is the free-list head; catalog and pages filled at the end
+        self.kids = []
+        self.position = 0
+
+    def allocate(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.offsets[number] = self.position
+        return self._emit(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def _serialize(self, obj, renumbering, out, extra=b'', page=False):
+        if isinstance(obj, IndirectObject):
+            out.write(b'%d 0 R' % renumbering.number(obj))
+        elif isinstance(obj, DictionaryObject):
+            out.write(b'<<' + extra)
+            for key, value in obj.items():
+                # A page's parent is in the source page tree, which is not copied
+                if (page and key == '/Parent') or (isinstance(obj, StreamObject) and key == '/Length'):
+                    continue
+                NameObject(key).write_to_stream(out)
+                out.write(b' ')
+                self._serialize(value, renumbering, out)
+                out.write(b' ')
+            if isinstance(obj, StreamObject):
+                data = obj._data
+                out.write(b'/Length %d>>\nstream\n' % len(data))
+                out.write(data)
+                out.write(b'\nendstream')
+            else:
+                out.write(b'>>')
+        elif isinstance(obj, ArrayObject):
+            out.write(b'[')
+            for item in obj:
+                self._serialize(item, renumbering, out)
+                out.write(b' ')
+            out.write(b']')
+        else:
+            obj.write_to_stream(out)
+
+    def add(self, file):
+        """Copy every page of one PDF, yielding its bytes as they are produced"""
+        reader = PdfReader(file)
+        renumbering = _Renumbering(self, reader)
+
+        for page in reader.pages:
+            number = renumbering.number(page.indirect_reference)
+            renumbering.pages.add(number)
+            self.kids.append(number)
+
+        while renumbering.queue:
+            ref = renumbering.queue.pop(0)
+            number = renumbering.numbers[(ref.idnum, ref.generation)]
+            obj = reader.get_object(ref)
+
+            out = BytesIO()
+            if number in renumbering.pages:
+                # Pages are re-parented under the merged page tree, so they take
+                # along whatever they inherited from the one they leave
+                self._serialize(_with_inherited(obj), renumbering, out, b'/Parent %d 0 R ' % PAGES, page=True)
+            else:
+                self._serialize(obj, renumbering, out)
+            yield self._object(number, out.getvalue())
+
+    def header(self):
+        return self._emit(HEADER)
+
+    def trailer(self):
+        kids = b' '.join(b'%d 0 R' % number for number in self.kids)
+        yield self._object(PAGES, b'<</Type /Pages /Kids [%s] /Count %d>>' % (kids, len(self.kids)))
+        yield self._object(CATALOG, b'<</Type /Catalog /Pages %d 0 R>>' % PAGES)
+
+        xref_position = self.position
+        yield self._emit(b'xref\n0 %d\n0000000000 65535 f \n' % len(self.offsets))
+        for start in range(1, len(self.offsets), XREF_CHUNK):
+            yield self._emit(b''.join(
+                b'%010d 00000 n \n' % offset for offset in self.offsets[start:start + XREF_CHUNK]
+            ))
+        yield self._emit(
+            b'trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n'
+            % (len(self.offsets), CATALOG, xref_position)
+        )
+
+def merge(open_files):
+    """
+    Yield one merged PDF from an iterable of callables that each open one
+    input file. Inputs are opened, copied and closed one after another.
+    """
+    merger = StreamingPdfMerger()
+    yield merger.header()
+    for open_file in open_files:
+        with open_file() as file:
+            yield from merger.add(file)
+    yield from merger.trailer()
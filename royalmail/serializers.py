@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from orders.models import Order
 
+# Orders whose labels one merged PDF may hold; missing labels are fetched before it starts
+MAX_MERGED_LABELS = 2000
+
 class RoyalMailOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -21,3 +24,52 @@ class RoyalMailOrderListSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['order_id', 'tracking_number', 'status']
         read_only_fields = fields
+
+class RoyalMailBatchSerializer(serializers.Serializer):
+    """Which orders without a tracking number to send to Royal Mail"""
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, default='processing')
+    order_ids = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+    def get_filters(self):
+        data = self.validated_data
+        filters = {'status': data['status']}
+        if 'order_ids' in data:
+            filters['order_id__in'] = data['order_ids']
+        if 'created_after' in data:
+            filters['created__gte'] = data['created_after']
+        if 'created_before' in data:
+            filters['created__lte'] = data['created_before']
+        return filters
+
+class RoyalMailBatchResponseSerializer(serializers.Serializer):
+    created_count = serializers.IntegerField()
+    failed_count = serializers.IntegerField()
+    created = serializers.DictField(child=serializers.CharField(), help_text="Tracking number by order ID")
+    failed = serializers.DictField(child=serializers.CharField(), help_text="Error by order ID")
+
+class RoyalMailLabelBatchSerializer(serializers.Serializer):
+    """Orders whose labels are merged into one PDF"""
+    order_ids = serializers.ListField(
+        child=serializers.CharField(), required=False, allow_empty=False, max_length=MAX_MERGED_LABELS
+    )
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Provide order_ids or a created_after/created_before range")
+        return data
+
+    def get_filters(self):
+        data = self.validated_data
+        filters = {}
+        if 'order_ids' in data:
+            filters['order_id__in'] = data['order_ids']
+        if 'created_after' in data:
+            filters['created__gte'] = data['created_after']
+        if 'created_before' in data:
+            filters['created__lte'] = data['created_before']
+        return filters
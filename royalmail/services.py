@@ -1,13 +1,19 @@
 from typing import Dict, List, Optional
-import requests
+import httpx
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.exceptions import ValidationError
 import structlog
 
+from orders.managers import totals_for
+from orders.models import OrderLine
+from .client import CircuitOpenError, get_client
+
 logger = structlog.get_logger(__name__)
 
 class RoyalMailService:
-    def __init__(self):
+    def __init__(self, client=None):
+        self.client = client or get_client()
         self.base_url = settings.ROYAL_MAIL_BASE_URL
         self.api_key = settings.ROYAL_MAIL_API_KEY
         self.headers = {
@@ -15,10 +21,8 @@ class RoyalMailService:
             'Content-Type': 'application/json'
         }
 
-    def create_order(self, order) -> Dict:
-        """Create an order in Royal Mail's system"""
-        endpoint = f"{self.base_url}/orders"
-
+    def build_order_item(self, order, include_label=True) -> Dict:
+        """Build one Royal Mail order item from the order and its lines"""
         # Build recipient details
         recipient = {
             "address": {
@@ -34,56 +38,91 @@ class RoyalMailService:
             "emailAddress": order.email
         }
 
-        # Build packages data
+        # Build packages and figures from what was bought, as recorded at payment
+        lines = list(order.lines.all())
+        figures = {'subtotal': order.subtotal, 'shipping': order.shipping, 'total': order.total}
+        if not lines or None in figures.values():
+            # Paid before lines and totals were recorded and not yet backfilled;
+            # read them from the checkout session's cart instead
+            logger.warning("royal_mail_order_snapshot_missing", order_id=order.order_id)
+            if not lines:
+                lines, _ = OrderLine.objects.build(order)
+            if None in figures.values():
+                figures = totals_for(order.checkout_session)
+
         packages = []
-        for item in order.checkout_session.cart.items.all():
+        for line in lines:
             package = {
-                "weightInGrams": (item.product.weight + item.product.box_weight) * item.quantity,
+                "weightInGrams": line.weight * line.quantity,
                 "packageFormatIdentifier": "smallParcel",
             }
             packages.append(package)
 
-        # Build the request payload
-        payload = {
-            "items": [{
-                "orderReference": order.order_id,
-                "recipient": recipient,
-                "packages": packages,
-                "orderDate": order.created.isoformat(),
-                "subtotal": float(order.checkout_session.cart.base_total),
-                "shippingCostCharged": float(order.checkout_session.shipping_cost_pounds),
-                "total": float(order.checkout_session.total_with_shipping),
-                "currencyCode": "GBP",
-                "postageDetails": {
-                    "sendNotificationsTo": "recipient",
-                    "serviceCode": order.checkout_session.shipping_option.service_code,
-                    "receiveEmailNotification": True,
-                    "receiveSmsNotification": True if order.shipping_address.phone else False
-                },
-                "label": {
-                    "includeLabelInResponse": True,
-                    "includeCN": False,
-                    "includeReturnsLabel": False
-                }
-            }]
+        return {
+            "orderReference": order.order_id,
+            "recipient": recipient,
+            "packages": packages,
+            "orderDate": order.created.isoformat(),
+            "subtotal": float(figures['subtotal']),
+            "shippingCostCharged": float(figures['shipping']),
+            "total": float(figures['total']),
+            "currencyCode": "GBP",
+            "postageDetails": {
+                "sendNotificationsTo": "recipient",
+                "serviceCode": order.checkout_session.shipping_option.service_code,
+                "receiveEmailNotification": True,
+                "receiveSmsNotification": True if order.shipping_address.phone else False
+            },
+            "label": {
+                "includeLabelInResponse": include_label,
+                "includeCN": False,
+                "includeReturnsLabel": False
+            }
         }
 
+    def build_order_payload(self, order) -> Dict:
+        """Build the Royal Mail request for a single order"""
+        return {"items": [self.build_order_item(order)]}
+
+    def build_batch_payload(self, orders) -> Dict:
+        """Build one Royal Mail request for many orders, without inline labels"""
+        return {"items": [self.build_order_item(order, include_label=False) for order in orders]}
+
+    async def create_order(self, order) -> Dict:
+        """Create an order in Royal Mail's system"""
+        endpoint = f"{self.base_url}/orders"
+        payload = await sync_to_async(self.build_order_payload)(order)
+
         try:
-            response = requests.post(endpoint, json=payload, headers=self.headers)
-            response.raise_for_status()
+            response = await self.client.request('POST', endpoint, json=payload, headers=self.headers)
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, CircuitOpenError) as e:
             logger.error("royal_mail_order_creation_failed",
                         error=str(e),
                         order_id=order.order_id)
             raise ValidationError(f"Failed to create Royal Mail order: {str(e)}")
 
-    def get_shipping_label(self, order_identifier: str) -> bytes:
+    async def create_orders(self, orders) -> Dict:
+        """Create several orders in Royal Mail's system with one request"""
+        endpoint = f"{self.base_url}/orders"
+        payload = await sync_to_async(self.build_batch_payload)(orders)
+
+        try:
+            response = await self.client.request('POST', endpoint, json=payload, headers=self.headers)
+            return response.json()
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            logger.error("royal_mail_batch_creation_failed",
+                        error=str(e),
+                        order_ids=[order.order_id for order in orders])
+            raise ValidationError(f"Failed to create Royal Mail orders: {str(e)}")
+
+    async def get_shipping_label(self, order_identifier: str) -> bytes:
         """Get shipping label PDF for an order"""
         endpoint = f"{self.base_url}/orders/{order_identifier}/label"
 
         try:
-            response = requests.get(
+            response = await self.client.request(
+                'GET',
                 endpoint,
                 headers=self.headers,
                 params={
@@ -91,9 +130,8 @@ class RoyalMailService:
                     "includeReturnsLabel": False
                 }
             )
-            response.raise_for_status()
             return response.content
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, CircuitOpenError) as e:
             logger.error("royal_mail_label_fetch_failed",
                         error=str(e),
                         order_identifier=order_identifier)
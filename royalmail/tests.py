@@ -1,3 +1,416 @@
-from django.test import TestCase
+import base64
+import json
+import tempfile
+import threading
+from io import BytesIO, StringIO
+import time
+from unittest import mock
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DictionaryObject, NameObject, StreamObject
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from addresses.models import Address
+from carts.models import Cart, CartItem
+from checkout.models import CheckoutSession
+from orders.models import Order, OrderLine
+from royalmail import dispatch, labels, pdfmerge
+from royalmail.client import CircuitBreaker, CircuitOpenError, RoyalMailClient
+from royalmail.models import ShippingLabel
+from royalmail.services import RoyalMailService
 
-# Create your tests here.
+class RoyalMailLabelViewTest(APITestCase):
+    def test_label_requires_admin(self):
+        response = self.client.get('/api/royalmail/orders/CP-MISSING/label/')
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_label_for_missing_order(self):
+        """Test the async label view runs DRF auth and async ORM lookups"""
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='x')
+        self.client.force_authenticate(admin)
+
+        response = self.client.get('/api/royalmail/orders/CP-MISSING/label/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['error'], 'Order not found')
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-reply
+        pass
+
+class FakeRoyalMailServer:
+    """
+    Local HTTP server standing in for the Royal Mail API. Each request is
+    answered with the next scripted (status, body, delay) reply.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        self.bodies = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def reply(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                server.requests.append((self.command, self.path, self.client_address))
+                server.bodies.append(body)
+                status, body, delay = server.replies.pop(0) if server.replies else (200, b'{}', 0)
+                time.sleep(delay)
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = reply
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = QuietHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class RoyalMailClientTest(TestCase):
+    def client_for(self, **kwargs):
+        options = {'backoff': 0, 'breaker': CircuitBreaker(failure_threshold=3)}
+        options.update(kwargs)
+        return RoyalMailClient(**options)
+
+    def test_idempotent_call_is_retried(self):
+        """Test a label download survives a transient 503"""
+        with FakeRoyalMailServer([(503, b'', 0), (200, b'%PDF', 0)]) as server:
+            service = RoyalMailService(client=self.client_for())
+            service.base_url = server.url
+
+            label = async_to_sync(service.get_shipping_label)('RM123')
+
+        self.assertEqual(label, b'%PDF')
+        self.assertEqual([request[0] for request in server.requests], ['GET', 'GET'])
+
+    def test_order_creation_is_not_retried(self):
+        """Test a POST that reached Royal Mail is never sent twice"""
+        client = self.client_for()
+        with FakeRoyalMailServer([(503, b'', 0), (201, b'{}', 0)]) as server:
+            with self.assertRaises(httpx.HTTPStatusError):
+                async_to_sync(client.request)('POST', f'{server.url}/orders', json={})
+
+        self.assertEqual(len(server.requests), 1)
+
+    def test_read_timeout(self):
+        client = self.client_for(read_timeout=0.1, max_retries=0)
+        with FakeRoyalMailServer([(200, b'{}', 0.5)]) as server:
+            with self.assertRaises(httpx.ReadTimeout):
+                async_to_sync(client.request)('GET', f'{server.url}/orders')
+
+    def test_circuit_opens_after_failures(self):
+        """Test calls fail fast without reaching Royal Mail once the circuit opens"""
+        client = self.client_for(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        with FakeRoyalMailServer([(500, b'', 0), (500, b'', 0)]) as server:
+            for _ in range(2):
+                with self.assertRaises(httpx.HTTPStatusError):
+                    async_to_sync(client.request)('GET', f'{server.url}/orders')
+            with self.assertRaises(CircuitOpenError):
+                async_to_sync(client.request)('GET', f'{server.url}/orders')
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(client.breaker.state, 'open')
+
+    def test_connections_are_kept_alive(self):
+        client = self.client_for()
+
+        async def fetch_twice(url):
+            await client.request('GET', url)
+            await client.request('GET', url)
+
+        with FakeRoyalMailServer([]) as server:
+            async_to_sync(fetch_twice)(f'{server.url}/orders')
+
+        self.assertEqual(server.requests[0][2], server.requests[1][2])
+
+def create_order(number, **kwargs):
+    """A processing order with one box and a shipping address"""
+    cart = Cart.objects.create(session_id=f'dispatch-{number}')
+    CartItem.objects.create(cart=cart, product_id=1, quantity=1)
+    address = Address.objects.create(
+        address_type=Address.AddressType.SHIPPING_ADDRESS,
+        full_name='Jane Doe',
+        street_address='1 Cocoa Lane',
+        city='London',
+        postcode='E1 6AN'
+    )
+    checkout_session = CheckoutSession.objects.create(
+        cart=cart,
+        email=f'customer{number}@example.com',
+        shipping_address=address,
+        shipping_option_id=1
+    )
+    order = Order.objects.create_from_checkout(checkout_session)
+    if kwargs:
+        Order.objects.filter(pk=order.pk).update(**kwargs)
+        order.refresh_from_db()
+    return order
+
+class DispatchTest(TestCase):
+    fixtures = [
+        'initial_discounts.json',
+        'initial_products.json',
+        'initial_product_category.json',
+        'initial_allergens.json',
+        'initial_shipping.json'
+    ]
+
+    def setUp(self):
+        self.orders = [create_order(number) for number in range(3)]
+
+    def test_create_labels_in_batches(self):
+        """Test orders are sent several per request and tracking numbers saved in bulk"""
+        first, second, third = [order.order_id for order in self.orders]
+        replies = [
+            (200, json.dumps({'createdOrders': [
+                {'orderIdentifier': 1, 'orderReference': first, 'trackingNumber': 'RM1'},
+            ], 'failedOrders': [
+                {'order': {'orderReference': second}, 'errors': [{'errorMessage': 'Invalid postcode'}]},
+            ]}).encode(), 0),
+            (200, json.dumps({'createdOrders': [
+                {'orderIdentifier': 3, 'orderReference': third, 'trackingNumber': 'RM3'},
+            ]}).encode(), 0),
+        ]
+
+        with FakeRoyalMailServer(replies) as server:
+            service = RoyalMailService(client=RoyalMailClient(backoff=0))
+            service.base_url = server.url
+            result = async_to_sync(dispatch.create_labels)(
+                dispatch.orders_awaiting_labels(), batch_size=2, service=service
+            )
+
+        self.assertEqual(result.created, {first: 'RM1', third: 'RM3'})
+        self.assertEqual(result.failed, {second: 'Invalid postcode'})
+        self.assertEqual([len(json.loads(body)['items']) for body in server.bodies], [2, 1])
+        self.assertEqual(
+            dict(Order.objects.filter(tracking_number__isnull=False).values_list('order_id', 'tracking_number')),
+            {first: 'RM1', third: 'RM3'}
+        )
+        self.assertEqual(list(dispatch.orders_awaiting_labels()), [self.orders[1]])
+
+    def test_orders_paid_before_snapshots_fall_back_to_cart(self):
+        """Test orders without recorded totals or lines are priced from their cart instead of failing the batch"""
+        legacy, current, _ = self.orders
+        Order.objects.filter(pk=legacy.pk).update(subtotal=None, discount_amount=None, shipping=None, total=None)
+        OrderLine.objects.filter(order=legacy).delete()
+        replies = [(200, json.dumps({'createdOrders': [
+            {'orderIdentifier': 1, 'orderReference': legacy.order_id, 'trackingNumber': 'RM1'},
+            {'orderIdentifier': 2, 'orderReference': current.order_id, 'trackingNumber': 'RM2'},
+        ]}).encode(), 0)]
+
+        with FakeRoyalMailServer(replies) as server:
+            service = RoyalMailService(client=RoyalMailClient(backoff=0))
+            service.base_url = server.url
+            result = async_to_sync(dispatch.create_labels)(
+                dispatch.orders_awaiting_labels(order_id__in=[legacy.order_id, current.order_id]), service=service
+            )
+
+        self.assertEqual(result.created, {legacy.order_id: 'RM1', current.order_id: 'RM2'})
+        legacy_item, current_item = json.loads(server.bodies[0])['items']
+        for key in ('packages', 'subtotal', 'shippingCostCharged', 'total'):
+            self.assertEqual(legacy_item[key], current_item[key])
+
+    def test_command_selects_by_creation_date(self):
+        """Test create_royal_mail_labels takes the same created range as the batch endpoint"""
+        week_ago = timezone.now() - timedelta(days=7)
+        Order.objects.filter(pk=self.orders[0].pk).update(created=week_ago)
+        out = StringIO()
+
+        call_command(
+            'create_royal_mail_labels',
+            dry_run=True,
+            created_after=week_ago - timedelta(days=1),
+            created_before=week_ago + timedelta(days=1),
+            stdout=out
+        )
+        self.assertEqual(out.getvalue().split(), [self.orders[0].order_id])
+
+        out = StringIO()
+        call_command('create_royal_mail_labels', '--dry-run', f'--created-after={timezone.localdate()}', stdout=out)
+        self.assertEqual(out.getvalue().split(), [order.order_id for order in self.orders[1:]])
+
+class ShippingLabelStoreTest(APITestCase):
+    fixtures = DispatchTest.fixtures
+
+    def setUp(self):
+        self.order = create_order(1, tracking_number='RM1')
+        self.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='x')
+        self.client.force_authenticate(self.admin)
+        storage_settings = {**settings.STORAGES, 'private': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': tempfile.mkdtemp()},
+        }}
+        override = override_settings(STORAGES=storage_settings)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def download(self):
+        response = self.client.get(f'/api/royalmail/orders/{self.order.order_id}/label/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_label_fetched_once_then_served_from_storage(self):
+        """Test only the first download reaches Royal Mail"""
+        with FakeRoyalMailServer([(200, b'%PDF-1', 0)]) as server, override_settings(ROYAL_MAIL_BASE_URL=server.url):
+            self.assertEqual(self.download(), b'%PDF-1')
+            self.assertEqual(self.download(), b'%PDF-1')
+
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(ShippingLabel.objects.get(order=self.order).size, 6)
+
+    def test_inline_label_is_stored(self):
+        """Test the label returned when creating the order is kept for downloads"""
+        labels.save_inline_label(self.order, base64.b64encode(b'%PDF-2').decode())
+
+        self.assertEqual(self.download(), b'%PDF-2')
+
+    def test_merged_labels(self):
+        """Test labels of several orders stream back as one PDF, fetching missing ones"""
+        second = create_order(2, tracking_number='RM2')
+        create_order(3)  # no tracking number, so no label
+        labels.save_label(self.order, label_pdf('Label RM1'))
+
+        replies = [(200, label_pdf('Label RM2'), 0)]
+        with FakeRoyalMailServer(replies) as server, override_settings(ROYAL_MAIL_BASE_URL=server.url):
+            response = self.client.post(
+                '/api/royalmail/labels/merged/',
+                {'order_ids': [self.order.order_id, second.order_id]},
+                format='json'
+            )
+            merged = PdfReader(BytesIO(b''.join(response.streaming_content)), strict=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([page.extract_text() for page in merged.pages], ['Label RM1', 'Label RM2'])
+        self.assertEqual(len(server.requests), 1)
+
+    def test_merged_labels_bound_the_batch_and_header(self):
+        """Test the order count per PDF and the skipped IDs listed in its header are capped"""
+        skipped = [create_order(number, tracking_number=f'RM{number}').order_id for number in (2, 3)]
+        labels.save_label(self.order, label_pdf('Label RM1'))
+        data = {'created_after': (timezone.now() - timedelta(days=1)).isoformat()}
+
+        with mock.patch('royalmail.views.MAX_MERGED_LABELS', 2):
+            response = self.client.post('/api/royalmail/labels/merged/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+        replies = [(404, b'', 0), (404, b'', 0)]
+        with FakeRoyalMailServer(replies) as server, override_settings(ROYAL_MAIL_BASE_URL=server.url), \
+                mock.patch('royalmail.views.SKIPPED_HEADER_IDS', 1):
+            response = self.client.post('/api/royalmail/labels/merged/', data, format='json')
+            b''.join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Skipped-Count'], '2')
+        self.assertIn(response['X-Skipped-Orders'], skipped)
+
+    async def test_merged_labels_stream_under_asgi(self):
+        """Test the merged PDF is sent from an async iterator instead of being built in memory first"""
+        second = await sync_to_async(create_order)(2, tracking_number='RM2')
+        await sync_to_async(labels.save_label)(self.order, label_pdf('Label RM1'))
+        await sync_to_async(labels.save_label)(second, label_pdf('Label RM2'))
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.admin)))()
+
+        response = await AsyncClient().post(
+            '/api/royalmail/labels/merged/',
+            {'order_ids': [self.order.order_id, second.order_id]},
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 2)
+        merged = PdfReader(BytesIO(b''.join(chunks)), strict=True)
+        self.assertEqual([page.extract_text() for page in merged.pages], ['Label RM1', 'Label RM2'])
+
+class PdfMergeTest(TestCase):
+    def test_pages_keep_inherited_attributes(self):
+        """Test pages take the media box, resources and rotation they inherited from the source page tree"""
+        merged = PdfReader(BytesIO(b''.join(
+            pdfmerge.merge([lambda: BytesIO(inherited_label_pdf('Label RM1')), lambda: BytesIO(label_pdf('Label RM2'))])
+        )), strict=True)
+
+        first, second = merged.pages
+        self.assertEqual([float(value) for value in first['/MediaBox']], [0, 0, 288, 432])
+        self.assertEqual(first.rotation, 90)
+        self.assertEqual(first.extract_text(), 'Label RM1')
+        self.assertEqual(second.extract_text(), 'Label RM2')
+        # Objects other than pages keep their own parents
+        self.assertEqual(first['/Annots'][0].get_object()['/Parent']['/T'], 'signature')
+
+def inherited_label_pdf(text):
+    """
+    A one-page PDF whose media box, rotation and font are set on the page
+    tree rather than the page, with a form field widget on the page
+    """
+    content = f'BT /F1 12 Tf 20 400 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<</Type /Catalog /Pages 2 0 R /AcroForm <</Fields [8 0 R]>>>>',
+        b'<</Type /Pages /Kids [3 0 R] /Count 1 /MediaBox [0 0 288 432] /Rotate 90'
+        b' /Resources <</Font <</F1 6 0 R>>>>>>',
+        b'<</Type /Pages /Parent 2 0 R /Kids [4 0 R] /Count 1>>',
+        b'<</Type /Page /Parent 3 0 R /Contents 5 0 R /Annots [7 0 R]>>',
+        b'<</Length %d>>\nstream\n%s\nendstream' % (len(content), content),
+        b'<</Type /Font /Subtype /Type1 /BaseFont /Helvetica>>',
+        b'<</Type /Annot /Subtype /Widget /Rect [0 0 10 10] /P 4 0 R /Parent 8 0 R>>',
+        b'<</FT /Tx /T (signature) /Kids [7 0 R]>>',
+    ]
+    output = BytesIO()
+    output.write(b'%PDF-1.7\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    output.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+    output.write(b'trailer\n<</Size %d /Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return output.getvalue()
+
+def label_pdf(text):
+    """A one-page PDF with a line of text, standing in for a Royal Mail label"""
+    writer = PdfWriter()
+    page = writer.add_blank_page(288, 432)
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    })
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/F1'): writer._add_object(font)})
+    })
+    content = StreamObject()
+    content.set_data(f'BT /F1 12 Tf 20 400 Td ({text}) Tj ET'.encode())
+    page[NameObject('/Contents')] = writer._add_object(content)
+
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
@@ -9,6 +9,16 @@ urlpatterns = [
          views.RoyalMailOrderListView.as_view(),
          name='order-list'),
 
+    # Create shipping labels for many orders at once
+    path('orders/batch/',
+         views.RoyalMailBatchCreateView.as_view(),
+         name='order-batch-create'),
+
+    # Download many shipping labels as one PDF
+    path('labels/merged/',
+         views.RoyalMailMergedLabelView.as_view(),
+         name='label-merged'),
+
     # Get specific order details
     path('orders/<str:order_id>/',
          views.RoyalMailOrderDetailView.as_view(),
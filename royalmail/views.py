@@ -1,18 +1,31 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+from drf_spectacular.utils import extend_schema
 from .services import RoyalMailService
+from . import labels
+from .dispatch import create_labels, orders_awaiting_labels
 from .serializers import (
     RoyalMailOrderSerializer,
-    RoyalMailOrderListSerializer
+    RoyalMailOrderListSerializer,
+    RoyalMailBatchSerializer,
+    RoyalMailBatchResponseSerializer,
+    RoyalMailLabelBatchSerializer,
+    MAX_MERGED_LABELS
 )
 from orders.models import Order
 from users.authentication import CustomJWTAuthentication
+from erp.async_views import AsyncAPIViewMixin, streaming_content
 from rest_framework.authentication import SessionAuthentication
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+# Skipped order IDs listed in the merged PDF's X-Skipped-Orders header, which
+# has to stay within proxy header size limits
+SKIPPED_HEADER_IDS = 50
+
 class RoyalMailOrderListView(generics.ListAPIView):
     """List Royal Mail orders"""
     permission_classes = [permissions.IsAdminUser]
@@ -27,21 +40,21 @@ class RoyalMailOrderListView(generics.ListAPIView):
             'checkout_session__shipping_option'
         )
 
-class RoyalMailOrderCreateView(generics.CreateAPIView):
+class RoyalMailOrderCreateView(AsyncAPIViewMixin, generics.CreateAPIView):
     """Create Royal Mail shipping label"""
     permission_classes = [permissions.IsAdminUser]
     authentication_classes = [CustomJWTAuthentication, SessionAuthentication]
     serializer_class = RoyalMailOrderSerializer
 
-    def post(self, request, order_id):
+    async def post(self, request, order_id):
         try:
             # Get order
-            order = Order.objects.select_related(
+            order = await Order.objects.select_related(
                 'checkout_session',
-                'checkout_session__cart',
+                'checkout_session__cart__user',
                 'checkout_session__shipping_address',
                 'checkout_session__shipping_option'
-            ).get(order_id=order_id)
+            ).prefetch_related('lines').aget(order_id=order_id)
 
             # Log order details for debugging
             logger.info(
@@ -52,7 +65,7 @@ class RoyalMailOrderCreateView(generics.CreateAPIView):
 
             # Create order in Royal Mail's system
             royal_mail = RoyalMailService()
-            response = royal_mail.create_order(order)
+            response = await royal_mail.create_order(order)
 
             # Log raw response for debugging
             logger.info(
@@ -78,7 +91,8 @@ class RoyalMailOrderCreateView(generics.CreateAPIView):
             if tracking_number:
                 order.tracking_number = tracking_number
                 order.status = 'processing'
-                order.save()
+                await order.asave()
+                await sync_to_async(labels.save_inline_label)(order, label_data)
 
                 logger.info(
                     "royal_mail_order_created",
@@ -123,6 +137,36 @@ class RoyalMailOrderCreateView(generics.CreateAPIView):
                 'detail': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class RoyalMailBatchCreateView(AsyncAPIViewMixin, generics.GenericAPIView):
+    """Create Royal Mail orders for every matching order without a tracking number"""
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CustomJWTAuthentication, SessionAuthentication]
+    serializer_class = RoyalMailBatchSerializer
+
+    @extend_schema(
+        request=RoyalMailBatchSerializer,
+        responses={200: RoyalMailBatchResponseSerializer, 201: RoyalMailBatchResponseSerializer}
+    )
+    async def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        orders = orders_awaiting_labels(**serializer.get_filters())
+        if 'limit' in serializer.validated_data:
+            orders = orders[:serializer.validated_data['limit']]
+
+        result = await create_labels(orders)
+
+        logger.info(
+            "royal_mail_batch_dispatched",
+            created=len(result.created),
+            failed=len(result.failed)
+        )
+        return Response(
+            result.as_dict(),
+            status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK
+        )
+
 class RoyalMailOrderDetailView(generics.RetrieveAPIView):
     """Get Royal Mail order details"""
     permission_classes = [permissions.IsAdminUser]
@@ -133,14 +177,14 @@ class RoyalMailOrderDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Order.objects.filter(tracking_number__isnull=False)
 
-class RoyalMailLabelView(generics.GenericAPIView):
+class RoyalMailLabelView(AsyncAPIViewMixin, generics.GenericAPIView):
     """Download Royal Mail shipping label"""
     permission_classes = [permissions.IsAdminUser]
     authentication_classes = [CustomJWTAuthentication, SessionAuthentication]
 
-    def get(self, request, order_id):
+    async def get(self, request, order_id):
         try:
-            order = Order.objects.get(order_id=order_id)
+            order = await Order.objects.aget(order_id=order_id)
 
             if not order.tracking_number:
                 return Response(
@@ -148,12 +192,16 @@ class RoyalMailLabelView(generics.GenericAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            royal_mail = RoyalMailService()
-            label_pdf = royal_mail.get_shipping_label(order.tracking_number)
+            # Served from private storage; Royal Mail is only asked on the first download
+            label = await labels.get_label(order)
+            label_file = await sync_to_async(labels.open_label)(label)
 
-            response = HttpResponse(label_pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="shipping_label_{order.order_id}.pdf"'
-            return response
+            return FileResponse(
+                label_file,
+                as_attachment=True,
+                filename=f'shipping_label_{order.order_id}.pdf',
+                content_type='application/pdf'
+            )
 
         except Order.DoesNotExist:
             return Response(
@@ -166,3 +214,44 @@ class RoyalMailLabelView(generics.GenericAPIView):
                 {'error': 'Failed to download shipping label'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+class RoyalMailMergedLabelView(AsyncAPIViewMixin, generics.GenericAPIView):
+    """Download the labels of many orders as one PDF, for printing"""
+    permission_classes = [permissions.IsAdminUser]
+    authentication_classes = [CustomJWTAuthentication, SessionAuthentication]
+    serializer_class = RoyalMailLabelBatchSerializer
+
+    async def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        orders = await sync_to_async(list)(
+            Order.objects.filter(
+                tracking_number__isnull=False,
+                **serializer.get_filters()
+            ).select_related('shipping_label').order_by('created')[:MAX_MERGED_LABELS + 1]
+        )
+        if len(orders) > MAX_MERGED_LABELS:
+            return Response(
+                {'error': f'More than {MAX_MERGED_LABELS} orders match; narrow the created range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        found, skipped = await labels.ensure_labels(orders)
+
+        if not found:
+            return Response(
+                {'error': 'No shipping labels available for these orders', 'skipped': skipped},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        logger.info("royal_mail_labels_merged", labels=len(found), skipped=len(skipped))
+
+        # Pages are copied one stored label at a time as the response is sent
+        response = StreamingHttpResponse(
+            streaming_content(request, labels.merged_pdf(found)), content_type='application/pdf'
+        )
+        response['Content-Disposition'] = f'attachment; filename="shipping_labels_{len(found)}.pdf"'
+        if skipped:
+            response['X-Skipped-Count'] = str(len(skipped))
+            response['X-Skipped-Orders'] = ','.join(skipped[:SKIPPED_HEADER_IDS])
+        return response
@@ -1,3 +1,54 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from erp.sessions import SessionStore
+
+
+class SessionStoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        store = SessionStore()
+        store['cart'] = 'abc'
+        store.create()
+        self.session_key = store.session_key
+
+    def test_unchanged_session_is_not_written(self):
+        """Test a request that only reads the session touches neither table nor row"""
+        store = SessionStore(self.session_key)
+        with self.assertNumQueries(0):
+            self.assertEqual(store['cart'], 'abc')
+            store.save()
+
+    def test_changed_session_is_written_through(self):
+        """Test changes reach the database for workers that do not share the cache"""
+        store = SessionStore(self.session_key)
+        store['cart'] = 'def'
+        store.save()
+
+        cache.clear()
+        self.assertEqual(SessionStore(self.session_key)['cart'], 'def')
+
+    def test_expiry_refreshed_once_it_lags(self):
+        """Test the stored expiry is extended only once it is past the refresh threshold"""
+        stale = timezone.now() + timedelta(days=5)
+        Session.objects.filter(session_key=self.session_key).update(expire_date=stale)
+        cache.clear()
+
+        store = SessionStore(self.session_key)
+        store.save()
+
+        self.assertGreater(Session.objects.get(session_key=self.session_key).expire_date, stale + timedelta(days=1))
+
+    def test_purge_sessions(self):
+        """Test purge_sessions deletes expired rows only"""
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(days=1))
+
+        call_command('purge_sessions', batch_size=1, stdout=StringIO())
 
-# Create your tests here.
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.session_key])
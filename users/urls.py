@@ -1,15 +1,14 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
 
-from .views import get_user_profile, LogoutView
+from .views import get_user_profile, LoginView, LogoutView
 
 urlpatterns = [
     # JWT token endpoints
-    path('jwt/create/', TokenObtainPairView.as_view(), name='jwt-create'),
+    path('jwt/create/', LoginView.as_view(), name='jwt-create'),
     path('jwt/refresh/', TokenRefreshView.as_view(), name='jwt-refresh'),
     path('jwt/verify/', TokenVerifyView.as_view(), name='jwt-verify'),
     path('jwt/logout/', LogoutView.as_view(), name='jwt-logout'),
@@ -2,11 +2,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from carts.models import Cart
 
 from users.models import CustomUser
 from users.serializers import UserSerializer
 
 
+class LoginView(TokenObtainPairView):
+    """
+    Obtain a JWT pair and move the cart the shopper built as a guest into
+    their account.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        Cart.objects.merge_session_cart(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
 class LogoutView(APIView):
     def post(self, request, *args, **kwargs):
         response = Response(status=status.HTTP_204_NO_CONTENT)